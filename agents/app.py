@@ -2,16 +2,21 @@
 # -------------------------------------------------------------
 # ADK Application Wrapper for ITSM System
 # - Database-backed sessions
+# - Token-aware event compaction (agents/compaction.py)
 # - Orchestrator-only Web UI usage
 # - Debug-friendly prints
 # -------------------------------------------------------------
 
+from functools import lru_cache
+
 from google.adk.apps.app import App, ResumabilityConfig, EventsCompactionConfig
-from google.adk.sessions import DatabaseSessionService
 from google.adk.runners import Runner
 from google.adk.plugins.logging_plugin import LoggingPlugin
 
 from plugins.observability_plugin import ObservabilityPlugin
+from agents.session_config import create_session_service
+from agents.setup import LLM
+from agents.compaction import TokenBudgetSummarizer, CompactionMetricsPlugin
 
 # Agents
 from agents.ticket_agents import root_ticket_agent
@@ -19,10 +24,9 @@ from agents.orchestrator import orchestrator_agent
 
 
 # -------------------------------------------------------------
-# Session DB
+# Session DB (URL / pool / SQLite pragmas: agents/session_config.py)
 # -------------------------------------------------------------
-DB_URL = "sqlite+aiosqlite:///itsm_sessions.db"
-session_service = DatabaseSessionService(db_url=DB_URL)
+session_service = create_session_service()
 
 
 # -------------------------------------------------------------
@@ -35,10 +39,13 @@ ticket_app = App(
     plugins=[
         LoggingPlugin(),
         ObservabilityPlugin(),
+        CompactionMetricsPlugin(),
     ],
+    # Checked after every invocation; compacts only when over budget
     events_compaction_config=EventsCompactionConfig(
-        compaction_interval=20,
+        compaction_interval=1,
         overlap_size=2,
+        summarizer=TokenBudgetSummarizer(llm=LLM()),
     ),
 )
 
@@ -53,21 +60,25 @@ orchestrator_app = App(
     plugins=[
         LoggingPlugin(),
         ObservabilityPlugin(),
+        CompactionMetricsPlugin(),
     ],
     events_compaction_config=EventsCompactionConfig(
-        compaction_interval=10,
+        compaction_interval=1,
         overlap_size=2,
+        summarizer=TokenBudgetSummarizer(llm=LLM()),
     ),
 )
 
 
 # -------------------------------------------------------------
-# Export runners
+# Export runners (long-lived; a Runner serves concurrent runs)
 # -------------------------------------------------------------
+@lru_cache(maxsize=None)
 def get_ticket_runner() -> Runner:
     return Runner(app=ticket_app, session_service=session_service)
 
 
+@lru_cache(maxsize=None)
 def get_orchestrator_runner() -> Runner:
     return Runner(app=orchestrator_app, session_service=session_service)
 
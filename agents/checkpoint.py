@@ -0,0 +1,152 @@
+# agents/checkpoint.py
+# -------------------------------------------------------------
+# Stage-level checkpoints for the ticket pipeline
+# - After a stage finishes, its input fingerprint is stored in state
+#   as `checkpoint:<StageName>`
+# - Before a stage runs, if its output already exists and its inputs
+#   hash to the stored fingerprint, the stage is skipped
+# - Recovery after a crash / 429 storm then only pays for the
+#   stages that never completed
+# - Checkpoints are cleared when the pipeline completes, so resending
+#   the same message later in the session runs (and files) a new ticket
+# -------------------------------------------------------------
+
+import os
+import json
+import hashlib
+import logging
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+
+# Disable with ITSM_STAGE_CHECKPOINTS=0
+CHECKPOINTS_ENABLED = os.getenv("ITSM_STAGE_CHECKPOINTS", "1") != "0"
+
+CHECKPOINT_PREFIX = "checkpoint:"
+USER_MESSAGE = "__user_message__"
+
+
+# stage name → (output_key, input keys)
+STAGE_CHECKPOINTS = {
+    "IntakeAgent": ("ticket_intake", [USER_MESSAGE, "user:id"]),
+    "StormGateAgent": ("storm_cluster_id", ["ticket_intake"]),
+    "ClassifierAgent": ("ticket_classification", ["ticket_intake"]),
+    "KBRetrievalAgent": (
+        "kb_context", ["ticket_intake", "ticket_classification"],
+    ),
+    "KBAgent": (
+        "kb_suggestions",
+        ["ticket_intake", "ticket_classification", "kb_context",
+         "prior_incidents"],
+    ),
+    "DiagnosticsAgent": (
+        "diagnostics_report", ["ticket_intake", "ticket_classification"],
+    ),
+    "ServiceNowCreatorAgent": (
+        "ticket_creation_result",
+        ["ticket_intake", "ticket_classification", "kb_suggestions",
+         "diagnostics_report"],
+    ),
+    "SessionSaverAgent": (
+        "session_save_output", ["ticket_intake", "ticket_creation_result"],
+    ),
+    "EscalationAgent": ("escalation_result", ["ticket_classification"]),
+}
+
+# Reused / executed counters per stage
+CHECKPOINT_STATS = {"reused": {}, "executed": {}}
+
+
+def _user_message(callback_context: CallbackContext) -> str:
+    content = callback_context.user_content
+    if not content or not content.parts:
+        return ""
+    return " ".join(p.text for p in content.parts if getattr(p, "text", None))
+
+
+def stage_fingerprint(callback_context: CallbackContext, input_keys) -> str:
+    state = callback_context.state
+    inputs = {}
+    for key in input_keys:
+        if key == USER_MESSAGE:
+            inputs[key] = _user_message(callback_context)
+        else:
+            inputs[key] = state.get(key)
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _bump(kind: str, stage: str):
+    CHECKPOINT_STATS[kind][stage] = CHECKPOINT_STATS[kind].get(stage, 0) + 1
+
+
+# -------------------------------------------------------------
+# Callbacks
+# -------------------------------------------------------------
+def restore_checkpoint(callback_context: CallbackContext):
+    # before_agent_callback: returning content skips this stage
+    stage = callback_context.agent_name
+    if not CHECKPOINTS_ENABLED or stage not in STAGE_CHECKPOINTS:
+        return None
+
+    output_key, input_keys = STAGE_CHECKPOINTS[stage]
+    state = callback_context.state
+    stored = state.get(CHECKPOINT_PREFIX + stage)
+    if not stored or state.get(output_key) is None:
+        return None
+    if stored != stage_fingerprint(callback_context, input_keys):
+        return None
+
+    _bump("reused", stage)
+    print(f"[CHECKPOINT] {stage} inputs unchanged → reusing '{output_key}'")
+    logging.info("[CHECKPOINT] reused stage=%s", stage)
+    # Replay the stored output so callers (e.g. AgentTool) still see it
+    output = state.get(output_key)
+    if not isinstance(output, str):
+        output = json.dumps(output, default=str)
+    return types.Content(role="model", parts=[types.Part(text=output)])
+
+
+def save_checkpoint(callback_context: CallbackContext):
+    # after_agent_callback: record the fingerprint of the inputs just used
+    stage = callback_context.agent_name
+    if not CHECKPOINTS_ENABLED or stage not in STAGE_CHECKPOINTS:
+        return None
+
+    output_key, input_keys = STAGE_CHECKPOINTS[stage]
+    if output_key not in callback_context.state:
+        return None
+
+    callback_context.state[CHECKPOINT_PREFIX + stage] = stage_fingerprint(
+        callback_context, input_keys
+    )
+    _bump("executed", stage)
+    return None
+
+
+def clear_checkpoints(callback_context: CallbackContext):
+    # after_agent_callback on the pipeline: only an interrupted run
+    # leaves checkpoints behind to resume from
+    state = callback_context.state
+    for stage in STAGE_CHECKPOINTS:
+        if state.get(CHECKPOINT_PREFIX + stage):
+            state[CHECKPOINT_PREFIX + stage] = None
+    return None
+
+
+def checkpoint_stats() -> dict:
+    return {
+        "reused": dict(CHECKPOINT_STATS["reused"]),
+        "executed": dict(CHECKPOINT_STATS["executed"]),
+    }
+
+
+__all__ = [
+    "STAGE_CHECKPOINTS",
+    "stage_fingerprint",
+    "restore_checkpoint",
+    "save_checkpoint",
+    "clear_checkpoints",
+    "checkpoint_stats",
+]
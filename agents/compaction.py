@@ -0,0 +1,273 @@
+# agents/compaction.py
+# -------------------------------------------------------------
+# Token-aware event compaction
+# - Runs after every invocation (compaction_interval=1) but only
+#   compacts when the uncompacted window is over budget:
+#   measured prompt tokens (usage_metadata) or estimated tokens,
+#   or raw event payload bytes
+# - Large tool responses are condensed first (largest first); if that
+#   alone brings the window under target, no LLM call is made
+# - Otherwise the condensed window goes to LlmEventSummarizer
+# - Per-session metrics: tokens before / after / saved
+# -------------------------------------------------------------
+
+import os
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from google.adk.apps.base_events_summarizer import BaseEventsSummarizer
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions, EventCompaction
+from google.adk.models.base_llm import BaseLlm
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from agents.projections import estimate_tokens
+
+
+COMPACTION_TOKEN_BUDGET = int(os.getenv("ITSM_COMPACTION_TOKEN_BUDGET", "8000"))
+COMPACTION_BYTES_BUDGET = int(os.getenv("ITSM_COMPACTION_BYTES_BUDGET", "65536"))
+# After compaction the window should be at most budget * ratio
+COMPACTION_TARGET_RATIO = float(os.getenv("ITSM_COMPACTION_TARGET_RATIO", "0.5"))
+TOOL_RESPONSE_MAX_BYTES = int(os.getenv("ITSM_COMPACTION_TOOL_RESPONSE_BYTES", "1500"))
+TOOL_RESPONSE_PREVIEW_CHARS = 300
+
+MAX_TRACKED_INVOCATIONS = 10000
+
+# invocation_id → session_id (filled by CompactionMetricsPlugin)
+_invocation_sessions: OrderedDict = OrderedDict()
+# session_id → counters
+COMPACTION_STATS: dict = {}
+
+
+# -------------------------------------------------------------
+# Measuring
+# -------------------------------------------------------------
+def _json(value) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def part_text(part: types.Part) -> str:
+    if part.text:
+        return part.text
+    if part.function_call:
+        return f"[call {part.function_call.name}] {_json(part.function_call.args)}"
+    if part.function_response:
+        fr = part.function_response
+        return f"[{fr.name} →] {_json(fr.response)}"
+    return ""
+
+
+def event_text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "\n".join(t for t in (part_text(p) for p in event.content.parts) if t)
+
+
+def measure_events(events: list) -> dict:
+    texts = [event_text(e) for e in events]
+    estimated = sum(estimate_tokens(t) for t in texts)
+    # Last real prompt size reported by the model, if any
+    measured = 0
+    for e in reversed(events):
+        usage = getattr(e, "usage_metadata", None)
+        if usage and usage.prompt_token_count:
+            measured = usage.prompt_token_count
+            break
+    return {
+        "tokens": max(estimated, measured),
+        "estimated_tokens": estimated,
+        "measured_prompt_tokens": measured,
+        "bytes": sum(len(t.encode("utf-8")) for t in texts),
+    }
+
+
+# -------------------------------------------------------------
+# Condensing tool responses
+# -------------------------------------------------------------
+def condense_response(name: str, response) -> str:
+    summary = {"tool": name}
+    if isinstance(response, dict):
+        if "status" in response:
+            summary["status"] = response["status"]
+        summary["keys"] = sorted(response.keys())[:12]
+    preview = _json(response)[:TOOL_RESPONSE_PREVIEW_CHARS]
+    return f"[{name} → condensed] {_json(summary)} {preview}…"
+
+
+def _condensed_lines(events: list, target_tokens: int) -> tuple:
+    # (author, text, is_large_tool_response, condensed_text) per part
+    lines = []
+    for e in events:
+        if not e.content or not e.content.parts:
+            continue
+        for p in e.content.parts:
+            text = part_text(p)
+            if not text:
+                continue
+            condensed = None
+            if (p.function_response
+                    and len(text.encode("utf-8")) > TOOL_RESPONSE_MAX_BYTES):
+                condensed = condense_response(
+                    p.function_response.name, p.function_response.response
+                )
+            lines.append([e.author, text, condensed])
+
+    total = sum(estimate_tokens(t) for _, t, _ in lines)
+    condensed_count = 0
+    # Largest tool responses first, stop once under target
+    for line in sorted(
+        (l for l in lines if l[2]), key=lambda l: len(l[1]), reverse=True
+    ):
+        if total <= target_tokens:
+            break
+        total -= estimate_tokens(line[1]) - estimate_tokens(line[2])
+        line[1] = line[2]
+        condensed_count += 1
+
+    return [(a, t) for a, t, _ in lines], total, condensed_count
+
+
+# -------------------------------------------------------------
+# Summarizer
+# -------------------------------------------------------------
+class TokenBudgetSummarizer(BaseEventsSummarizer):
+    def __init__(self, llm: BaseLlm,
+                 token_budget: int = COMPACTION_TOKEN_BUDGET,
+                 bytes_budget: int = COMPACTION_BYTES_BUDGET,
+                 target_ratio: float = COMPACTION_TARGET_RATIO):
+        self.token_budget = token_budget
+        self.bytes_budget = bytes_budget
+        self.target_tokens = int(token_budget * target_ratio)
+        self._llm_summarizer = LlmEventSummarizer(llm=llm)
+
+    async def maybe_summarize_events(
+        self, *, events: list
+    ) -> Optional[Event]:
+        if not events:
+            return None
+        session_id = _session_for(events)
+        size = measure_events(events)
+
+        if (size["tokens"] <= self.token_budget
+                and size["bytes"] <= self.bytes_budget):
+            _bump(session_id, skipped=1)
+            return None
+
+        lines, condensed_tokens, condensed_count = _condensed_lines(
+            events, self.target_tokens
+        )
+
+        if condensed_count and condensed_tokens <= self.target_tokens:
+            # Condensing tool output was enough → no LLM call
+            text = "\n".join(f"{author}: {t}" for author, t in lines)
+            content = types.Content(role="model", parts=[types.Part(text=text)])
+            result = _compaction_event(events, content)
+            mode = "condensed"
+        else:
+            condensed_events = [
+                Event(
+                    author=author,
+                    invocation_id=events[-1].invocation_id,
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=t)]
+                    ),
+                )
+                for author, t in lines
+            ]
+            summary = await self._llm_summarizer.maybe_summarize_events(
+                events=condensed_events
+            )
+            if summary is None:
+                return None
+            # Keep the real time range of the original events
+            result = _compaction_event(
+                events, summary.actions.compaction.compacted_content
+            )
+            mode = "llm"
+
+        after = sum(
+            estimate_tokens(p.text or "")
+            for p in result.actions.compaction.compacted_content.parts or []
+        )
+        _bump(session_id, compactions=1, tokens_before=size["tokens"],
+              tokens_after=after,
+              tokens_saved=max(0, size["tokens"] - after),
+              tool_responses_condensed=condensed_count,
+              **{f"{mode}_compactions": 1})
+
+        print(f"[COMPACTION] {mode}: {len(events)} events,"
+              f" ~{size['tokens']} → ~{after} tokens"
+              f" ({condensed_count} tool responses condensed)")
+        logging.info("[COMPACTION] session=%s mode=%s before=%d after=%d",
+                     session_id, mode, size["tokens"], after)
+        return result
+
+
+def _compaction_event(events: list, content: types.Content) -> Event:
+    content.role = "model"
+    return Event(
+        author="user",
+        invocation_id=Event.new_id(),
+        actions=EventActions(compaction=EventCompaction(
+            start_timestamp=events[0].timestamp,
+            end_timestamp=events[-1].timestamp,
+            compacted_content=content,
+        )),
+    )
+
+
+# -------------------------------------------------------------
+# Metrics
+# -------------------------------------------------------------
+def _session_for(events: list) -> str:
+    for e in reversed(events):
+        session_id = _invocation_sessions.get(e.invocation_id)
+        if session_id:
+            return session_id
+    return "unknown"
+
+
+def _bump(session_id: str, **counts):
+    stats = COMPACTION_STATS.setdefault(session_id, {})
+    for key, value in counts.items():
+        stats[key] = stats.get(key, 0) + value
+
+
+def compaction_stats(session_id: Optional[str] = None) -> dict:
+    if session_id is not None:
+        return dict(COMPACTION_STATS.get(session_id, {}))
+    totals: dict = {}
+    for stats in COMPACTION_STATS.values():
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return {"sessions": len(COMPACTION_STATS), **totals}
+
+
+class CompactionMetricsPlugin(BasePlugin):
+    """Maps invocations to sessions so compaction metrics are per session."""
+
+    def __init__(self):
+        super().__init__(name="compaction_metrics_plugin")
+
+    async def before_run_callback(
+        self, *, invocation_context: InvocationContext
+    ):
+        _invocation_sessions[invocation_context.invocation_id] = (
+            invocation_context.session.id
+        )
+        while len(_invocation_sessions) > MAX_TRACKED_INVOCATIONS:
+            _invocation_sessions.popitem(last=False)
+        return None
+
+
+__all__ = [
+    "TokenBudgetSummarizer",
+    "CompactionMetricsPlugin",
+    "measure_events",
+    "compaction_stats",
+]
@@ -0,0 +1,239 @@
+# agents/kb_retrieval.py
+# -------------------------------------------------------------
+# KB retrieval pre-stage (no LLM call)
+# - Runs vector_kb_search directly in code before KBAgent
+# - Filters by the classifier's category
+# - Writes top-k snippets into session state as `kb_context`
+# - Searches ticket history (FTS) in parallel → `prior_incidents`
+# - Optional speculative mode: search on the raw user message
+#   concurrently with IntakeAgent, then reuse / refine the result
+#   once the classification arrives
+# -------------------------------------------------------------
+
+import os
+import asyncio
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+
+from agents.projections import load_stage_json
+from tools.vector_kb import vector_kb_search
+from tools.ticket_store import ticket_store
+
+
+KB_TOP_K = int(os.getenv("ITSM_KB_TOP_K", "3"))
+KB_SNIPPET_CHARS = int(os.getenv("ITSM_KB_SNIPPET_CHARS", "500"))
+PRIOR_INCIDENTS_K = int(os.getenv("ITSM_PRIOR_INCIDENTS_K", "3"))
+
+# Speculative retrieval (disable with ITSM_SPECULATIVE_KB=0)
+SPECULATIVE_KB = os.getenv("ITSM_SPECULATIVE_KB", "1") != "0"
+SPECULATIVE_FETCH_K = KB_TOP_K * 4
+MAX_PENDING_SPECULATIONS = 256
+
+# invocation_id → in-flight speculative search task
+_speculative_tasks: dict[str, asyncio.Task] = {}
+
+
+def build_kb_query(intake) -> str:
+    data = load_stage_json(intake)
+    if not isinstance(data, dict):
+        return str(data or "")
+    parts = [data.get("issue_summary"), data.get("full_description")]
+    return " ".join(str(p) for p in parts if p)
+
+
+def classification_category(classification) -> str | None:
+    data = load_stage_json(classification)
+    if isinstance(data, dict):
+        return data.get("category") or None
+    return None
+
+
+def to_snippets(results: list) -> list:
+    return [
+        {
+            "text": r["text"][:KB_SNIPPET_CHARS],
+            "category": r.get("metadata", {}).get("category"),
+            "score": round(r["score"], 4),
+        }
+        for r in results
+    ]
+
+
+async def retrieve_kb_context(query: str, category: str | None = None,
+                              top_k: int = KB_TOP_K) -> list:
+    # Embedding + FAISS are blocking → keep them off the event loop
+    if not query:
+        return []
+    try:
+        res = await asyncio.to_thread(vector_kb_search, query, top_k, category)
+    except Exception as e:
+        print("[KB-RETRIEVAL] ⚠ Search failed:", e)
+        return []
+    return to_snippets(res.get("results", []))
+
+
+async def retrieve_prior_incidents(query: str,
+                                   limit: int = PRIOR_INCIDENTS_K) -> list:
+    if not query or limit <= 0:
+        return []
+    try:
+        hits = await ticket_store.search_tickets(query, limit=limit)
+    except Exception as e:
+        print("[KB-RETRIEVAL] ⚠ Ticket history search failed:", e)
+        return []
+    return [
+        {
+            "ticket_id": h["ticket_id"],
+            "summary": h["summary"],
+            "status": h["status"],
+            "resolution": h["resolution"],
+            "score": h["score"],
+        }
+        for h in hits
+    ]
+
+
+def user_message_text(ctx: InvocationContext) -> str:
+    content = ctx.user_content
+    if not content or not content.parts:
+        return ""
+    return " ".join(p.text for p in content.parts if getattr(p, "text", None))
+
+
+def refine_snippets(snippets: list, category: str | None,
+                    top_k: int = KB_TOP_K) -> list:
+    if not category:
+        return snippets[:top_k]
+    kept = [
+        s for s in snippets
+        if not s.get("category") or s["category"].lower() == category.lower()
+    ]
+    return kept[:top_k]
+
+
+def start_speculative_search(invocation_id: str, query: str):
+    # Bound the registry in case a pipeline dies before consuming its task
+    while len(_speculative_tasks) >= MAX_PENDING_SPECULATIONS:
+        stale_id = next(iter(_speculative_tasks))
+        _speculative_tasks.pop(stale_id).cancel()
+
+    _speculative_tasks[invocation_id] = asyncio.create_task(
+        retrieve_kb_context(query, None, SPECULATIVE_FETCH_K)
+    )
+
+
+async def take_speculative_result(invocation_id: str) -> list | None:
+    task = _speculative_tasks.pop(invocation_id, None)
+    if task is None:
+        return None
+    try:
+        return await task
+    except asyncio.CancelledError:
+        return None
+
+
+def discard_speculative_result(invocation_id: str):
+    task = _speculative_tasks.pop(invocation_id, None)
+    if task is not None:
+        task.cancel()
+
+
+def discard_speculative_search(callback_context):
+    # after_agent_callback on the pipeline: KBRetrievalAgent may have been
+    # skipped (storm gate / checkpoint) without consuming its search
+    discard_speculative_result(callback_context.invocation_id)
+    return None
+
+
+class SpeculativeKBAgent(BaseAgent):
+    """Starts a KB search on the raw message while IntakeAgent runs."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        query = user_message_text(ctx)
+        if not SPECULATIVE_KB or not query:
+            return
+        print("[KB-SPECULATIVE] Launching search on raw user message...")
+        start_speculative_search(ctx.invocation_id, query)
+        return
+        yield  # async generator with no events
+
+
+class KBRetrievalAgent(BaseAgent):
+    """Grounds KBAgent with real FAISS matches without an extra LLM call."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        query = build_kb_query(state.get("ticket_intake"))
+        category = classification_category(state.get("ticket_classification"))
+
+        print("\n" + "=" * 60)
+        print("[KB-RETRIEVAL] Pre-fetching KB snippets...")
+        print("Query:", query[:120])
+        print("Category:", category)
+        print("=" * 60)
+
+        prior_task = asyncio.create_task(retrieve_prior_incidents(query))
+
+        speculative = await take_speculative_result(ctx.invocation_id)
+        if speculative is not None:
+            snippets = refine_snippets(speculative, category)
+            # Not enough in-category hits among the over-fetched results
+            # → fall back to a filtered search with the structured query
+            if (len(snippets) < KB_TOP_K
+                    and len(speculative) >= SPECULATIVE_FETCH_K):
+                print("[KB-RETRIEVAL] Speculative result too thin → refining")
+                snippets = await retrieve_kb_context(query, category)
+            else:
+                print("[KB-RETRIEVAL] Reusing speculative result")
+        else:
+            snippets = await retrieve_kb_context(query, category)
+
+        prior_incidents = await prior_task
+
+        print(f"[KB-RETRIEVAL] {len(snippets)} snippets → state['kb_context']")
+        print(f"[KB-RETRIEVAL] {len(prior_incidents)} prior incidents"
+              " → state['prior_incidents']")
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={
+                "kb_context": snippets,
+                "prior_incidents": prior_incidents,
+            }),
+        )
+
+
+speculative_kb_agent = SpeculativeKBAgent(
+    name="SpeculativeKBAgent",
+    description="Starts KB retrieval on the raw message (no LLM call).",
+)
+
+kb_retrieval_agent = KBRetrievalAgent(
+    name="KBRetrievalAgent",
+    description="Fetches vector KB snippets for KBAgent (no LLM call).",
+)
+
+
+__all__ = [
+    "KBRetrievalAgent",
+    "SpeculativeKBAgent",
+    "kb_retrieval_agent",
+    "speculative_kb_agent",
+    "refine_snippets",
+    "discard_speculative_result",
+    "discard_speculative_search",
+    "retrieve_kb_context",
+    "retrieve_prior_incidents",
+    "build_kb_query",
+    "classification_category",
+]
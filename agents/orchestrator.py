@@ -23,6 +23,12 @@ from agents.session_tools import (
     retrieve_userinfo_tool,
     get_user_tickets_tool,
 )
+from tools.custom_tools import (
+    check_ticket_statuses_tool,
+    bulk_update_ticket_status_tool,
+    get_ticket_log_tool,
+    search_ticket_history_tool,
+)
 
 
 # Convert sub-agents to tools
@@ -59,6 +65,10 @@ Respond ONLY with the routing keyword.
         retrieve_userinfo_tool,
         save_userinfo_tool,
         get_user_tickets_tool,
+        check_ticket_statuses_tool,
+        bulk_update_ticket_status_tool,
+        get_ticket_log_tool,
+        search_ticket_history_tool,
         intake_tool,
         classifier_tool,
         kb_tool,
@@ -0,0 +1,299 @@
+# agents/projections.py
+# -------------------------------------------------------------
+# Declarative per-agent input projections
+# - Each stage declares which fields of upstream outputs it needs
+# - Long strings / lists are truncated to fixed budgets
+# - Applied by an InstructionProvider right before prompt rendering
+# - Prompt token estimates per stage (before / after) are recorded
+#   only with ITSM_PROJECTION_DEBUG=1 (renders the prompt twice)
+# -------------------------------------------------------------
+
+import os
+import re
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+
+# Disable with ITSM_PROMPT_PROJECTIONS=0 to render full upstream outputs
+PROJECTIONS_ENABLED = os.getenv("ITSM_PROMPT_PROJECTIONS", "1") != "0"
+PROJECTION_DEBUG = os.getenv("ITSM_PROJECTION_DEBUG", "0") == "1"
+
+# Rough chars-per-token ratio for Gemini text (estimate only)
+CHARS_PER_TOKEN = 4
+
+# Same placeholder pattern ADK uses for instruction templates
+_PLACEHOLDER = re.compile(r"{+[^{}]*}+")
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+# Fenced block inside prose ("Here is the result: ```json {...} ```")
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+# -------------------------------------------------------------
+# Projection spec
+# -------------------------------------------------------------
+@dataclass(frozen=True)
+class Projection:
+    fields: Optional[Tuple[str, ...]] = None   # None → keep all fields
+    max_chars: int = 400                       # per string value
+    max_items: int = 5                         # per list value
+
+
+# Per-agent projections: {agent_name: {state_key: Projection}}
+AGENT_PROJECTIONS: Dict[str, Dict[str, Projection]] = {
+    "ClassifierAgent": {
+        "ticket_intake": Projection(
+            fields=("issue_summary", "device", "urgency_guess",
+                    "full_description"),
+            max_chars=600,
+        ),
+    },
+    "KBAgent": {
+        "ticket_intake": Projection(
+            fields=("issue_summary", "device", "full_description"),
+        ),
+        "ticket_classification": Projection(
+            fields=("category", "subcategory", "priority"),
+        ),
+        "kb_context": Projection(
+            fields=("text", "score"),
+            max_chars=300,
+            max_items=3,
+        ),
+        "prior_incidents": Projection(
+            fields=("ticket_id", "summary", "status", "resolution"),
+            max_chars=200,
+            max_items=3,
+        ),
+    },
+    "DiagnosticsAgent": {
+        "ticket_intake": Projection(
+            fields=("issue_summary", "device", "full_description"),
+        ),
+        "ticket_classification": Projection(
+            fields=("category", "subcategory", "priority"),
+        ),
+    },
+    "ServiceNowCreatorAgent": {
+        "ticket_intake": Projection(
+            fields=("issue_summary", "user", "device", "urgency_guess"),
+            max_chars=200,
+        ),
+        "ticket_classification": Projection(
+            fields=("category", "subcategory", "impact", "priority",
+                    "recommended_team"),
+        ),
+        "kb_suggestions": Projection(
+            fields=("kb_match_found", "steps"),
+            max_chars=160,
+            max_items=3,
+        ),
+        "diagnostics_report": Projection(
+            fields=("diagnostics_required", "commands"),
+            max_chars=160,
+            max_items=3,
+        ),
+    },
+    "EscalationAgent": {
+        "ticket_classification": Projection(fields=("priority",)),
+    },
+    "StatusCheckerAgent": {
+        "ticket_creation_result": Projection(
+            fields=("ticket_id", "priority"),
+        ),
+    },
+    "StatusUpdaterAgent": {
+        "ticket_status": Projection(max_chars=200),
+    },
+}
+
+
+# Per-stage prompt token estimates
+PROMPT_TOKEN_STATS: Dict[str, Dict[str, int]] = {}
+
+
+# -------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def load_stage_json(value: Any) -> Any:
+    """
+    Stage outputs are stored as raw model text (often fenced JSON).
+    Returns the parsed object, or the original value if not JSON.
+    """
+    if not isinstance(value, str):
+        return value
+    text = _JSON_FENCE.sub("", value.strip())
+    try:
+        return json.loads(text)
+    except (ValueError, TypeError):
+        pass
+    block = _JSON_BLOCK.search(value)
+    if block:
+        try:
+            return json.loads(block.group(1))
+        except (ValueError, TypeError):
+            pass
+    return value
+
+
+def _truncate(value: Any, spec: Projection) -> Any:
+    if isinstance(value, str):
+        if len(value) > spec.max_chars:
+            return value[: spec.max_chars] + "…"
+        return value
+    if isinstance(value, list):
+        items = [_truncate(v, spec) for v in value[: spec.max_items]]
+        if len(value) > spec.max_items:
+            items.append(f"... (+{len(value) - spec.max_items} more)")
+        return items
+    if isinstance(value, dict):
+        return {k: _truncate(v, spec) for k, v in value.items()}
+    return value
+
+
+def _select(data: Any, fields: Optional[Tuple[str, ...]]) -> Any:
+    if fields is None:
+        return data
+    if isinstance(data, dict):
+        return {k: data[k] for k in fields if k in data}
+    if isinstance(data, list):
+        return [_select(item, fields) for item in data]
+    return data
+
+
+def project_value(value: Any, spec: Projection) -> Any:
+    data = _select(load_stage_json(value), spec.fields)
+    return _truncate(data, spec)
+
+
+def _to_prompt_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _resolve(state, var_name: str) -> Tuple[bool, Any]:
+    # Supports {key} and dotted {key.field} lookups into JSON outputs
+    key, _, path = var_name.partition(".")
+    if key not in state:
+        return False, None
+    value = state[key]
+    for part in filter(None, path.split(".")):
+        value = load_stage_json(value)
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def _is_state_name(var_name: str) -> bool:
+    key = var_name.split(".", 1)[0]
+    parts = key.split(":")
+    if len(parts) == 1:
+        return key.isidentifier()
+    return len(parts) == 2 and parts[0] in ("app", "user", "temp") \
+        and parts[1].isidentifier()
+
+
+# -------------------------------------------------------------
+# Rendering
+# -------------------------------------------------------------
+def render_instruction(agent_name: str, template: str, state,
+                       project: bool = True) -> str:
+    projections = AGENT_PROJECTIONS.get(agent_name, {}) if project else {}
+
+    def replace(match):
+        var_name = match.group().lstrip("{").rstrip("}").strip()
+        optional = var_name.endswith("?")
+        var_name = var_name.removesuffix("?")
+        if not _is_state_name(var_name):
+            return match.group()
+
+        found, value = _resolve(state, var_name)
+        if not found:
+            if optional:
+                return ""
+            if "." in var_name:
+                # Upstream output is prose / empty: keep the placeholder
+                # verbatim, as plain ADK templating does for dotted names
+                logging.warning(
+                    "[PROJECTION] %s: `%s` not found in upstream output",
+                    agent_name, var_name,
+                )
+                return match.group()
+            raise KeyError(f"Context variable not found: `{var_name}`.")
+
+        spec = projections.get(var_name)
+        if spec is not None:
+            value = project_value(value, spec)
+        return _to_prompt_text(value)
+
+    return _PLACEHOLDER.sub(replace, template)
+
+
+def _record_stats(agent_name: str, before: str, after: str):
+    stats = PROMPT_TOKEN_STATS.setdefault(
+        agent_name, {"calls": 0, "tokens_before": 0, "tokens_after": 0}
+    )
+    before_tokens = estimate_tokens(before)
+    after_tokens = estimate_tokens(after)
+    stats["calls"] += 1
+    stats["tokens_before"] += before_tokens
+    stats["tokens_after"] += after_tokens
+
+    print(f"[PROJECTION] {agent_name} prompt ~{before_tokens} → "
+          f"~{after_tokens} tokens")
+    logging.info(
+        "[PROJECTION] %s prompt_tokens before=%d after=%d",
+        agent_name, before_tokens, after_tokens,
+    )
+
+
+def projected_instruction(agent_name: str, template: str):
+    """
+    Builds an InstructionProvider for `agent_name` that renders `template`
+    from session state with the agent's projections applied.
+    """
+    def provider(context: ReadonlyContext) -> str:
+        state = context.state
+        projected = render_instruction(agent_name, template, state,
+                                       project=PROJECTIONS_ENABLED)
+        if PROJECTION_DEBUG:
+            full = projected if not PROJECTIONS_ENABLED else \
+                render_instruction(agent_name, template, state, project=False)
+            _record_stats(agent_name, full, projected)
+        return projected
+
+    return provider
+
+
+def projection_report() -> Dict[str, Dict[str, int]]:
+    report = {}
+    for agent_name, stats in PROMPT_TOKEN_STATS.items():
+        report[agent_name] = {
+            **stats,
+            "tokens_saved": stats["tokens_before"] - stats["tokens_after"],
+        }
+    return report
+
+
+__all__ = [
+    "Projection",
+    "AGENT_PROJECTIONS",
+    "PROMPT_TOKEN_STATS",
+    "estimate_tokens",
+    "load_stage_json",
+    "project_value",
+    "render_instruction",
+    "projected_instruction",
+    "projection_report",
+]
@@ -0,0 +1,323 @@
+# agents/retention.py
+# -------------------------------------------------------------
+# Session / event retention for the session DB
+# - Sessions idle longer than ITSM_RETENTION_DAYS are archived to
+#   gzip JSONL (one file per batch: session row + its events)
+# - Archive is fsync'ed before the batch is deleted; each batch is
+#   its own short transaction, so the DB is never locked for long
+# - SQLite: incremental vacuum returns freed pages to the OS
+# - Dry-run reports what would be archived
+# - The server runs a pass every ITSM_RETENTION_INTERVAL seconds
+#   (ITSM_RETENTION_BACKGROUND=0 to disable); a lock file in the
+#   archive dir lets only one worker process run a given pass
+#
+# CLI:
+#   python -m agents.retention                  # dry run (default)
+#   python -m agents.retention --days 14 --run  # archive + delete
+#   python -m agents.retention --run --vacuum
+# -------------------------------------------------------------
+
+import os
+import gzip
+import contextlib
+import json
+import base64
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every worker runs
+    fcntl = None
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from agents.session_config import SESSION_DB_URL, create_session_service
+
+
+RETENTION_DAYS = float(os.getenv("ITSM_RETENTION_DAYS", "30"))
+RETENTION_BATCH = int(os.getenv("ITSM_RETENTION_BATCH", "100"))
+RETENTION_ARCHIVE_DIR = os.getenv(
+    "ITSM_RETENTION_ARCHIVE_DIR", os.path.join("archive", "sessions")
+)
+RETENTION_INTERVAL_SEC = float(os.getenv("ITSM_RETENTION_INTERVAL", "3600"))
+RETENTION_BACKGROUND = os.getenv("ITSM_RETENTION_BACKGROUND", "1") != "0"
+VACUUM_PAGES_PER_STEP = 1000
+# Pause between batches so live traffic gets the write lock
+BATCH_PAUSE_SEC = 0.05
+
+
+def _cutoff(days: float) -> datetime:
+    # ADK stores naive UTC timestamps
+    return (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b64": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _row(mapping) -> dict:
+    return {k: _jsonable(v) for k, v in mapping.items()}
+
+
+@contextlib.contextmanager
+def _pass_lock(archive_dir: str):
+    # Yields False when another process is already running a pass
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, ".retention.lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SessionRetention:
+    def __init__(self, engine: AsyncEngine,
+                 archive_dir: str = RETENTION_ARCHIVE_DIR,
+                 batch_size: int = RETENTION_BATCH):
+        self.engine = engine
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.sqlite = engine.dialect.name == "sqlite"
+
+    # ---------------------------------------------------------
+    # Sizing
+    # ---------------------------------------------------------
+    async def plan(self, days: float = RETENTION_DAYS) -> dict:
+        cutoff = _cutoff(days)
+        async with self.engine.connect() as conn:
+            sessions = (await conn.execute(text(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(state AS TEXT))), 0)"
+                " FROM sessions WHERE update_time < :cutoff"
+            ), {"cutoff": cutoff})).one()
+            events = (await conn.execute(text(
+                "SELECT COUNT(*),"
+                " COALESCE(SUM(LENGTH(CAST(e.content AS TEXT))), 0)"
+                " FROM events e JOIN sessions s"
+                " ON e.app_name = s.app_name AND e.user_id = s.user_id"
+                " AND e.session_id = s.id"
+                " WHERE s.update_time < :cutoff"
+            ), {"cutoff": cutoff})).one()
+            total = (await conn.execute(
+                text("SELECT COUNT(*) FROM sessions")
+            )).scalar()
+
+        plan = {
+            "cutoff": cutoff.isoformat(),
+            "sessions_total": total,
+            "sessions_to_archive": sessions[0],
+            "events_to_archive": events[0],
+            "approx_payload_bytes": sessions[1] + events[1],
+            "batches": -(-sessions[0] // self.batch_size),
+        }
+        if self.sqlite:
+            async with self.engine.connect() as conn:
+                page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+                pages = (await conn.execute(text("PRAGMA page_count"))).scalar()
+                free = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+                auto_vacuum = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            plan.update({
+                "db_bytes": page_size * pages,
+                "free_bytes": page_size * free,
+                "incremental_vacuum": auto_vacuum == 2,
+            })
+        return plan
+
+    # ---------------------------------------------------------
+    # Archive + delete
+    # ---------------------------------------------------------
+    async def _archive_batch(self, cutoff: datetime, batch_no: int,
+                             stamp: str) -> int:
+        async with self.engine.connect() as conn:
+            sessions = (await conn.execute(text(
+                "SELECT * FROM sessions WHERE update_time < :cutoff"
+                " ORDER BY update_time LIMIT :limit"
+            ), {"cutoff": cutoff, "limit": self.batch_size})).mappings().all()
+            if not sessions:
+                return 0
+
+            records = []
+            for s in sessions:
+                events = (await conn.execute(text(
+                    "SELECT * FROM events WHERE app_name = :app"
+                    " AND user_id = :user AND session_id = :sid"
+                    " ORDER BY timestamp"
+                ), {"app": s["app_name"], "user": s["user_id"],
+                    "sid": s["id"]})).mappings().all()
+                records.append({
+                    "session": _row(s),
+                    "events": [_row(e) for e in events],
+                })
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(
+            self.archive_dir, f"sessions-{stamp}-{batch_no:05d}.jsonl.gz"
+        )
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())  # archive is durable before rows go away
+
+        keys = [{"app": s["app_name"], "user": s["user_id"], "sid": s["id"],
+                 "cutoff": cutoff} for s in sessions]
+        async with self.engine.begin() as conn:
+            # Re-check the age: a session touched meanwhile stays live
+            await conn.execute(text(
+                "DELETE FROM events WHERE app_name = :app"
+                " AND user_id = :user AND session_id = :sid"
+                " AND EXISTS (SELECT 1 FROM sessions WHERE app_name = :app"
+                " AND user_id = :user AND id = :sid"
+                " AND update_time < :cutoff)"
+            ), keys)
+            await conn.execute(text(
+                "DELETE FROM sessions WHERE app_name = :app"
+                " AND user_id = :user AND id = :sid"
+                " AND update_time < :cutoff"
+            ), keys)
+
+        print(f"[RETENTION] Batch {batch_no}: {len(sessions)} sessions → {path}")
+        return len(sessions)
+
+    async def run(self, days: float = RETENTION_DAYS,
+                  max_batches: Optional[int] = None) -> dict:
+        cutoff = _cutoff(days)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        archived = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            count = await self._archive_batch(cutoff, batches, stamp)
+            if not count:
+                break
+            archived += count
+            batches += 1
+            await asyncio.sleep(BATCH_PAUSE_SEC)
+        return {"sessions_archived": archived, "batches": batches,
+                "cutoff": cutoff.isoformat()}
+
+    # ---------------------------------------------------------
+    # Incremental vacuum (SQLite)
+    # ---------------------------------------------------------
+    async def vacuum(self, enable: bool = False) -> dict:
+        if not self.sqlite:
+            return {"vacuumed": False, "reason": "not sqlite"}
+
+        async with self.engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode != 2:
+                if not enable:
+                    return {"vacuumed": False,
+                            "reason": "auto_vacuum is not INCREMENTAL"
+                                      " (rerun with --enable-incremental)"}
+                # One-off full VACUUM to switch modes (locks the DB)
+                print("[RETENTION] Switching to auto_vacuum=INCREMENTAL...")
+                await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+                await conn.execute(text("VACUUM"))
+
+            freed_pages = 0
+            free = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+            while free:
+                step = min(free, VACUUM_PAGES_PER_STEP)
+                # The pragma frees one page per VM step and the sqlite3
+                # cursor only steps once; executescript runs it to the end
+                await conn.commit()
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.executescript(
+                    f"PRAGMA incremental_vacuum({step})"
+                )
+                left = (await conn.execute(
+                    text("PRAGMA freelist_count"))).scalar()
+                if left >= free:
+                    break
+                freed_pages += free - left
+                free = left
+                await asyncio.sleep(BATCH_PAUSE_SEC)
+            page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+
+        return {"vacuumed": True, "freed_bytes": freed_pages * page_size}
+
+    # ---------------------------------------------------------
+    # Background loop
+    # ---------------------------------------------------------
+    async def run_forever(self, days: float = RETENTION_DAYS,
+                          interval: float = RETENTION_INTERVAL_SEC):
+        while True:
+            try:
+                with _pass_lock(self.archive_dir) as owned:
+                    if owned:
+                        result = await self.run(days)
+                        if result["sessions_archived"]:
+                            await self.vacuum()
+            except Exception as e:
+                print(f"[RETENTION] ⚠ Retention pass failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def start_retention_task(engine: AsyncEngine,
+                         days: float = RETENTION_DAYS,
+                         interval: float = RETENTION_INTERVAL_SEC) -> asyncio.Task:
+    return asyncio.create_task(SessionRetention(engine).run_forever(days, interval))
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+async def _main():
+    parser = argparse.ArgumentParser(
+        prog="python -m agents.retention",
+        description="Archive and delete old ADK sessions.",
+    )
+    parser.add_argument("--url", default=SESSION_DB_URL)
+    parser.add_argument("--days", type=float, default=RETENTION_DAYS)
+    parser.add_argument("--batch", type=int, default=RETENTION_BATCH)
+    parser.add_argument("--archive-dir", default=RETENTION_ARCHIVE_DIR)
+    parser.add_argument("--run", action="store_true",
+                        help="Archive and delete (default is a dry run)")
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Run incremental vacuum afterwards (SQLite)")
+    parser.add_argument("--enable-incremental", action="store_true",
+                        help="Switch the DB to auto_vacuum=INCREMENTAL once")
+    args = parser.parse_args()
+
+    service = create_session_service(args.url)
+    retention = SessionRetention(service.db_engine, args.archive_dir, args.batch)
+    try:
+        print(json.dumps(await retention.plan(args.days), indent=2))
+        if args.run:
+            print(json.dumps(
+                await retention.run(args.days, args.max_batches), indent=2
+            ))
+        if args.vacuum:
+            print(json.dumps(
+                await retention.vacuum(args.enable_incremental), indent=2
+            ))
+    finally:
+        await service.db_engine.dispose()
+
+
+__all__ = [
+    "RETENTION_BACKGROUND",
+    "SessionRetention",
+    "start_retention_task",
+]
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
+
@@ -0,0 +1,103 @@
+# agents/session_config.py
+# -------------------------------------------------------------
+# Session storage configuration for DatabaseSessionService
+# - URL from ITSM_SESSION_DB_URL (SQLite by default, Postgres for
+#   multi-node, e.g. postgresql+asyncpg://user:pw@host/itsm)
+# - SQLite: WAL, synchronous=NORMAL, busy_timeout on every connection
+#   so concurrent sessions wait instead of "database is locked";
+#   new DBs use auto_vacuum=INCREMENTAL (see agents/retention.py)
+# - Connection pool sizing for both backends
+# - create_session retries the app/user state insert race
+# -------------------------------------------------------------
+
+import os
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from google.adk.sessions import DatabaseSessionService
+
+from plugins.metrics import metrics
+
+
+SESSION_DB_URL = os.getenv(
+    "ITSM_SESSION_DB_URL", "sqlite+aiosqlite:///itsm_sessions.db"
+)
+SESSION_BUSY_TIMEOUT_MS = int(os.getenv("ITSM_SESSION_BUSY_TIMEOUT_MS", "10000"))
+SESSION_POOL_SIZE = int(os.getenv("ITSM_SESSION_POOL_SIZE", "5"))
+SESSION_MAX_OVERFLOW = int(os.getenv("ITSM_SESSION_MAX_OVERFLOW", "10"))
+SESSION_POOL_TIMEOUT = float(os.getenv("ITSM_SESSION_POOL_TIMEOUT", "30"))
+SESSION_POOL_RECYCLE = int(os.getenv("ITSM_SESSION_POOL_RECYCLE", "1800"))
+
+
+def is_sqlite(db_url: str) -> bool:
+    return db_url.startswith("sqlite")
+
+
+def _is_memory(db_url: str) -> bool:
+    return ":memory:" in db_url or db_url.rstrip("/").endswith("sqlite+aiosqlite:")
+
+
+def engine_kwargs(db_url: str) -> dict:
+    if is_sqlite(db_url):
+        if _is_memory(db_url):
+            return {}  # single shared connection (StaticPool)
+        return {
+            # sqlite3 driver-level wait, in seconds
+            "connect_args": {"timeout": SESSION_BUSY_TIMEOUT_MS / 1000},
+            "pool_size": SESSION_POOL_SIZE,
+            "max_overflow": SESSION_MAX_OVERFLOW,
+            "pool_timeout": SESSION_POOL_TIMEOUT,
+        }
+    return {
+        "pool_size": SESSION_POOL_SIZE,
+        "max_overflow": SESSION_MAX_OVERFLOW,
+        "pool_timeout": SESSION_POOL_TIMEOUT,
+        "pool_recycle": SESSION_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new DB; lets agents/retention.py free pages
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SESSION_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+class TunedDatabaseSessionService(DatabaseSessionService):
+    async def create_session(self, **kwargs):
+        # ADK checks for the app_states / user_states row, then inserts it;
+        # the first concurrent sessions of a user race on that insert.
+        # On retry the row exists and the insert is skipped.
+        for attempt in range(3):
+            try:
+                return await super().create_session(**kwargs)
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+                metrics.inc("itsm_retries_total", kind="session_create")
+
+
+def create_session_service(db_url: str | None = None) -> DatabaseSessionService:
+    db_url = db_url or SESSION_DB_URL
+    service = TunedDatabaseSessionService(
+        db_url=db_url, **engine_kwargs(db_url)
+    )
+    if is_sqlite(db_url):
+        event.listen(service.db_engine.sync_engine, "connect", _sqlite_pragmas)
+
+    backend = db_url.split(":", 1)[0]
+    print(f"[SESSION-DB] {backend} | pool={SESSION_POOL_SIZE}"
+          f"+{SESSION_MAX_OVERFLOW}")
+    return service
+
+
+__all__ = [
+    "SESSION_DB_URL",
+    "engine_kwargs",
+    "TunedDatabaseSessionService",
+    "create_session_service",
+]
@@ -1,12 +1,30 @@
 # agents/session_tools.py
 # -------------------------------------------------------------
 # Session tools (with debug prints)
+# User ticket history lives in the ticket DB (user_ticket_history),
+# not in `user:tickets` state
+# ticket-history pages are cached in agents/user_cache.py
 # -------------------------------------------------------------
 
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 from google.adk.tools.function_tool import FunctionTool
 from google.adk.tools.tool_context import ToolContext
 
+from tools.ticket_store import ticket_store
+from agents.user_cache import user_tickets_cache
+
+
+MAX_TICKETS_PAGE = 100
+
+
+def _userinfo_from_state(state) -> dict:
+    return {
+        "id": state.get("user:id"),
+        "name": state.get("user:name"),
+        "department": state.get("user:department"),
+        "location": state.get("user:location"),
+    }
+
 
 def save_userinfo(user_id: str, name: str = None,
                   department: str = None,
@@ -37,44 +55,89 @@ def save_userinfo(user_id: str, name: str = None,
 
 
 def retrieve_userinfo(tool_context: ToolContext = None):
-    data = {
-        "id": tool_context.state.get("user:id"),
-        "name": tool_context.state.get("user:name"),
-        "department": tool_context.state.get("user:department"),
-        "location": tool_context.state.get("user:location"),
-    }
+    # user:* state is already loaded with the session: no cache needed
+    data = _userinfo_from_state(tool_context.state)
     print(f"[SESSION] Retrieved userinfo: {data}")
     return {"status": "success", "data": data}
 
 
-def save_ticket_for_user(ticket_id: str, summary: str,
-                         status: str, priority: str,
-                         tool_context: ToolContext = None):
+def session_user_id(tool_context) -> str | None:
+    if tool_context is None:
+        return None
+    return tool_context.state.get("user:id") or tool_context.user_id
+
+
+async def _migrate_state_tickets(user_id: str, tool_context):
+    # Older sessions kept the whole history in state → move it once
+    legacy = tool_context.state.get("user:tickets")
+    if not legacy:
+        return
+    await ticket_store.add_user_tickets(user_id, legacy)
+    tool_context.state["user:tickets"] = None
+    user_tickets_cache.invalidate(user_id)
+    print(f"[SESSION] Migrated {len(legacy)} tickets out of session state.")
+
+
+async def save_ticket_for_user(ticket_id: str, summary: str,
+                               status: str, priority: str,
+                               tool_context: ToolContext = None):
 
     print(f"[SESSION] Saving ticket: {ticket_id}, {summary}, {priority}")
 
-    tickets: List[dict] = tool_context.state.get("user:tickets", [])
+    user_id = session_user_id(tool_context)
+    if not user_id:
+        return {"status": "error", "error_message": "No user in session."}
+
+    await _migrate_state_tickets(user_id, tool_context)
     new_ticket = {
         "ticket_id": ticket_id,
         "summary": summary,
         "status": status,
         "priority": priority,
     }
-
-    tickets.append(new_ticket)
-    tool_context.state["user:tickets"] = tickets
+    saved = await ticket_store.add_user_tickets(
+        user_id, [new_ticket], session_id=tool_context.session.id,
+    )
+    user_tickets_cache.invalidate(user_id)
 
     return {
         "status": "success",
         "message": "Ticket saved to user history.",
-        "ticket": new_ticket,
+        "ticket": saved[0],
     }
 
 
-def get_user_tickets(tool_context: ToolContext = None):
-    tickets = tool_context.state.get("user:tickets", [])
-    print(f"[SESSION] Retrieved {len(tickets)} tickets.")
-    return {"status": "success", "tickets": tickets, "count": len(tickets)}
+async def get_user_tickets(status: Optional[str] = None,
+                           limit: int = 20,
+                           cursor: Optional[int] = None,
+                           tool_context: ToolContext = None):
+    """
+    Newest first. Pass next_cursor from the previous page to continue.
+    """
+    user_id = session_user_id(tool_context)
+    if not user_id:
+        return {"status": "error", "error_message": "No user in session."}
+
+    await _migrate_state_tickets(user_id, tool_context)
+    limit = max(1, min(int(limit), MAX_TICKETS_PAGE))
+
+    page_key = (status, limit, cursor)
+    pages = user_tickets_cache.get(user_id) or {}
+    page = pages.get(page_key)
+    if page is None:
+        page = await ticket_store.list_user_tickets(
+            user_id, status=status, limit=limit, cursor=cursor,
+        )
+        user_tickets_cache.set(user_id, {**pages, page_key: page})
+        print(f"[SESSION] Retrieved {len(page['tickets'])} tickets.")
+    else:
+        print(f"[SESSION] Retrieved {len(page['tickets'])} tickets (cached).")
+    return {
+        "status": "success",
+        "tickets": page["tickets"],
+        "count": len(page["tickets"]),
+        "next_cursor": page["next_cursor"],
+    }
 
 
 # Wrap tools
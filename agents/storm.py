@@ -0,0 +1,404 @@
+# agents/storm.py
+# -------------------------------------------------------------
+# Incident storm detection + ticket coalescing
+# - Embeds each intake and compares it against open master incidents
+#   inside a sliding time window
+# - Near-duplicates are counted toward the master's cluster; once the
+#   cluster reaches ITSM_STORM_MIN_CLUSTER reports, further duplicates
+#   are attached as children of the master ticket and skip the
+#   remaining pipeline stages (no new INC is created)
+# - Storm markers are cleared when the pipeline finishes, so they never
+#   leak into later tickets / AgentTool calls of the same session
+# - Masters whose ticket is resolved / closed stop absorbing reports
+#   (status tools notify the coalescer; other processes' changes are
+#   seen in the ticket store before a master is reused)
+# - Tunable thresholds (env) and storm metrics (/healthz, counters on
+#   /metrics)
+# -------------------------------------------------------------
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import AsyncGenerator, Dict, List, Optional
+
+import numpy as np
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events.event import Event
+from google.genai import types
+
+from agents.projections import load_stage_json
+from agents.kb_retrieval import discard_speculative_result
+from agents.session_tools import save_ticket_for_user
+from plugins.metrics import metrics
+from tools.sla_engine import CLOSED_STATUSES
+from tools.ticket_store import ticket_store
+from tools.vector_kb import embed_text
+
+
+STORM_COALESCING = os.getenv("ITSM_STORM_COALESCING", "1") != "0"
+STORM_WINDOW_SEC = float(os.getenv("ITSM_STORM_WINDOW_SEC", "900"))
+STORM_SIMILARITY = float(os.getenv("ITSM_STORM_SIMILARITY", "0.92"))
+STORM_MIN_CLUSTER = int(os.getenv("ITSM_STORM_MIN_CLUSTER", "5"))
+STORM_MASTER_WAIT_SEC = float(os.getenv("ITSM_STORM_MASTER_WAIT_SEC", "60"))
+
+# Content of stages skipped for a coalesced ticket
+COALESCED_MARKER = "[skipped: coalesced into "
+
+
+# -------------------------------------------------------------
+# Master incident (one cluster)
+# -------------------------------------------------------------
+class MasterIncident:
+    def __init__(self, embedding: np.ndarray, summary: str, now: float):
+        self.cluster_id = uuid.uuid4().hex[:12]
+        self.embedding = embedding
+        self.summary = summary
+        self.created_at = now
+        self.last_seen = now
+        # Reports below the storm threshold (own tickets) + coalesced ones
+        self.members: List[str] = []
+        self.children: List[str] = []
+        # Resolved with the INC id once ServiceNowCreatorAgent finishes
+        self.ticket_id: asyncio.Future = (
+            asyncio.get_running_loop().create_future()
+        )
+
+    @property
+    def size(self) -> int:
+        return 1 + len(self.members) + len(self.children)
+
+
+async def _ticket_open(ticket_id: str) -> bool:
+    try:
+        ticket = await ticket_store.get_ticket(ticket_id)
+    except Exception as e:
+        print("[STORM] ⚠ Could not read master ticket status:", e)
+        return True
+    if ticket is None:
+        return True  # master not stored (yet): keep the cluster
+    return (ticket["status"] or "").lower() not in CLOSED_STATUSES
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+# -------------------------------------------------------------
+# Coalescer
+# -------------------------------------------------------------
+class StormCoalescer:
+    def __init__(self, window_sec: float = STORM_WINDOW_SEC,
+                 similarity: float = STORM_SIMILARITY,
+                 min_cluster: int = STORM_MIN_CLUSTER,
+                 master_wait_sec: float = STORM_MASTER_WAIT_SEC):
+        self.window_sec = window_sec
+        self.similarity = similarity
+        self.min_cluster = min_cluster
+        self.master_wait_sec = master_wait_sec
+
+        self._masters: Dict[str, MasterIncident] = {}
+
+        self.intakes_seen = 0
+        self.coalesced = 0
+        self.masters_created = 0
+        self.master_timeouts = 0
+
+    # ---------------------------------------------------------
+    # Window maintenance
+    # ---------------------------------------------------------
+    def _prune(self, now: float):
+        expired = [
+            cid for cid, m in self._masters.items()
+            if now - m.last_seen > self.window_sec
+        ]
+        for cid in expired:
+            master = self._masters.pop(cid)
+            if not master.ticket_id.done():
+                master.ticket_id.cancel()
+
+    def _best_match(self, embedding: np.ndarray) -> Optional[MasterIncident]:
+        if not self._masters:
+            return None
+        masters = list(self._masters.values())
+        scores = np.stack([m.embedding for m in masters]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity:
+            return masters[best]
+        return None
+
+    # ---------------------------------------------------------
+    # Admission: returns (master, parent_ticket_id or None)
+    # - new cluster        → (master, None): creates the master ticket
+    # - below min_cluster  → (None, None): counted, creates its own ticket
+    # - storm              → (master, parent_id): coalesced
+    # ---------------------------------------------------------
+    async def admit(self, embedding, summary: str, child_ref: str):
+        embedding = _normalize(embedding)
+        self.intakes_seen += 1
+
+        while True:
+            now = time.time()
+            self._prune(now)
+
+            master = self._best_match(embedding)
+            if master is None:
+                master = MasterIncident(embedding, summary, now)
+                self._masters[master.cluster_id] = master
+                self.masters_created += 1
+                metrics.inc("itsm_storm_masters_total")
+                return master, None
+
+            future = master.ticket_id
+            if (future.done() and not future.cancelled()
+                    and not await _ticket_open(future.result())):
+                # Resolved through another process → new cluster
+                self.close_incident(future.result())
+                continue
+
+            master.last_seen = now
+            if master.size < self.min_cluster:
+                # Two similar reports are not a storm yet: keep separate
+                # tickets until the cluster reaches the threshold
+                master.members.append(child_ref)
+                print(f"[STORM] Similar to cluster {master.cluster_id} "
+                      f"({master.size}/{self.min_cluster}) → own ticket")
+                if master.size == self.min_cluster:
+                    self._storm_detected(master)
+                return None, None
+            try:
+                parent_id = await asyncio.wait_for(
+                    asyncio.shield(master.ticket_id), self.master_wait_sec
+                )
+                break
+            except asyncio.TimeoutError:
+                # Master never produced a ticket → drop it and re-match
+                self.master_timeouts += 1
+                self._masters.pop(master.cluster_id, None)
+            except asyncio.CancelledError:
+                # This run was cancelled (disconnect, shutdown, lost lease)
+                task = asyncio.current_task()
+                if task is not None and task.cancelling():
+                    raise
+                # The master's future was cancelled (failed / pruned)
+                self._masters.pop(master.cluster_id, None)
+
+        master.children.append(child_ref)
+        self.coalesced += 1
+        metrics.inc("itsm_storm_coalesced_total")
+        return master, parent_id
+
+    def _storm_detected(self, master: MasterIncident):
+        ticket = master.cluster_id
+        if master.ticket_id.done() and not master.ticket_id.cancelled():
+            ticket = master.ticket_id.result()
+        print(f"[STORM] ⚡ Storm detected on {ticket}: {master.summary}")
+        logging.warning(
+            "[STORM] storm detected ticket=%s size=%d summary=%s",
+            ticket, master.size, master.summary,
+        )
+
+    def resolve_master(self, cluster_id: str, ticket_id: str):
+        master = self._masters.get(cluster_id)
+        if master and not master.ticket_id.done():
+            master.ticket_id.set_result(ticket_id)
+
+    def fail_master(self, cluster_id: str):
+        master = self._masters.pop(cluster_id, None)
+        if master and not master.ticket_id.done():
+            master.ticket_id.cancel()
+
+    def close_incident(self, ticket_id: str):
+        # Resolved / closed masters stop absorbing new tickets
+        for cid, master in list(self._masters.items()):
+            if (master.ticket_id.done() and not master.ticket_id.cancelled()
+                    and master.ticket_id.result() == ticket_id):
+                self._masters.pop(cid)
+
+    # ---------------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------------
+    def metrics(self) -> dict:
+        self._prune(time.time())
+        storms = [m for m in self._masters.values()
+                  if m.size >= self.min_cluster]
+        return {
+            "intakes_seen": self.intakes_seen,
+            "coalesced": self.coalesced,
+            "coalesce_rate": (
+                self.coalesced / self.intakes_seen if self.intakes_seen else 0.0
+            ),
+            "masters_created": self.masters_created,
+            "master_timeouts": self.master_timeouts,
+            "open_masters": len(self._masters),
+            "active_storms": len(storms),
+            "largest_cluster": max(
+                (m.size for m in self._masters.values()), default=0
+            ),
+            "storms": [
+                {
+                    "ticket_id": m.ticket_id.result(),
+                    "summary": m.summary,
+                    "size": m.size,
+                    "age_sec": round(time.time() - m.created_at, 1),
+                }
+                for m in storms
+                if m.ticket_id.done() and not m.ticket_id.cancelled()
+            ],
+        }
+
+
+storm_coalescer = StormCoalescer()
+
+
+def storm_metrics() -> dict:
+    return storm_coalescer.metrics()
+
+
+# -------------------------------------------------------------
+# Pipeline integration
+# -------------------------------------------------------------
+def _intake_text(intake: dict) -> str:
+    parts = [intake.get("issue_summary"), intake.get("device"),
+             intake.get("full_description")]
+    return " | ".join(str(p) for p in parts if p)
+
+
+class StormGateAgent(BaseAgent):
+    """Coalesces near-duplicate intakes into an open master incident."""
+
+    async def _admit(self, ctx: InvocationContext, intake):
+        if not STORM_COALESCING:
+            return None, None
+        if not isinstance(intake, dict) or not _intake_text(intake):
+            return None, None
+        try:
+            embedding = await asyncio.to_thread(embed_text, _intake_text(intake))
+        except Exception as e:
+            print("[STORM] ⚠ Embedding failed, skipping coalescing:", e)
+            return None, None
+        return await storm_coalescer.admit(
+            embedding, intake.get("issue_summary", ""),
+            child_ref=ctx.invocation_id,
+        )
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        intake = load_stage_json(ctx.session.state.get("ticket_intake"))
+        master, parent_id = await self._admit(ctx, intake)
+
+        # Always overwrite markers left by an earlier ticket in this session
+        callback_context = CallbackContext(ctx)
+        callback_context.state["storm_cluster_id"] = (
+            master.cluster_id if master else None
+        )
+        callback_context.state["storm_parent_ticket_id"] = parent_id
+
+        if parent_id is None:
+            if master:
+                print(f"[STORM] New master cluster {master.cluster_id}")
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=callback_context._event_actions,
+            )
+            return
+
+        print(f"[STORM] Coalesced into {parent_id} "
+              f"(cluster size {master.size})")
+        discard_speculative_result(ctx.invocation_id)
+
+        summary = intake.get("issue_summary", "")
+        human_message = (
+            f"This issue is already being handled under {parent_id}. "
+            "Your report has been linked to that incident."
+        )
+        callback_context.state["ticket_creation_result"] = {
+            "ticket_id": parent_id,
+            "coalesced": True,
+            "priority": None,
+            "human_message": human_message,
+        }
+        try:
+            await save_ticket_for_user(
+                ticket_id=parent_id,
+                summary=summary,
+                status="Linked",
+                priority="",
+                tool_context=callback_context,
+            )
+        except Exception as e:
+            print("[STORM] ⚠ Error saving linked ticket:", e)
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model", parts=[types.Part(text=human_message)]
+            ),
+            actions=callback_context._event_actions,
+        )
+
+
+def skip_if_coalesced(callback_context: CallbackContext):
+    # before_agent_callback: returning content skips this stage only
+    parent_id = callback_context.state.get("storm_parent_ticket_id")
+    if not parent_id:
+        return None
+    return types.Content(
+        role="model",
+        parts=[types.Part(text=f"{COALESCED_MARKER}{parent_id}]")],
+    )
+
+
+def clear_storm_markers(callback_context: CallbackContext):
+    # after_agent_callback on the pipeline: markers only apply to the run
+    # that set them (AgentTool would otherwise carry them into later
+    # stage calls of the session and skip them)
+    state = callback_context.state
+    if state.get("storm_cluster_id") or state.get("storm_parent_ticket_id"):
+        state["storm_cluster_id"] = None
+        state["storm_parent_ticket_id"] = None
+    return None
+
+
+def register_master_ticket(callback_context: CallbackContext):
+    # after_agent_callback on ServiceNowCreatorAgent
+    cluster_id = callback_context.state.get("storm_cluster_id")
+    if not cluster_id or callback_context.state.get("storm_parent_ticket_id"):
+        return None
+
+    result = load_stage_json(callback_context.state.get("ticket_creation_result"))
+    ticket_id = result.get("ticket_id") if isinstance(result, dict) else None
+    if ticket_id:
+        storm_coalescer.resolve_master(cluster_id, ticket_id)
+    else:
+        storm_coalescer.fail_master(cluster_id)
+    return None
+
+
+storm_gate_agent = StormGateAgent(
+    name="StormGateAgent",
+    description="Attaches near-duplicate intakes to an open master incident.",
+)
+
+
+__all__ = [
+    "COALESCED_MARKER",
+    "StormCoalescer",
+    "StormGateAgent",
+    "storm_coalescer",
+    "storm_gate_agent",
+    "storm_metrics",
+    "skip_if_coalesced",
+    "clear_storm_markers",
+    "register_master_ticket",
+]
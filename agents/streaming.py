@@ -0,0 +1,198 @@
+# agents/streaming.py
+# -------------------------------------------------------------
+# Streaming per-stage progress for the ticket pipeline
+# - Typed async-generator API on top of get_ticket_runner()
+# - Yields one StageEvent as soon as a stage's output_key is written
+#   (intake, classification, KB, diagnostics, ticket id, ...)
+# - A coalesced (storm duplicate) ticket yields one `coalesced` event
+#   instead of the stages it skipped
+# - Lets UIs show the ticket number / first KB steps early
+# -------------------------------------------------------------
+
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Literal, Optional
+
+from google.genai import types
+
+from agents.app import get_ticket_runner
+from agents.projections import load_stage_json
+from agents.storm import COALESCED_MARKER
+
+
+StageName = Literal[
+    "intake",
+    "classification",
+    "kb_context",
+    "kb",
+    "diagnostics",
+    "ticket",
+    "saved",
+    "escalation",
+    "status",
+    "coalesced",
+    "done",
+]
+
+# output_key → stage name
+STAGE_OUTPUT_KEYS = {
+    "ticket_intake": "intake",
+    "ticket_classification": "classification",
+    "kb_context": "kb_context",
+    "kb_suggestions": "kb",
+    "diagnostics_report": "diagnostics",
+    "ticket_creation_result": "ticket",
+    "session_save_output": "saved",
+    "escalation_result": "escalation",
+    "ticket_status": "status",
+}
+
+# agent → output_key (used when a stage replays a checkpointed output)
+AGENT_OUTPUT_KEYS = {
+    "IntakeAgent": "ticket_intake",
+    "ClassifierAgent": "ticket_classification",
+    "KBAgent": "kb_suggestions",
+    "DiagnosticsAgent": "diagnostics_report",
+    "ServiceNowCreatorAgent": "ticket_creation_result",
+    "SessionSaverAgent": "session_save_output",
+    "EscalationAgent": "escalation_result",
+}
+
+
+@dataclass
+class StageEvent:
+    stage: StageName
+    agent: str
+    data: Any
+    session_id: str
+    invocation_id: Optional[str]
+    elapsed_sec: float
+    ticket_id: Optional[str] = None
+    output_key: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _event_text(event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(p.text for p in event.content.parts
+                   if getattr(p, "text", None))
+
+
+def _ticket_id_from(data) -> Optional[str]:
+    if isinstance(data, dict):
+        return data.get("ticket_id")
+    return None
+
+
+async def _ensure_session(runner, user_id: str, session_id: Optional[str]):
+    session_id = session_id or f"ticket-{uuid.uuid4().hex[:12]}"
+    session = await runner.session_service.get_session(
+        app_name=runner.app_name, user_id=user_id, session_id=session_id,
+    )
+    if session is None:
+        session = await runner.session_service.create_session(
+            app_name=runner.app_name, user_id=user_id, session_id=session_id,
+        )
+    return session
+
+
+async def stream_ticket_pipeline(
+    message: str,
+    user_id: str,
+    session_id: Optional[str] = None,
+    runner=None,
+) -> AsyncIterator[StageEvent]:
+    """
+    Runs the ticket pipeline and yields a StageEvent per completed stage.
+
+    Usage:
+      async for ev in stream_ticket_pipeline("VPN fails", user_id="u1"):
+          print(ev.stage, ev.ticket_id, ev.data)
+    """
+    runner = runner or get_ticket_runner()
+    session = await _ensure_session(runner, user_id, session_id)
+
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    started = time.perf_counter()
+    ticket_id = None
+    invocation_id = None
+    emitted = set()
+    coalesced = False
+
+    async for event in runner.run_async(
+        user_id=user_id,
+        session_id=session.id,
+        new_message=content,
+    ):
+        if event.partial:
+            continue
+        invocation_id = event.invocation_id or invocation_id
+
+        writes = []
+        delta = event.actions.state_delta if event.actions else {}
+        for key, stage in STAGE_OUTPUT_KEYS.items():
+            if key in delta and delta[key] is not None:
+                writes.append((key, stage, delta[key]))
+
+        text = _event_text(event)
+        if text.startswith(COALESCED_MARKER):
+            # Stage skipped by the storm gate: report the link once
+            if not coalesced:
+                coalesced = True
+                parent_id = text[len(COALESCED_MARKER):].rstrip("]")
+                yield StageEvent(
+                    stage="coalesced",
+                    agent=event.author,
+                    data={"parent_ticket_id": parent_id},
+                    session_id=session.id,
+                    invocation_id=invocation_id,
+                    elapsed_sec=round(time.perf_counter() - started, 3),
+                    ticket_id=ticket_id or parent_id,
+                )
+            continue
+
+        # Checkpointed stages replay their output as content, not state
+        replay_key = AGENT_OUTPUT_KEYS.get(event.author)
+        if (not writes and replay_key and replay_key not in emitted
+                and text):
+            writes.append((replay_key, STAGE_OUTPUT_KEYS[replay_key], text))
+
+        for key, stage, raw in writes:
+            data = load_stage_json(raw)
+            if stage == "ticket":
+                ticket_id = _ticket_id_from(data) or ticket_id
+            emitted.add(key)
+            yield StageEvent(
+                stage=stage,
+                agent=event.author,
+                data=data,
+                session_id=session.id,
+                invocation_id=invocation_id,
+                elapsed_sec=round(time.perf_counter() - started, 3),
+                ticket_id=ticket_id,
+                output_key=key,
+            )
+
+    yield StageEvent(
+        stage="done",
+        agent="TicketAutomationPipeline",
+        data={
+            "stages": sorted(STAGE_OUTPUT_KEYS[k] for k in emitted),
+            "coalesced": coalesced,
+        },
+        session_id=session.id,
+        invocation_id=invocation_id,
+        elapsed_sec=round(time.perf_counter() - started, 3),
+        ticket_id=ticket_id,
+    )
+
+
+__all__ = [
+    "StageEvent",
+    "StageName",
+    "stream_ticket_pipeline",
+]
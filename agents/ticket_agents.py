@@ -6,6 +6,26 @@
 
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from agents import setup
+from agents.projections import projected_instruction
+from agents.kb_retrieval import (
+    kb_retrieval_agent,
+    speculative_kb_agent,
+    discard_speculative_search,
+)
+from agents.storm import (
+    storm_gate_agent,
+    skip_if_coalesced,
+    clear_storm_markers,
+    register_master_ticket,
+)
+from agents.checkpoint import (
+    STAGE_CHECKPOINTS,
+    restore_checkpoint,
+    save_checkpoint,
+    clear_checkpoints,
+)
+from tools.sla_engine import start_sla_for_created_ticket
+from tools.custom_tools import persist_created_ticket
 from agents.session_tools import (
     save_ticket_for_user_tool,
     retrieve_userinfo_tool,
@@ -63,7 +83,7 @@ def classifier_debug_print(ticket_intake):
 classifier_agent = Agent(
     name="ClassifierAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("ClassifierAgent", """
 Use:
 {ticket_intake}
 
@@ -75,7 +95,7 @@ Respond ONLY with JSON:
   "priority": "P1 | P2 | P3 | P4",
   "recommended_team": "..."
 }
-""",
+"""),
     output_key="ticket_classification",
 )
 
@@ -94,10 +114,16 @@ def kb_debug_print(intake, classification):
 kb_agent = Agent(
     name="KBAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("KBAgent", """
 Use:
 Intake: {ticket_intake}
 Classification: {ticket_classification}
+Internal KB matches (retrieved): {kb_context?}
+Prior incidents (ticket history): {prior_incidents?}
+
+Base internal_matches ONLY on the retrieved KB matches above.
+If there are none, set kb_match_found=false and internal_matches=[].
+Reuse resolutions of prior incidents in steps when they apply.
 
 Respond ONLY JSON:
 {
@@ -106,7 +132,7 @@ Respond ONLY JSON:
   "external_insights": ["..."],
   "steps": ["..."]
 }
-""",
+"""),
     output_key="kb_suggestions",
 )
 
@@ -125,7 +151,7 @@ def diagnostics_debug_print(intake, classification):
 diagnostics_agent = Agent(
     name="DiagnosticsAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("DiagnosticsAgent", """
 Use:
 {ticket_intake}
 {ticket_classification}
@@ -136,7 +162,7 @@ Respond ONLY JSON:
   "commands": [...],
   "notes": "..."
 }
-""",
+"""),
     output_key="diagnostics_report",
 )
 
@@ -157,8 +183,8 @@ def service_now_debug_print(intake, classification, kb_suggestions, diag):
 service_now_agent = Agent(
     name="ServiceNowCreatorAgent",
     model=LLM(),
-    instruction="""
-Simulate creation of an ITSM incident.
+    instruction=projected_instruction("ServiceNowCreatorAgent", """
+Draft an ITSM incident; the ticket system stores it and assigns the number.
 
 Use:
 {ticket_intake}
@@ -166,19 +192,21 @@ Use:
 {kb_suggestions}
 {diagnostics_report}
 
-Generate ticket_id as: INCxxxxxxx
+Set ticket_id to "INC_PENDING"; it is replaced with the real number.
 
 Respond ONLY JSON:
 {
-  "ticket_id": "INC1234567",
+  "ticket_id": "INC_PENDING",
   "category": "...",
   "priority": "...",
   "kb_used": true | false,
   "diagnostics_planned": true | false,
   "human_message": "..."
 }
-""",
+"""),
     output_key="ticket_creation_result",
+    after_model_callback=persist_created_ticket,
+    after_agent_callback=[register_master_ticket, start_sla_for_created_ticket],
 )
 
 
@@ -197,7 +225,7 @@ def session_saver_debug_print(ticket_id, summary, priority):
 session_saver_agent = Agent(
     name="SessionSaverAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("SessionSaverAgent", """
 Your ONLY job is to call save_ticket_for_user_tool.
 
 Use:
@@ -210,7 +238,7 @@ Call save_ticket_for_user_tool with:
   summary
   status="Created"
   priority
-""",
+"""),
     tools=[save_ticket_for_user_tool],
     output_key="session_save_output",
 )
@@ -229,13 +257,13 @@ def escalation_debug_print(data):
 escalation_agent = Agent(
     name="EscalationAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("EscalationAgent", """
 Using:
 {ticket_classification}
 
 If priority = P1 or P2 → respond EXACTLY "ESCALATE"
 Else → respond EXACTLY "NO_ESCALATION"
-""",
+"""),
     output_key="escalation_result",
 )
 
@@ -253,12 +281,12 @@ def status_checker_debug(ticket_result):
 status_checker_agent = Agent(
     name="StatusCheckerAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("StatusCheckerAgent", """
 Input: {ticket_creation_result}
 
 If resolved → RESOLVED
 Else → PENDING
-""",
+"""),
     output_key="ticket_status",
 )
 
@@ -273,12 +301,12 @@ def status_updater_debug(status):
 status_updater_agent = Agent(
     name="StatusUpdaterAgent",
     model=LLM(),
-    instruction="""
+    instruction=projected_instruction("StatusUpdaterAgent", """
 Current status: {ticket_status}
 
 If RESOLVED → "Ticket is resolved. Closing the incident."
 Else → "Ticket is still being worked on."
-""",
+"""),
     output_key="ticket_status",
 )
 
@@ -294,11 +322,38 @@ status_loop = LoopAgent(
 # ======================================================================
 print("\n[PIPELINE] TicketAutomationPipeline loaded.")
 
+# Stages after the storm gate are skipped for coalesced (duplicate) tickets
+post_gate_stages = [
+    classifier_agent,
+    kb_retrieval_agent,
+    kb_agent,
+    diagnostics_agent,
+    service_now_agent,
+    session_saver_agent,
+    escalation_agent,
+    status_loop,
+]
+for stage in post_gate_stages:
+    stage.before_agent_callback = skip_if_coalesced
+
+# Checkpointed stages are skipped when their inputs are unchanged
+for stage in [intake_agent, storm_gate_agent, *post_gate_stages]:
+    if stage.name in STAGE_CHECKPOINTS:
+        stage.before_agent_callback = (
+            stage.canonical_before_agent_callbacks + [restore_checkpoint]
+        )
+        stage.after_agent_callback = (
+            stage.canonical_after_agent_callbacks + [save_checkpoint]
+        )
+
 root_ticket_agent = SequentialAgent(
     name="TicketAutomationPipeline",
     sub_agents=[
+        speculative_kb_agent,
         intake_agent,
+        storm_gate_agent,
         classifier_agent,
+        kb_retrieval_agent,
         kb_agent,
         diagnostics_agent,
         service_now_agent,
@@ -306,4 +361,9 @@ root_ticket_agent = SequentialAgent(
         escalation_agent,
         status_loop,
     ],
+    after_agent_callback=[
+        discard_speculative_search,
+        clear_storm_markers,
+        clear_checkpoints,
+    ],
 )
@@ -0,0 +1,89 @@
+# agents/user_cache.py
+# -------------------------------------------------------------
+# In-process cache for user ticket history
+# - Ticket-history pages keyed by user id (dropped on new tickets)
+# - Any ticket status write drops every cached page: a page shows the
+#   live status of tickets that may be listed under any user
+# - TTL bounds staleness against writes from other processes
+# - `user:*` profile state is not cached: ADK loads it with the session
+# -------------------------------------------------------------
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+USER_TICKETS_CACHE_TTL_SEC = float(os.getenv("ITSM_USER_TICKETS_CACHE_TTL", "15"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("ITSM_USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()   # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)  # least recently used
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# user id → {(status, limit, cursor): page}
+user_tickets_cache = TTLCache(USER_TICKETS_CACHE_TTL_SEC)
+
+
+def invalidate_ticket_status():
+    # Called after update_ticket_status / bulk updates
+    user_tickets_cache.clear()
+
+
+def user_cache_stats() -> dict:
+    return {
+        "tickets": user_tickets_cache.stats(),
+    }
+
+
+__all__ = [
+    "TTLCache",
+    "user_tickets_cache",
+    "invalidate_ticket_status",
+    "user_cache_stats",
+]
@@ -0,0 +1,299 @@
+# plugins/llm_usage.py
+# -------------------------------------------------------------
+# LLM token / latency ledger
+# - One row per model call: stage (agent), model, prompt / output /
+#   cached / thinking tokens, wall time, error
+# - Rows carry the trace id, so calls made before the ticket exists
+#   (intake, classifier, KB...) and inside AgentTool sub-runs are
+#   attributed to the ticket once it is created
+# - Buffered in memory, written by a flusher thread (never on the
+#   event loop); stored next to the tickets (ITSM_TICKET_DB) so cost
+#   can be joined with ticket priority / category
+# - The buffer lock only covers the list swap: SQLite writes and
+#   roll-up scans run outside it (reads on their own connection), so
+#   record() never waits behind the database. A failed flush puts its
+#   batch back in front of the buffer
+# - Roll-ups: per ticket and per stage (token sums, latency p50/p95)
+# -------------------------------------------------------------
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from plugins.metrics import LogHistogram
+from tools.ticket_store import TICKET_DB_PATH
+
+
+LLM_USAGE_DB = os.getenv("ITSM_LLM_USAGE_DB", TICKET_DB_PATH)
+LLM_USAGE_FLUSH_INTERVAL_SEC = float(os.getenv("ITSM_LLM_USAGE_FLUSH_INTERVAL", "2.0"))
+LLM_USAGE_MAX_BUFFER = int(os.getenv("ITSM_LLM_USAGE_MAX_BUFFER", "10000"))
+MAX_TRACKED_TRACES = 10000
+
+LLM_USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at      TEXT NOT NULL,
+    trace_id        TEXT,
+    invocation_id   TEXT,
+    session_id      TEXT,
+    user_id         TEXT,
+    ticket_id       TEXT,
+    stage           TEXT NOT NULL,
+    model           TEXT,
+    prompt_tokens   INTEGER NOT NULL DEFAULT 0,
+    output_tokens   INTEGER NOT NULL DEFAULT 0,
+    cached_tokens   INTEGER NOT NULL DEFAULT 0,
+    thoughts_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens    INTEGER NOT NULL DEFAULT 0,
+    latency_ms      REAL NOT NULL,
+    error           TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_ticket ON llm_calls(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_trace ON llm_calls(trace_id);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_stage ON llm_calls(created_at, stage);
+"""
+
+_COLUMNS = (
+    "created_at", "trace_id", "invocation_id", "session_id", "user_id",
+    "ticket_id", "stage", "model", "prompt_tokens", "output_tokens",
+    "cached_tokens", "thoughts_tokens", "total_tokens", "latency_ms", "error",
+)
+
+
+def usage_tokens(usage) -> dict:
+    # google.genai GenerateContentResponseUsageMetadata → plain ints
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_token_count or 0,
+        "output_tokens": usage.candidates_token_count or 0,
+        "cached_tokens": usage.cached_content_token_count or 0,
+        "thoughts_tokens": usage.thoughts_token_count or 0,
+        "total_tokens": usage.total_token_count or 0,
+    }
+
+
+class UsageLedger:
+    def __init__(self, path: str = LLM_USAGE_DB,
+                 flush_interval: float = LLM_USAGE_FLUSH_INTERVAL_SEC,
+                 max_buffer: int = LLM_USAGE_MAX_BUFFER):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._db = sqlite3.connect(path, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(LLM_USAGE_SCHEMA)
+
+        # _lock: buffer only (taken on the event loop, never held over I/O)
+        # _write_lock: the writer connection + trace → ticket map
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Ordered ops: ("call", row) / ("ticket", trace_id, ticket_id)
+        self._buffer: list = []
+        # trace_id → ticket_id, for calls made after the ticket exists
+        self._trace_tickets: OrderedDict = OrderedDict()
+
+        self.calls_written = 0
+        self.dropped = 0
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="llm-usage-flusher", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ---------------------------------------------------------
+    # Writes (called from plugin callbacks: append only)
+    # ---------------------------------------------------------
+    def record(self, stage: str, latency_ms: float, **fields):
+        row = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "stage": stage,
+            "latency_ms": round(latency_ms, 2),
+            **fields,
+        }
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(("call", row))
+
+    def attribute(self, trace_id: str, ticket_id: str):
+        # Every call of the trace so far (and still buffered) → ticket
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(("ticket", trace_id, ticket_id))
+
+    def _write_batch(self, batch: list) -> int:
+        tickets = self._trace_tickets
+        written = 0
+        self._db.execute("BEGIN")
+        try:
+            for op in batch:
+                if op[0] == "ticket":
+                    tickets[op[1]] = op[2]
+                    while len(tickets) > MAX_TRACKED_TRACES:
+                        tickets.popitem(last=False)
+                    self._db.execute(
+                        "UPDATE llm_calls SET ticket_id = ?"
+                        " WHERE trace_id = ? AND ticket_id IS NULL",
+                        (op[2], op[1]),
+                    )
+                    continue
+                row = op[1]
+                if row.get("ticket_id") is None:
+                    row["ticket_id"] = tickets.get(row.get("trace_id"))
+                self._db.execute(
+                    f"INSERT INTO llm_calls ({', '.join(_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    tuple(row.get(c, 0 if c.endswith("_tokens") else None)
+                          for c in _COLUMNS),
+                )
+                written += 1
+            self._db.execute("COMMIT")
+        except Exception:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+        return written
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                written = self._write_batch(batch)
+            except Exception:
+                # Keep the rows (and ticket attributions) for the next flush
+                with self._lock:
+                    self._buffer[:0] = batch
+                raise
+            self.calls_written += written
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[LLM-USAGE] ⚠ Flush failed: {e}")
+
+    # ---------------------------------------------------------
+    # Roll-ups (blocking: call via asyncio.to_thread from async code)
+    # ---------------------------------------------------------
+    def _rollup(self, where: str, params: tuple) -> list:
+        # Rows are streamed into fixed-size histograms: constant memory
+        stages = {}
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[LLM-USAGE] ⚠ Flush failed: {e}")
+        db = sqlite3.connect(self.path)
+        try:
+            db.execute("PRAGMA busy_timeout=5000")
+            rows = db.execute(
+                "SELECT stage, model, prompt_tokens, output_tokens,"
+                " cached_tokens, total_tokens, latency_ms, error"
+                f" FROM llm_calls WHERE {where}",
+                params,
+            )
+            for stage, model, prompt, output, cached, total, latency, error in rows:
+                s = stages.get(stage)
+                if s is None:
+                    s = stages[stage] = {
+                        "stage": stage, "models": set(), "calls": 0,
+                        "errors": 0, "prompt_tokens": 0, "output_tokens": 0,
+                        "cached_tokens": 0, "total_tokens": 0,
+                        "latency_ms": 0.0, "_hist": LogHistogram(),
+                    }
+                s["models"].add(model)
+                s["calls"] += 1
+                s["errors"] += 1 if error else 0
+                s["prompt_tokens"] += prompt
+                s["output_tokens"] += output
+                s["cached_tokens"] += cached
+                s["total_tokens"] += total
+                s["latency_ms"] += latency
+                s["_hist"].observe(latency / 1000)
+        finally:
+            db.close()
+
+        result = []
+        for s in stages.values():
+            hist = s.pop("_hist")
+            s["models"] = sorted(m for m in s["models"] if m)
+            s["latency_ms"] = round(s["latency_ms"], 1)
+            s["latency_p50_ms"] = round(hist.quantile(0.5) * 1000, 1)
+            s["latency_p95_ms"] = round(hist.quantile(0.95) * 1000, 1)
+            result.append(s)
+        # Most expensive stages first
+        result.sort(key=lambda s: (s["total_tokens"], s["latency_ms"]),
+                    reverse=True)
+        return result
+
+    def ticket_usage(self, ticket_id: str) -> dict:
+        stages = self._rollup("ticket_id = ?", (ticket_id,))
+        return {
+            "ticket_id": ticket_id,
+            "calls": sum(s["calls"] for s in stages),
+            "total_tokens": sum(s["total_tokens"] for s in stages),
+            "latency_ms": round(sum(s["latency_ms"] for s in stages), 1),
+            "stages": stages,
+        }
+
+    def stage_usage(self, since_hours: Optional[float] = None) -> list:
+        if since_hours is None:
+            return self._rollup("1 = 1", ())
+        since = datetime.fromtimestamp(
+            time.time() - since_hours * 3600, timezone.utc
+        ).isoformat()
+        return self._rollup("created_at >= ?", (since,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "calls_written": self.calls_written,
+                "dropped": self.dropped,
+            }
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[LLM-USAGE] ⚠ Final flush failed: {e}")
+
+
+_usage_ledger: Optional[UsageLedger] = None
+_usage_init_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    # Created on first model call so importing plugins does not touch the DB
+    global _usage_ledger
+    if _usage_ledger is None:
+        with _usage_init_lock:
+            if _usage_ledger is None:
+                _usage_ledger = UsageLedger()
+    return _usage_ledger
+
+
+__all__ = [
+    "UsageLedger",
+    "get_usage_ledger",
+    "usage_tokens",
+]
@@ -0,0 +1,180 @@
+# plugins/log_sinks.py
+# -------------------------------------------------------------
+# Non-blocking file sinks for observability logs
+# - Callers only enqueue (put_nowait); a daemon thread writes
+# - Bounded buffer: when full, records are dropped and counted
+#   instead of stalling the event loop
+# - Batched writes: one write per batch, flushed by size or timer
+# - Size-based rotation: file → file.1 → ... → file.N
+# - One file per process (name.<pid>.ext): server workers never rotate
+#   a file another process is still appending to
+# -------------------------------------------------------------
+
+import os
+import io
+import csv
+import queue
+import atexit
+import threading
+from typing import List, Optional
+
+
+OBS_BUFFER_SIZE = int(os.getenv("ITSM_OBS_BUFFER_SIZE", "10000"))
+OBS_BATCH_SIZE = int(os.getenv("ITSM_OBS_BATCH_SIZE", "512"))
+OBS_FLUSH_INTERVAL_SEC = float(os.getenv("ITSM_OBS_FLUSH_INTERVAL", "1.0"))
+OBS_MAX_BYTES = int(os.getenv("ITSM_OBS_MAX_BYTES", str(50 * 1024 * 1024)))
+OBS_BACKUPS = int(os.getenv("ITSM_OBS_BACKUPS", "5"))
+OBS_PER_PROCESS = os.getenv("ITSM_OBS_PER_PROCESS", "1") != "0"
+
+_STOP = object()
+
+
+def process_path(path: str, pid: Optional[int] = None) -> str:
+    # logs/observability.jsonl → logs/observability.<pid>.jsonl
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{pid or os.getpid()}{ext}"
+
+
+class BufferedSink:
+    """Append-only text file written by a background thread."""
+
+    def __init__(self, path: str, header: Optional[str] = None,
+                 buffer_size: int = OBS_BUFFER_SIZE,
+                 batch_size: int = OBS_BATCH_SIZE,
+                 flush_interval: float = OBS_FLUSH_INTERVAL_SEC,
+                 max_bytes: int = OBS_MAX_BYTES,
+                 backups: int = OBS_BACKUPS,
+                 per_process: bool = OBS_PER_PROCESS):
+        self.path = process_path(path) if per_process else path
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self._queue: queue.Queue = queue.Queue(maxsize=buffer_size)
+        self._file = None
+
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.errors = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name=f"obs-sink-{os.path.basename(self.path)}",
+            daemon=True,
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------------------------------------------------------
+    # Producer side (event loop)
+    # ---------------------------------------------------------
+    def write(self, line: str):
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    # ---------------------------------------------------------
+    # Writer thread
+    # ---------------------------------------------------------
+    def _open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", encoding="utf-8", newline="")
+        if new and self.header:
+            self._file.write(self.header)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def _write_batch(self, batch: List[str]):
+        try:
+            if self._file is None:
+                self._open()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+            self._file.write("".join(batch))
+            self._file.flush()
+            self.written += len(batch)
+            self.flushes += 1
+        except OSError as e:
+            self.errors += 1
+            print(f"[OBS] ⚠ Sink write failed ({self.path}): {e}")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[str] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+        if self._file is not None:
+            self._file.close()
+
+    def close(self, timeout: float = 5.0):
+        if not self._thread.is_alive():
+            return
+        # Blocking put: everything queued before close is written
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+
+class CsvSink(BufferedSink):
+    """BufferedSink taking rows; header rewritten on every new file."""
+
+    def __init__(self, path: str, columns: List[str], **kwargs):
+        super().__init__(path, header=self._format(columns), **kwargs)
+
+    @staticmethod
+    def _format(row) -> str:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(row)
+        return buf.getvalue()
+
+    def write_row(self, row: list):
+        self.write(self._format(row))
+
+
+__all__ = [
+    "BufferedSink",
+    "CsvSink",
+    "process_path",
+]
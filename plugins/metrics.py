@@ -0,0 +1,280 @@
+# plugins/metrics.py
+# -------------------------------------------------------------
+# In-process metrics: latency histograms + counters
+# - LogHistogram: fixed log-spaced buckets (4 per doubling, 1 ms
+#   to ~17 min), so memory is constant and quantiles are within
+#   ~10% however many samples are observed
+# - Series are keyed by metric name + label values
+#   (agent / tool / model), p50 / p95 / p99 on demand
+# - Prometheus text exposition: GET /metrics on the server, or a
+#   file rewritten every ITSM_METRICS_INTERVAL seconds when
+#   ITSM_METRICS_FILE is set (node_exporter textfile collector)
+# - Every series carries a pid label and each process writes its own
+#   file (name.<pid>.prom): server workers never overwrite each other,
+#   aggregate with sum without (pid)
+# -------------------------------------------------------------
+
+import os
+import re
+import glob
+import math
+import time
+import atexit
+import contextlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from plugins.log_sinks import process_path
+
+
+METRICS_FILE = os.getenv("ITSM_METRICS_FILE")
+METRICS_INTERVAL_SEC = float(os.getenv("ITSM_METRICS_INTERVAL", "15"))
+
+HIST_MIN_SEC = 0.001
+HIST_BUCKETS_PER_DOUBLING = 4
+HIST_BUCKETS = 80          # 0.001 * 2 ** (80 / 4) ≈ 1048 s
+QUANTILES = (0.5, 0.95, 0.99)
+
+_GROWTH = 2 ** (1 / HIST_BUCKETS_PER_DOUBLING)
+# Upper bound of each fine bucket; the last one is +Inf. Rounded so
+# the `le` labels are stable strings (0.002, not 0.0020000000000000005)
+_BOUNDS = [float(f"{HIST_MIN_SEC * _GROWTH ** i:.6g}")
+           for i in range(HIST_BUCKETS)]
+
+
+class LogHistogram:
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (HIST_BUCKETS + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(value: float) -> int:
+        if value <= HIST_MIN_SEC:
+            return 0
+        i = math.ceil(math.log(value / HIST_MIN_SEC, _GROWTH) - 1e-9)
+        return min(i, HIST_BUCKETS)
+
+    def observe(self, value: float):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if i >= HIST_BUCKETS:
+                    return self.max
+                # Geometric midpoint of the bucket, clamped to what we saw
+                lower = _BOUNDS[i - 1] if i else 0.0
+                mid = math.sqrt(lower * _BOUNDS[i]) if lower else _BOUNDS[i]
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+    def cumulative(self, every: int = HIST_BUCKETS_PER_DOUBLING):
+        # (le, cumulative count) on power-of-two bounds for exposition
+        seen = 0
+        for i, n in enumerate(self.counts[:HIST_BUCKETS]):
+            seen += n
+            if i % every == 0:
+                yield _BOUNDS[i], seen
+        yield math.inf, self.count
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            **{f"p{int(q * 100)}": round(self.quantile(q), 4)
+               for q in QUANTILES},
+            "max": round(self.max, 4),
+        }
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: Optional[dict] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, LogHistogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    # Positional-only, so "name" is free to be a label
+    def observe(self, metric: str, value: float, /, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = LogHistogram()
+            hist.observe(value)
+
+    def inc(self, metric: str, amount: float = 1, /, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "histograms": {
+                    name: {_fmt_labels(k) or "{}": h.summary()
+                           for k, h in series.items()}
+                    for name, series in self._histograms.items()
+                },
+                "counters": {
+                    name: {_fmt_labels(k) or "{}": v
+                           for k, v in series.items()}
+                    for name, series in self._counters.items()
+                },
+            }
+
+    # ---------------------------------------------------------
+    # Prometheus text format 0.0.4
+    # ---------------------------------------------------------
+    def render_prometheus(self) -> str:
+        lines = []
+        proc = {"pid": str(os.getpid())}
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(
+                        f"{name}{_fmt_labels(labels, proc)} {_fmt_value(value)}"
+                    )
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in series.items():
+                    for le, count in hist.cumulative():
+                        lines.append(
+                            f"{name}_bucket"
+                            f"{_fmt_labels(labels, {**proc, 'le': _fmt_value(le)})}"
+                            f" {count}"
+                        )
+                    lines.append(f"{name}_sum{_fmt_labels(labels, proc)} {hist.sum!r}")
+                    lines.append(f"{name}_count{_fmt_labels(labels, proc)} {hist.count}")
+
+                # Pre-computed quantiles for dashboards without histogram_quantile
+                qname = f"{name}_quantile"
+                lines.append(f"# TYPE {qname} gauge")
+                for labels, hist in series.items():
+                    for q in QUANTILES:
+                        lines.append(
+                            f"{qname}{_fmt_labels(labels, {**proc, 'quantile': str(q)})}"
+                            f" {hist.quantile(q)!r}"
+                        )
+        return "\n".join(lines) + "\n"
+
+    # ---------------------------------------------------------
+    # File exporter
+    # ---------------------------------------------------------
+    def write_file(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)  # scrapers never see a half-written file
+
+    @staticmethod
+    def _prune_dead_files(path: str):
+        # Files left by exited processes would keep reporting stale series
+        if os.name != "posix":
+            return
+        stem, ext = os.path.splitext(path)
+        pattern = re.compile(re.escape(stem) + r"\.(\d+)" + re.escape(ext) + "$")
+        for other in glob.glob(f"{glob.escape(stem)}.*{glob.escape(ext)}"):
+            match = pattern.match(other)
+            if not match or int(match.group(1)) == os.getpid():
+                continue
+            try:
+                os.kill(int(match.group(1)), 0)
+            except ProcessLookupError:
+                with contextlib.suppress(OSError):
+                    os.remove(other)
+            except OSError:
+                pass  # alive, owned by another user
+
+    def start_file_exporter(self, base_path: str,
+                            interval: float = METRICS_INTERVAL_SEC):
+        path = process_path(base_path)
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    print(f"[METRICS] ⚠ Could not write {path}: {e}")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._prune_dead_files(base_path)
+        threading.Thread(target=loop, name="metrics-file-exporter",
+                         daemon=True).start()
+        atexit.register(self.write_file, path)
+
+
+metrics = MetricsRegistry()
+metrics.describe("itsm_pipeline_duration_seconds",
+                 "Wall time of a top-level runner invocation")
+metrics.describe("itsm_agent_duration_seconds", "Agent run time")
+metrics.describe("itsm_tool_duration_seconds", "Tool call time")
+metrics.describe("itsm_llm_duration_seconds", "Model call time")
+metrics.describe("itsm_llm_calls_total", "Model calls")
+metrics.describe("itsm_tool_calls_total", "Tool calls")
+metrics.describe("itsm_errors_total", "Failed model / tool calls")
+metrics.describe("itsm_storm_masters_total",
+                 "Storm clusters opened (master incidents)")
+metrics.describe("itsm_storm_coalesced_total",
+                 "Duplicate reports coalesced into a master incident")
+metrics.describe("itsm_retries_total",
+                 "Retried work (tool re-called after an error, requeued jobs,"
+                 " session create races)")
+
+if METRICS_FILE:
+    metrics.start_file_exporter(METRICS_FILE)
+
+
+__all__ = [
+    "metrics",
+    "MetricsRegistry",
+    "LogHistogram",
+]
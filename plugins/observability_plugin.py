@@ -6,23 +6,39 @@
 #   ✓ Colorized console logs (cross-platform)
 #   ✓ JSONL structured logs (logs/observability.jsonl)
 #   ✓ CSV trace logs (logs/observability_trace.csv)
-#   ✓ Agent & tool execution timing
+#   ✓ Non-blocking buffered writers with rotation (log_sinks.py)
+#   ✓ Agent & tool execution timing (stages short-circuited by a
+#     before-callback end as "skipped")
+#   ✓ Invocation-scoped spans → logs/traces.jsonl (OTLP JSON)
 #   ✓ Per-agent and per-tool cumulative metrics
+#   ✓ Latency histograms + counters (plugins/metrics.py)
+#   ✓ LLM token / latency ledger per stage and ticket (llm_usage.py)
+#   ✓ Tool payload sampling / size caps (payload_policy.py)
 #   ✓ ADK 1.19 callback signatures
 # -------------------------------------------------------------
 
 import logging
-import time
 import os
-import csv
 import json
 import platform
 from datetime import datetime
 
 from google.adk.plugins.base_plugin import BasePlugin
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents import ParallelAgent
 from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
 from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+from agents.projections import load_stage_json
+from plugins.llm_usage import get_usage_ledger, usage_tokens
+from plugins.log_sinks import BufferedSink, CsvSink
+from plugins.metrics import metrics
+from plugins.payload_policy import payload_policy
+from plugins.tracing import Tracer
 
 
 # -------------------------------------------------------------
@@ -53,43 +69,64 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 
 # -------------------------------------------------------------
-# Initialize CSV header once
+# Background sinks (CSV header written on every new file)
 # -------------------------------------------------------------
-if not os.path.exists(CSV_PATH):
-    with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "timestamp",
-            "event",
-            "agent",
-            "tool",
-            "duration_sec",
-            "details"
-        ])
+jsonl_sink = BufferedSink(JSONL_PATH)
+csv_sink = CsvSink(CSV_PATH, [
+    "timestamp",
+    "event",
+    "agent",
+    "tool",
+    "duration_sec",
+    "details"
+])
+
+
+def sink_stats() -> dict:
+    return {
+        "jsonl": jsonl_sink.stats(),
+        "csv": csv_sink.stats(),
+        "payloads": payload_policy.stats(),
+    }
 
 
 # -------------------------------------------------------------
 # Helper: append JSONL event
 # -------------------------------------------------------------
 def log_jsonl(event: dict):
-    with open(JSONL_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event) + "\n")
+    # Serialized here: the event dicts may be mutated after the callback
+    jsonl_sink.write(json.dumps(event, default=str) + "\n")
 
 
 # -------------------------------------------------------------
 # Helper: append CSV event
 # -------------------------------------------------------------
 def log_csv(event_type, agent=None, tool=None, duration=None, details=""):
-    with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.utcnow().isoformat(),
-            event_type,
-            agent,
-            tool,
-            f"{duration:.4f}" if duration else "",
-            details,
-        ])
+    csv_sink.write_row([
+        datetime.utcnow().isoformat(),
+        event_type,
+        agent,
+        tool,
+        f"{duration:.4f}" if duration else "",
+        details,
+    ])
+
+
+# -------------------------------------------------------------
+# Helper: SLA warning / breach events (emitted by tools/sla_engine)
+# -------------------------------------------------------------
+def log_sla_event(event: dict):
+    paint = RED if event.get("event") == "sla_breach" else YELLOW
+    print(paint(
+        f"[OBS][{event.get('event', 'sla').upper()}] {event.get('ticket_id')}"
+        f" | {event.get('sla')} due {event.get('due_at')}"
+    ))
+    log_jsonl(event)
+    log_csv(event.get("event"), details=json.dumps({
+        "ticket_id": event.get("ticket_id"),
+        "sla": event.get("sla"),
+        "priority": event.get("priority"),
+    }))
 
 
 # -------------------------------------------------------------
@@ -103,8 +140,15 @@ class ObservabilityPlugin(BasePlugin):
         self.tool_calls = 0
         self.llm_calls = 0
 
-        self._agent_start = {}
-        self._tool_start = {}
+        # Spans keyed by invocation id (+ agent name / function call id)
+        self.tracer = Tracer()
+        # invocation id → tools whose last call failed (retry detection)
+        self._failed_tools = {}
+        # invocation id → {agent name: agent} with an open agent span.
+        # ADK skips after_agent_callback when a before-callback returns
+        # content (coalesced / checkpointed stages), so those are closed
+        # here instead of leaking
+        self._open_agents = {}
 
         # cumulative metrics
         self.agent_runtime = {}
@@ -112,6 +156,67 @@ class ObservabilityPlugin(BasePlugin):
 
         print(GREEN("[PLUGIN:OBS] Enhanced Observability Plugin Loaded."))
 
+    # ---------------------------------------------------------
+    # INVOCATION (root span; nested under the AgentTool span when
+    # the invocation is a sub-agent run)
+    # ---------------------------------------------------------
+    async def before_run_callback(
+        self,
+        *,
+        invocation_context: InvocationContext,
+        **kwargs
+    ):
+        inv = invocation_context.invocation_id
+        span = self.tracer.start(
+            ("run", inv), f"invocation {invocation_context.agent.name}",
+            "invocation", inv,
+            session_id=invocation_context.session.id,
+            user_id=invocation_context.user_id,
+            app_name=invocation_context.app_name,
+        )
+        self.tracer.activate(span)
+
+    async def after_run_callback(
+        self,
+        *,
+        invocation_context: InvocationContext,
+        **kwargs
+    ):
+        inv = invocation_context.invocation_id
+        self._failed_tools.pop(inv, None)
+        for name in self._open_agents.pop(inv, {}):
+            self._end_skipped(inv, name)
+        span = self.tracer.end(("run", inv))
+        if span is None:
+            return
+        self.tracer.activate(span.parent)
+
+        # Ticket pipeline: the ticket (or storm master) is in state
+        state = invocation_context.session.state
+        created = load_stage_json(state.get("ticket_creation_result"))
+        ticket_id = state.get("storm_parent_ticket_id") or (
+            created.get("ticket_id") if isinstance(created, dict) else None
+        )
+        if ticket_id:
+            get_usage_ledger().attribute(span.trace_id, ticket_id)
+        if span.parent is None:
+            metrics.observe("itsm_pipeline_duration_seconds",
+                            span.duration_sec, app=invocation_context.app_name)
+
+        log_jsonl({
+            "event": "run_end",
+            "timestamp": datetime.utcnow().isoformat(),
+            "app": invocation_context.app_name,
+            "agent": invocation_context.agent.name,
+            "invocation_id": invocation_context.invocation_id,
+            "session_id": invocation_context.session.id,
+            "ticket_id": ticket_id,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
+            "duration_sec": span.duration_sec,
+        })
+
     # ---------------------------------------------------------
     # BEFORE AGENT START (ADK 1.19)
     # ---------------------------------------------------------
@@ -123,7 +228,20 @@ class ObservabilityPlugin(BasePlugin):
         **kwargs
     ):
         self.agent_calls += 1
-        self._agent_start[agent.name] = time.time()
+        inv = callback_context.invocation_id
+        open_agents = self._open_agents.setdefault(inv, {})
+        # A sequential sibling still open never got its after-callback
+        parent_agent = agent.parent_agent
+        if parent_agent is not None and not isinstance(parent_agent, ParallelAgent):
+            for name, other in list(open_agents.items()):
+                if other.parent_agent is parent_agent:
+                    self._end_skipped(inv, name)
+        open_agents[agent.name] = agent
+        span = self.tracer.start(
+            ("agent", inv, agent.name), f"agent {agent.name}", "agent", inv,
+            agent=agent.name,
+        )
+        self.tracer.activate(span)
 
         print(BLUE(f"[OBS][AGENT-START] {agent.name} | Call #{self.agent_calls}"))
 
@@ -132,7 +250,10 @@ class ObservabilityPlugin(BasePlugin):
             "event": "agent_start",
             "timestamp": datetime.utcnow().isoformat(),
             "agent": agent.name,
-            "invocation_id": callback_context.invocation_id,
+            "invocation_id": inv,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
         })
 
     # ---------------------------------------------------------
@@ -143,11 +264,19 @@ class ObservabilityPlugin(BasePlugin):
         *,
         agent: BaseAgent,
         callback_context: CallbackContext,
-        result=None,
         **kwargs
     ):
-        start = self._agent_start.get(agent.name, None)
-        elapsed = time.time() - start if start else 0
+        inv = callback_context.invocation_id
+        open_agents = self._open_agents.get(inv, {})
+        for name, other in list(open_agents.items()):
+            if other.parent_agent is agent:
+                self._end_skipped(inv, name)  # last sub-agent was skipped
+        open_agents.pop(agent.name, None)
+        span = self.tracer.end(("agent", inv, agent.name))
+        if span is None:
+            return
+        self.tracer.activate(span.parent)
+        elapsed = span.duration_sec
 
         print(GREEN(f"[OBS][AGENT-END] {agent.name} | {elapsed:.3f}s"))
 
@@ -155,18 +284,42 @@ class ObservabilityPlugin(BasePlugin):
         self.agent_runtime[agent.name] = (
             self.agent_runtime.get(agent.name, 0) + elapsed
         )
+        metrics.observe("itsm_agent_duration_seconds", elapsed, agent=agent.name)
 
         # JSONL
         log_jsonl({
             "event": "agent_end",
             "timestamp": datetime.utcnow().isoformat(),
             "agent": agent.name,
+            "invocation_id": inv,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
             "duration_sec": elapsed,
         })
 
         # CSV
         log_csv("agent_end", agent=agent.name, duration=elapsed)
 
+    def _end_skipped(self, inv: str, agent_name: str):
+        self._open_agents.get(inv, {}).pop(agent_name, None)
+        span = self.tracer.end(("agent", inv, agent_name), status="skipped")
+        if span is None:
+            return
+        self.tracer.activate(span.parent)
+
+        print(YELLOW(f"[OBS][AGENT-SKIP] {agent_name}"))
+
+        log_jsonl({
+            "event": "agent_end",
+            "timestamp": datetime.utcnow().isoformat(),
+            "agent": agent_name,
+            "invocation_id": inv,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "duration_sec": span.duration_sec,
+            "status": "skipped",
+        })
+
     # ---------------------------------------------------------
     # BEFORE LLM CALL
     # ---------------------------------------------------------
@@ -178,6 +331,15 @@ class ObservabilityPlugin(BasePlugin):
         **kwargs
     ):
         self.llm_calls += 1
+        inv = callback_context.invocation_id
+        agent_name = callback_context.agent_name
+        span = self.tracer.start(
+            ("llm", inv, agent_name), f"llm {llm_request.model}", "llm", inv,
+            parent=self.tracer.get(("agent", inv, agent_name)),
+            agent=agent_name, model=llm_request.model,
+        )
+
+        metrics.inc("itsm_llm_calls_total", model=llm_request.model)
 
         print(MAGENTA(
             f"[OBS][LLM-CALL] #{self.llm_calls} | model={llm_request.model}"
@@ -186,66 +348,166 @@ class ObservabilityPlugin(BasePlugin):
         log_jsonl({
             "event": "llm_call",
             "timestamp": datetime.utcnow().isoformat(),
+            "agent": agent_name,
             "model": llm_request.model,
             "llm_calls": self.llm_calls,
+            "invocation_id": inv,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
+        })
+
+    # ---------------------------------------------------------
+    # AFTER LLM CALL
+    # ---------------------------------------------------------
+    async def after_model_callback(
+        self,
+        *,
+        callback_context: CallbackContext,
+        llm_response: LlmResponse,
+        **kwargs
+    ):
+        if llm_response.partial:
+            return None  # streaming chunk; the span ends on the final one
+        usage = llm_response.usage_metadata
+        span = self.tracer.end(
+            ("llm", callback_context.invocation_id, callback_context.agent_name),
+            error=llm_response.error_message,
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None,
+            finish_reason=(llm_response.finish_reason.name
+                           if llm_response.finish_reason else None),
+        )
+        if span is None:
+            return None
+        model = span.attributes.get("model")
+        metrics.observe("itsm_llm_duration_seconds", span.duration_sec,
+                        model=model)
+        if llm_response.error_code:
+            metrics.inc("itsm_errors_total", kind="llm", name=model)
+
+        tokens = usage_tokens(usage)
+        self._record_llm(callback_context, span, llm_response.error_message,
+                         tokens)
+        print(MAGENTA(
+            f"[OBS][LLM-END] {callback_context.agent_name} | {model} |"
+            f" {span.duration_sec:.3f}s | {tokens.get('prompt_tokens', 0)}"
+            f"→{tokens.get('output_tokens', 0)} tok"
+        ))
+        return None
+
+    async def on_model_error_callback(
+        self,
+        *,
+        callback_context: CallbackContext,
+        llm_request: LlmRequest,
+        error: Exception,
+        **kwargs
+    ):
+        span = self.tracer.end(
+            ("llm", callback_context.invocation_id, callback_context.agent_name),
+            error=repr(error),
+        )
+        metrics.inc("itsm_errors_total", kind="llm", name=llm_request.model)
+        if span is not None:
+            self._record_llm(callback_context, span, repr(error), {})
+        return None
+
+    def _record_llm(self, callback_context: CallbackContext, span,
+                    error, tokens: dict):
+        log_jsonl({
+            "event": "llm_end",
+            "timestamp": datetime.utcnow().isoformat(),
+            "agent": callback_context.agent_name,
+            "model": span.attributes.get("model"),
+            "invocation_id": callback_context.invocation_id,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "duration_sec": span.duration_sec,
+            "error": error,
+            **tokens,
         })
+        get_usage_ledger().record(
+            stage=callback_context.agent_name,
+            latency_ms=span.duration_sec * 1000,
+            model=span.attributes.get("model"),
+            trace_id=span.trace_id,
+            invocation_id=callback_context.invocation_id,
+            session_id=callback_context.session.id,
+            user_id=callback_context.user_id,
+            error=error,
+            **tokens,
+        )
 
     # =========================================================
-    # BEFORE TOOL CALLBACK — UNIVERSAL SAFE VERSION
+    # BEFORE TOOL CALLBACK
+    # ADK 1.19: (tool, tool_args, tool_context)
     # =========================================================
     async def before_tool_callback(
         self,
-        *args,
+        *,
+        tool: BaseTool,
+        tool_args: dict,
+        tool_context: ToolContext,
         **kwargs
     ):
-        # ADK 1.19 parameters (preferred)
-        callback_context = kwargs.get("callback_context")
-        tool_name        = kwargs.get("tool_name")
-        tool_input       = kwargs.get("tool_input")
-
-        # Fallbacks for older or alternate ADK calls
-        tool_kwargs      = kwargs.get("tool_kwargs")
-        tool_args        = kwargs.get("tool_args")
-        tool             = kwargs.get("tool")
+        tool_name = getattr(tool, "name", None) or "UNKNOWN_TOOL"
+        inv = tool_context.invocation_id
+        call_id = tool_context.function_call_id or tool_name
+        span = self.tracer.start(
+            ("tool", inv, call_id), f"tool {tool_name}", "tool", inv,
+            parent=self.tracer.get(("agent", inv, tool_context.agent_name)),
+            tool=tool_name, agent=tool_context.agent_name, call_id=call_id,
+        )
+        # An AgentTool's nested invocation hangs under this span
+        self.tracer.activate(span)
 
-        # Absolute minimum (tool name is required)
-        if tool_name is None:
-            tool_name = "UNKNOWN_TOOL"
+        failed = self._failed_tools.get(inv)
+        if failed and tool_name in failed:
+            failed.discard(tool_name)
+            metrics.inc("itsm_retries_total", kind="tool", name=tool_name)
 
         print(YELLOW(f"[OBS][TOOL-START] {tool_name}"))
         self.tool_calls += 1
-        self._tool_start[tool_name] = time.time()
 
-        log_jsonl({
+        log_jsonl(payload_policy.apply({
             "event": "tool_start",
             "timestamp": datetime.utcnow().isoformat(),
             "tool": tool_name,
-            "tool_input": tool_input,
+            "agent": tool_context.agent_name,
             "tool_args": tool_args,
-            "tool_kwargs": tool_kwargs,
-        })
-
+            "invocation_id": inv,
+            "call_id": call_id,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_span_id,
+        }, ("tool_args",), span.trace_id))
 
     # =========================================================
-    # AFTER TOOL CALLBACK — UNIVERSAL SAFE VERSION
+    # AFTER TOOL CALLBACK
+    # ADK 1.19: (tool, tool_args, tool_context, result)
     # =========================================================
     async def after_tool_callback(
         self,
-        *args,
+        *,
+        tool: BaseTool,
+        tool_args: dict,
+        tool_context: ToolContext,
+        result: dict,
         **kwargs
     ):
-        callback_context = kwargs.get("callback_context")
-        tool_name        = kwargs.get("tool_name")
-        tool_input       = kwargs.get("tool_input")
-        tool_response    = kwargs.get("tool_response")
-        tool_kwargs      = kwargs.get("tool_kwargs")
-        tool             = kwargs.get("tool")
-
-        if tool_name is None:
-            tool_name = "UNKNOWN_TOOL"
-
-        start = self._tool_start.get(tool_name, time.time())
-        elapsed = time.time() - start
+        tool_name = getattr(tool, "name", None) or "UNKNOWN_TOOL"
+        call_id = tool_context.function_call_id or tool_name
+        error = None
+        if isinstance(result, dict) and result.get("status") == "error":
+            error = str(result.get("error_message", "tool error"))
+        span = self.tracer.end(
+            ("tool", tool_context.invocation_id, call_id), error=error,
+        )
+        if span is None:
+            return None
+        self.tracer.activate(span.parent)
+        elapsed = span.duration_sec
 
         print(CYAN(f"[OBS][TOOL-END] {tool_name} | {elapsed:.3f}s"))
 
@@ -253,13 +515,53 @@ class ObservabilityPlugin(BasePlugin):
         self.tool_runtime[tool_name] = (
             self.tool_runtime.get(tool_name, 0) + elapsed
         )
+        self._record_tool(tool_context.invocation_id, tool_name, elapsed,
+                          error is not None)
 
-        log_jsonl({
+        # Orchestrator path: the ticket appears as a create_ticket result
+        if tool_name == "create_ticket" and isinstance(result, dict):
+            ticket_id = (result.get("data") or {}).get("ticket_id")
+            if ticket_id:
+                get_usage_ledger().attribute(span.trace_id, ticket_id)
+
+        log_jsonl(payload_policy.apply({
             "event": "tool_end",
             "timestamp": datetime.utcnow().isoformat(),
             "tool": tool_name,
+            "invocation_id": tool_context.invocation_id,
+            "call_id": call_id,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
             "duration_sec": elapsed,
-            "response": tool_response,
-        })
+            "response": result,
+        }, ("response",), span.trace_id))
 
         log_csv("tool_end", tool=tool_name, duration=elapsed)
+        return None
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict,
+        tool_context: ToolContext,
+        error: Exception,
+        **kwargs
+    ):
+        call_id = tool_context.function_call_id or tool.name
+        span = self.tracer.end(
+            ("tool", tool_context.invocation_id, call_id), error=repr(error),
+        )
+        if span is not None:
+            self.tracer.activate(span.parent)
+            self._record_tool(tool_context.invocation_id, tool.name,
+                              span.duration_sec, True)
+        return None
+
+    def _record_tool(self, invocation_id: str, tool_name: str,
+                     elapsed: float, failed: bool):
+        metrics.inc("itsm_tool_calls_total", tool=tool_name)
+        metrics.observe("itsm_tool_duration_seconds", elapsed, tool=tool_name)
+        if failed:
+            metrics.inc("itsm_errors_total", kind="tool", name=tool_name)
+            self._failed_tools.setdefault(invocation_id, set()).add(tool_name)
@@ -0,0 +1,140 @@
+# plugins/payload_policy.py
+# -------------------------------------------------------------
+# Payload policy for observability logs
+# - Sampling per event type (ITSM_OBS_SAMPLE="tool_end=0.1,*=1"):
+#   decided per trace, so a sampled run keeps all its payloads; an
+#   unsampled event is still logged with its timing, just without
+#   the payload
+# - Size cap (ITSM_OBS_PAYLOAD_MAX_BYTES): long strings and lists
+#   are cut with "…[+N chars]" / "…[+N items]" markers, so the line
+#   stays valid JSON; the original size is recorded
+# - ITSM_OBS_PAYLOAD_MODE=hash: oversized payloads are replaced by
+#   sha256 + size + a short preview (compare runs without storing)
+# -------------------------------------------------------------
+
+import os
+import json
+import zlib
+import hashlib
+from typing import Any, Dict, Optional
+
+
+OBS_PAYLOAD_MAX_BYTES = int(os.getenv("ITSM_OBS_PAYLOAD_MAX_BYTES", "4096"))
+OBS_PAYLOAD_MODE = os.getenv("ITSM_OBS_PAYLOAD_MODE", "truncate")
+OBS_SAMPLE = os.getenv("ITSM_OBS_SAMPLE", "*=1")
+PREVIEW_CHARS = 200
+MAX_LIST_ITEMS = 20
+
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+def _shrink(value: Any, max_str: int) -> Any:
+    if isinstance(value, str):
+        if len(value) > max_str:
+            return f"{value[:max_str]}…[+{len(value) - max_str} chars]"
+        return value
+    if isinstance(value, dict):
+        return {k: _shrink(v, max_str) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_shrink(v, max_str) for v in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"…[+{len(value) - MAX_LIST_ITEMS} items]")
+        return items
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return _shrink(str(value), max_str)
+
+
+class PayloadPolicy:
+    def __init__(self, sample: str = OBS_SAMPLE,
+                 max_bytes: int = OBS_PAYLOAD_MAX_BYTES,
+                 mode: str = OBS_PAYLOAD_MODE):
+        self.rates = parse_rates(sample)
+        self.max_bytes = max_bytes
+        self.mode = mode
+
+        self.sampled_out = 0
+        self.truncated = 0
+        self.hashed = 0
+        self.bytes_saved = 0
+
+    def sampled(self, event_type: str, trace_id: Optional[str]) -> bool:
+        rate = self.rates.get(event_type, self.rates.get("*", 1.0))
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        # Same decision for every event of a trace
+        bucket = zlib.crc32((trace_id or "").encode()) / 0xFFFFFFFF
+        return bucket < rate
+
+    def cap(self, value: Any) -> Any:
+        size = _size(value)
+        if size <= self.max_bytes:
+            return value
+
+        if self.mode == "hash":
+            encoded = json.dumps(value, default=str, sort_keys=True)
+            self.hashed += 1
+            self.bytes_saved += size
+            return {"_payload": {
+                "sha256": hashlib.sha256(encoded.encode("utf-8")).hexdigest(),
+                "bytes": size,
+                "preview": encoded[:PREVIEW_CHARS],
+            }}
+
+        # Halve the per-string budget until the payload fits
+        max_str = max(PREVIEW_CHARS, self.max_bytes // 4)
+        shrunk = _shrink(value, max_str)
+        while _size(shrunk) > self.max_bytes and max_str > 16:
+            max_str //= 2
+            shrunk = _shrink(value, max_str)
+        if _size(shrunk) > self.max_bytes:
+            # Too many keys to cut per string: keep a flat preview
+            # (half the cap: re-encoding escapes the quotes)
+            shrunk = json.dumps(shrunk, default=str)[:self.max_bytes // 2]
+        self.truncated += 1
+        self.bytes_saved += size - _size(shrunk)
+        return {"_truncated": {"bytes": size}, "value": shrunk}
+
+    def apply(self, event: dict, payload_fields, trace_id: Optional[str]) -> dict:
+        if not self.sampled(event.get("event", ""), trace_id):
+            self.sampled_out += 1
+            for name in payload_fields:
+                event.pop(name, None)
+            event["payload_sampled"] = False
+            return event
+        for name in payload_fields:
+            if event.get(name) is not None:
+                event[name] = self.cap(event[name])
+        return event
+
+    def stats(self) -> dict:
+        return {
+            "rates": self.rates,
+            "max_bytes": self.max_bytes,
+            "mode": self.mode,
+            "sampled_out": self.sampled_out,
+            "truncated": self.truncated,
+            "hashed": self.hashed,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+payload_policy = PayloadPolicy()
+
+
+__all__ = [
+    "PayloadPolicy",
+    "payload_policy",
+]
@@ -0,0 +1,543 @@
+# plugins/trace_analyzer.py
+# -------------------------------------------------------------
+# Streaming analyzer for logs/observability.jsonl
+# (and the per-process logs/observability.<pid>.jsonl files)
+# - One pass, constant memory: latencies go into fixed-size
+#   histograms; spans are kept only while their trace is open
+#   (closed on the root run_end, or evicted past --max-open)
+# - Skipped stages (before-callback short-circuit) are zero-length,
+#   whether logged with status "skipped" or never ended at all
+# - Reports:
+#     per-stage latency percentiles (agents, tools, LLM per stage)
+#     critical path: stages that set end-to-end latency
+#     LLM calls per ticket (distribution + heaviest tickets)
+#     timeline of one trace (--trace) or the slowest runs
+#     regression diff between two time windows
+#
+# CLI:
+#   python -m plugins.trace_analyzer
+#   python -m plugins.trace_analyzer logs/observability.jsonl --json
+#   python -m plugins.trace_analyzer --trace <trace_id | invocation_id>
+#   python -m plugins.trace_analyzer \
+#       --baseline 2026-10-01T00:00,2026-10-02T00:00 \
+#       --current  2026-10-08T00:00,2026-10-09T00:00
+# -------------------------------------------------------------
+
+import os
+import re
+import sys
+import glob
+import json
+import heapq
+import argparse
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from plugins.metrics import LogHistogram
+
+
+DEFAULT_LOG = os.path.join("logs", "observability.jsonl")
+MAX_OPEN_TRACES = 10000
+REGRESSION_THRESHOLD = 0.20   # p95 up by more than 20%
+MIN_SAMPLES = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+START_EVENTS = {"agent_start": "agent", "tool_start": "tool", "llm_call": "llm"}
+END_EVENTS = {"agent_end", "tool_end", "llm_end"}
+
+
+def _ts(value: str) -> Optional[float]:
+    # Log timestamps are naive UTC; window bounds may carry an offset
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH).total_seconds()
+
+
+def _window(spec: Optional[str]) -> Optional[Tuple[float, float]]:
+    if not spec:
+        return None
+    start, _, end = spec.partition(",")
+    bounds = (_ts(start.strip()), _ts(end.strip()))
+    if None in bounds:
+        raise argparse.ArgumentTypeError(f"Bad window {spec!r}: use START,END")
+    return bounds
+
+
+def _process_files(path: str) -> List[str]:
+    # file.jsonl → itself + the per-process files file.<pid>.jsonl
+    stem, ext = os.path.splitext(path)
+    pattern = re.compile(
+        "(" + re.escape(stem) + r"\.\d+" + re.escape(ext) + r")(\.\d+)?$"
+    )
+    siblings = {m.group(1) for m in map(
+        pattern.match, glob.glob(f"{glob.escape(stem)}.*{glob.escape(ext)}*")
+    ) if m}
+    return [path] + sorted(siblings)
+
+
+def log_files(paths: List[str]) -> List[str]:
+    # Each file → its rotations oldest first (file.5 … file.1), then itself
+    files = []
+    for path in (f for p in paths for f in _process_files(p)):
+        rotated = [p for p in glob.glob(f"{glob.escape(path)}.*")
+                   if re.search(r"\.\d+$", p)]
+        rotated.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+        files.extend(p for p in rotated + [path]
+                     if os.path.exists(p) and p not in files)
+    return files
+
+
+def iter_events(files: Iterable[str], stats: Counter) -> Iterator[dict]:
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                stats["lines"] += 1
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    stats["bad_lines"] += 1
+                    continue
+                if isinstance(event, dict) and "event" in event:
+                    yield event
+
+
+def _ticket_from_response(response) -> Optional[str]:
+    if isinstance(response, dict) and "_truncated" in response:
+        response = response.get("value")
+    if isinstance(response, dict):
+        data = response.get("data")
+        if isinstance(data, dict):
+            return data.get("ticket_id")
+    return None
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "llm_calls", "ticket_id", "root",
+                 "invocations", "last_ts")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: Dict[str, dict] = {}
+        self.llm_calls = 0
+        self.ticket_id = None
+        self.root = None
+        self.invocations = set()
+        self.last_ts = 0.0
+
+
+class TraceAnalyzer:
+    def __init__(self, baseline=None, current=None,
+                 max_open: int = MAX_OPEN_TRACES, slowest: int = 5,
+                 trace_filter: Optional[str] = None, top_tickets: int = 10):
+        self.windows = {"all": None}
+        if baseline and current:
+            self.windows.update({"baseline": baseline, "current": current})
+        self.max_open = max_open
+        self.slowest_n = slowest
+        self.trace_filter = trace_filter
+        self.top_n = top_tickets
+
+        # (window, section, name) → histogram
+        self.hist: Dict[Tuple[str, str, str], LogHistogram] = {}
+        self.errors = Counter()
+        self.open: "OrderedDict[str, _Trace]" = OrderedDict()
+
+        self.traces_closed = 0
+        self.traces_evicted = 0
+        self.llm_per_ticket = Counter()      # calls → number of tickets
+        self.top_tickets: List[Tuple[int, str]] = []
+        # stage → [times on critical path, exclusive seconds on it]
+        self.critical = {}
+        self.slowest: List[Tuple[float, str, list]] = []
+        self.timeline: Optional[dict] = None
+        self.stats = Counter()
+
+    # ---------------------------------------------------------
+    # Aggregates
+    # ---------------------------------------------------------
+    def _observe(self, ts: float, section: str, name: str, value: float):
+        for window, bounds in self.windows.items():
+            if bounds and not bounds[0] <= ts < bounds[1]:
+                continue
+            key = (window, section, name)
+            hist = self.hist.get(key)
+            if hist is None:
+                hist = self.hist[key] = LogHistogram()
+            hist.observe(value)
+
+    # ---------------------------------------------------------
+    # Event stream
+    # ---------------------------------------------------------
+    def feed(self, event: dict):
+        ts = _ts(event.get("timestamp"))
+        if ts is None:
+            self.stats["no_timestamp"] += 1
+            return
+        kind = event["event"]
+        duration = event.get("duration_sec")
+
+        if kind == "agent_end" and event.get("status") == "skipped":
+            self.stats["skipped_spans"] += 1
+        elif kind == "agent_end" and duration is not None:
+            self._observe(ts, "agent", event.get("agent"), duration)
+        elif kind == "tool_end" and duration is not None:
+            self._observe(ts, "tool", event.get("tool"), duration)
+        elif kind == "llm_end" and duration is not None:
+            self._observe(ts, "llm", event.get("agent"), duration)
+            if event.get("error"):
+                self.errors[("llm", event.get("agent"))] += 1
+        elif kind == "run_end" and duration is not None \
+                and not event.get("parent_span_id"):
+            self._observe(ts, "pipeline", event.get("app"), duration)
+
+        trace_id = event.get("trace_id")
+        if not trace_id:
+            return  # pre-tracing log lines: aggregates only
+        trace = self.open.get(trace_id)
+        if trace is None:
+            trace = self.open[trace_id] = _Trace(trace_id)
+            if len(self.open) > self.max_open:
+                self.traces_evicted += 1
+                self._close(self.open.popitem(last=False)[1])
+        else:
+            self.open.move_to_end(trace_id)
+        trace.last_ts = ts
+        if event.get("invocation_id"):
+            trace.invocations.add(event["invocation_id"])
+        self._span_event(trace, kind, event, ts, duration)
+
+        if kind == "run_end" and not event.get("parent_span_id"):
+            del self.open[trace_id]
+            self._close(trace)
+
+    def _span_event(self, trace: _Trace, kind: str, event: dict,
+                    ts: float, duration):
+        span_id = event.get("span_id")
+        if kind in START_EVENTS and span_id:
+            span_kind = START_EVENTS[kind]
+            label = event.get("tool") if span_kind == "tool" else event.get("agent")
+            trace.spans[span_id] = {
+                "name": f"{span_kind}:{label}",
+                "parent": event.get("parent_span_id"),
+                "start": ts,
+                "end": None,
+            }
+            if kind == "llm_call":
+                trace.llm_calls += 1
+        elif kind in END_EVENTS and span_id:
+            span = trace.spans.get(span_id)
+            if span is None and duration is not None:
+                # start line lost (rotation / sampling): rebuild from duration
+                label = event.get("tool") or event.get("agent")
+                span = trace.spans[span_id] = {
+                    "name": f"{kind.split('_')[0]}:{label}", "parent": None,
+                    "start": ts - duration, "end": None,
+                }
+            if span is not None:
+                span["end"] = ts
+            if kind == "tool_end" and event.get("tool") == "create_ticket":
+                trace.ticket_id = (_ticket_from_response(event.get("response"))
+                                   or trace.ticket_id)
+        elif kind == "run_end" and span_id:
+            trace.spans[span_id] = {
+                "name": f"run:{event.get('agent')}",
+                "parent": event.get("parent_span_id"),
+                "start": ts - (duration or 0),
+                "end": ts,
+            }
+            trace.ticket_id = event.get("ticket_id") or trace.ticket_id
+            if not event.get("parent_span_id"):
+                trace.root = span_id
+
+    # ---------------------------------------------------------
+    # Trace close: ticket stats, critical path, timelines
+    # ---------------------------------------------------------
+    def _close(self, trace: _Trace):
+        self.traces_closed += 1
+        spans = trace.spans
+        # A span without an end under a parent that did end was skipped by
+        # a before-callback (older logs never closed it): zero-length, and
+        # the stages that ran after it move up to its parent
+        skipped = {
+            span_id for span_id, span in spans.items()
+            if span["end"] is None
+            and spans.get(span["parent"], {}).get("end") is not None
+        }
+        for span_id in skipped:
+            spans[span_id]["end"] = spans[span_id]["start"]
+        for span in spans.values():
+            while span["parent"] in skipped:
+                span["parent"] = spans[span["parent"]]["parent"]
+            if span["end"] is None:
+                span["end"] = trace.last_ts  # never ended (crash / eviction)
+
+        if trace.ticket_id:
+            self.llm_per_ticket[trace.llm_calls] += 1
+            item = (trace.llm_calls, trace.ticket_id)
+            if len(self.top_tickets) < self.top_n:
+                heapq.heappush(self.top_tickets, item)
+            else:
+                heapq.heappushpop(self.top_tickets, item)
+
+        if not spans:
+            return
+        children: Dict[Optional[str], list] = {}
+        for span_id, span in spans.items():
+            parent = span["parent"] if span["parent"] in spans else None
+            children.setdefault(parent, []).append(span_id)
+
+        root = trace.root
+        if root is None:
+            root = max(children.get(None, []),
+                       key=lambda s: spans[s]["end"] - spans[s]["start"])
+        path = {}
+        self._critical_path(spans, children, root, path)
+        for span_id, own in path.items():
+            entry = self.critical.setdefault(spans[span_id]["name"], [0, 0.0])
+            entry[0] += 1
+            entry[1] += own
+
+        top = spans[root]
+        total = top["end"] - top["start"]
+        wanted = self.trace_filter and (
+            self.trace_filter == trace.trace_id
+            or self.trace_filter in trace.invocations
+        )
+        if wanted or (self.slowest_n and (
+                len(self.slowest) < self.slowest_n or total > self.slowest[0][0])):
+            timeline = self._timeline(spans, children, path)
+            if wanted:
+                self.timeline = {"trace_id": trace.trace_id,
+                                 "ticket_id": trace.ticket_id,
+                                 "duration_sec": total, "spans": timeline}
+            if self.slowest_n:
+                item = (total, trace.trace_id, timeline)
+                if len(self.slowest) < self.slowest_n:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+
+    @classmethod
+    def _critical_path(cls, spans, children, span_id, path: dict):
+        # Walk back from the end: the child finishing last is what the
+        # span waited on, then whatever finished before that child began,
+        # and so on. Parallel siblings off that chain are not critical.
+        span = spans[span_id]
+        cursor = span["end"]
+        own = span["end"] - span["start"]
+        pending = sorted(children.get(span_id, []),
+                         key=lambda s: spans[s]["end"], reverse=True)
+        chain = []
+        for child in pending:
+            if spans[child]["end"] <= cursor + 1e-3:
+                chain.append(child)
+                cursor = spans[child]["start"]
+        for child in chain:
+            own -= spans[child]["end"] - spans[child]["start"]
+            cls._critical_path(spans, children, child, path)
+        path[span_id] = max(own, 0.0)  # time on the path spent in the span itself
+
+    @staticmethod
+    def _timeline(spans, children, critical) -> list:
+        t0 = min(s["start"] for s in spans.values())
+        rows = []
+
+        def walk(span_id, depth):
+            span = spans[span_id]
+            rows.append({
+                "name": span["name"],
+                "depth": depth,
+                "offset_sec": round(span["start"] - t0, 3),
+                "duration_sec": round(span["end"] - span["start"], 3),
+                "critical": span_id in critical,
+            })
+            for child in sorted(children.get(span_id, []),
+                                key=lambda s: spans[s]["start"]):
+                walk(child, depth + 1)
+
+        for top in sorted(children.get(None, []), key=lambda s: spans[s]["start"]):
+            walk(top, 0)
+        return rows
+
+    def finish(self):
+        while self.open:
+            self._close(self.open.popitem(last=False)[1])
+
+    # ---------------------------------------------------------
+    # Report
+    # ---------------------------------------------------------
+    def _percentiles(self, window: str) -> dict:
+        out = {}
+        for (w, section, name), hist in sorted(
+                self.hist.items(), key=lambda kv: (kv[0][1], -kv[1].sum)):
+            if w == window:
+                out.setdefault(section, {})[name] = hist.summary()
+        return out
+
+    def _diff(self) -> list:
+        rows = []
+        for (w, section, name), cur in self.hist.items():
+            if w != "current":
+                continue
+            base = self.hist.get(("baseline", section, name))
+            if base is None or min(base.count, cur.count) < MIN_SAMPLES:
+                continue
+            b95, c95 = base.quantile(0.95), cur.quantile(0.95)
+            change = (c95 - b95) / b95 if b95 else 0.0
+            rows.append({
+                "section": section,
+                "name": name,
+                "baseline": base.summary(),
+                "current": cur.summary(),
+                "p95_change": round(change, 3),
+                "regression": change > REGRESSION_THRESHOLD,
+            })
+        rows.sort(key=lambda r: r["p95_change"], reverse=True)
+        return rows
+
+    def report(self) -> dict:
+        critical_total = sum(v[1] for v in self.critical.values()) or 1.0
+        tickets = sum(self.llm_per_ticket.values())
+        report = {
+            "input": dict(self.stats),
+            "traces": {"closed": self.traces_closed,
+                       "evicted_open": self.traces_evicted},
+            "latency": self._percentiles("all"),
+            "critical_path": sorted(
+                ({"stage": name, "on_path": n,
+                  "exclusive_sec": round(sec, 3),
+                  "share": round(sec / critical_total, 3)}
+                 for name, (n, sec) in self.critical.items()),
+                key=lambda r: r["exclusive_sec"], reverse=True,
+            ),
+            "llm_calls_per_ticket": {
+                "tickets": tickets,
+                "mean": round(sum(k * v for k, v in self.llm_per_ticket.items())
+                              / tickets, 2) if tickets else 0,
+                "distribution": dict(sorted(self.llm_per_ticket.items())),
+                "top": [{"ticket_id": t, "llm_calls": n}
+                        for n, t in sorted(self.top_tickets, reverse=True)],
+            },
+            "llm_errors": {name: n for (_, name), n in self.errors.items()},
+            "slowest": [{"trace_id": t, "duration_sec": round(d, 3),
+                         "timeline": tl}
+                        for d, t, tl in sorted(self.slowest, reverse=True)],
+        }
+        if "baseline" in self.windows:
+            report["diff"] = self._diff()
+        if self.trace_filter:
+            report["timeline"] = self.timeline
+        return report
+
+
+# -------------------------------------------------------------
+# Text output
+# -------------------------------------------------------------
+def _print_timeline(rows: list, out):
+    for r in rows:
+        mark = "*" if r["critical"] else " "
+        print(f"  {mark} {r['offset_sec']:>8.3f}s {r['duration_sec']:>8.3f}s  "
+              f"{'  ' * r['depth']}{r['name']}", file=out)
+
+
+def format_report(report: dict, out=sys.stdout):
+    print(f"Lines: {report['input'].get('lines', 0)}"
+          f" | traces: {report['traces']['closed']}"
+          f" (evicted while open: {report['traces']['evicted_open']})", file=out)
+
+    for section, rows in report["latency"].items():
+        print(f"\n== {section} latency (s) ==", file=out)
+        print(f"  {'name':<34}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+              file=out)
+        for name, s in rows.items():
+            print(f"  {str(name)[:33]:<34}{s['count']:>8}{s['p50']:>9.3f}"
+                  f"{s['p95']:>9.3f}{s['p99']:>9.3f}{s['max']:>9.3f}", file=out)
+
+    if report["critical_path"]:
+        print("\n== critical path (exclusive time on the longest chain) ==",
+              file=out)
+        for r in report["critical_path"][:15]:
+            print(f"  {r['stage'][:40]:<41}{r['share']:>7.1%}"
+                  f"{r['exclusive_sec']:>11.2f}s{r['on_path']:>7}x", file=out)
+
+    t = report["llm_calls_per_ticket"]
+    print(f"\n== LLM calls per ticket == tickets: {t['tickets']}"
+          f" | mean: {t['mean']}", file=out)
+    for row in t["top"]:
+        print(f"  {row['ticket_id']:<30}{row['llm_calls']:>5}", file=out)
+
+    for trace in report["slowest"]:
+        print(f"\n== slow trace {trace['trace_id']}"
+              f" ({trace['duration_sec']}s, * = critical path) ==", file=out)
+        _print_timeline(trace["timeline"], out)
+
+    if report.get("timeline"):
+        tl = report["timeline"]
+        print(f"\n== trace {tl['trace_id']} ticket={tl['ticket_id']}"
+              f" ({tl['duration_sec']:.3f}s) ==", file=out)
+        _print_timeline(tl["spans"], out)
+
+    if "diff" in report:
+        print("\n== baseline → current (p95) ==", file=out)
+        for r in report["diff"]:
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"  {r['section']:<9}{str(r['name'])[:30]:<31}"
+                  f"{r['baseline']['p95']:>8.3f} → {r['current']['p95']:<8.3f}"
+                  f"{r['p95_change']:>+8.1%}{flag}", file=out)
+
+
+# -------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m plugins.trace_analyzer",
+        description="Latency, critical path and LLM usage from observability.jsonl.",
+    )
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_LOG],
+                        help="JSONL logs (rotated .N files are included)")
+    parser.add_argument("--trace", help="Print the timeline of one trace / invocation")
+    parser.add_argument("--slowest", type=int, default=3,
+                        help="Timelines of the N slowest traces")
+    parser.add_argument("--baseline", type=_window, help="START,END (ISO)")
+    parser.add_argument("--current", type=_window, help="START,END (ISO)")
+    parser.add_argument("--max-open", type=int, default=MAX_OPEN_TRACES)
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args(argv)
+
+    if bool(args.baseline) != bool(args.current):
+        parser.error("--baseline and --current go together")
+    files = log_files(args.paths)
+    if not files:
+        parser.error(f"No log files found: {', '.join(args.paths)}")
+
+    analyzer = TraceAnalyzer(args.baseline, args.current, args.max_open,
+                             args.slowest, args.trace)
+    for event in iter_events(files, analyzer.stats):
+        analyzer.feed(event)
+    analyzer.finish()
+
+    report = analyzer.report()
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        format_report(report)
+    return 0
+
+
+__all__ = [
+    "TraceAnalyzer",
+    "iter_events",
+    "log_files",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
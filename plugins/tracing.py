@@ -0,0 +1,201 @@
+# plugins/tracing.py
+# -------------------------------------------------------------
+# Invocation-scoped span tracing
+# - Spans: invocation → agent → tool / llm, keyed by invocation id
+#   plus agent name (agent, llm) or function call id (tool), so
+#   concurrent sessions never share a start time
+# - The running span lives in a contextvar: an AgentTool's nested
+#   invocation (same task) becomes a child of the tool span, and
+#   parallel sub-agents / tool calls (own tasks) stay siblings
+# - A finished trace is written as one OTLP/JSON
+#   ExportTraceServiceRequest line (logs/traces.jsonl), which can be
+#   POSTed as-is to an OpenTelemetry collector (/v1/traces)
+# -------------------------------------------------------------
+
+import os
+import time
+import json
+import secrets
+import contextvars
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from plugins.log_sinks import BufferedSink
+
+
+TRACE_PATH = os.path.join("logs", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("ITSM_TRACE_SERVICE_NAME", "itsm-multi-agent")
+# Traces whose root never ended (crashed run) are exported partially
+TRACE_MAX_AGE_SEC = float(os.getenv("ITSM_TRACE_MAX_AGE_SEC", "900"))
+
+# OTLP SpanKind / StatusCode values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str                      # invocation | agent | tool | llm
+    trace_id: str
+    span_id: str
+    parent: Optional["Span"]
+    invocation_id: str
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: dict = field(default_factory=dict)
+    status: int = STATUS_OK
+    status_message: str = ""
+
+    @property
+    def parent_span_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent else None
+
+    @property
+    def duration_sec(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_CLIENT if self.kind in ("tool", "llm")
+                    else SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes({
+                "itsm.span.kind": self.kind,
+                "itsm.invocation_id": self.invocation_id,
+                **self.attributes,
+            }),
+            "status": {"code": self.status},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)}
+            for k, v in attributes.items() if v is not None]
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "itsm_current_span", default=None
+)
+
+
+class Tracer:
+    def __init__(self, path: str = TRACE_PATH,
+                 service_name: str = TRACE_SERVICE_NAME):
+        self.service_name = service_name
+        self.sink = BufferedSink(path)
+        self._open: Dict[tuple, Span] = {}
+        self._traces: Dict[str, List[Span]] = {}   # trace_id → finished spans
+        self._trace_started: Dict[str, float] = {}
+        self.exported = 0
+
+    # ---------------------------------------------------------
+    # Span lifecycle
+    # ---------------------------------------------------------
+    def start(self, key: tuple, name: str, kind: str, invocation_id: str,
+              parent: Optional[Span] = None, **attributes) -> Span:
+        if parent is None:
+            parent = _current_span.get()
+        if parent is not None:
+            trace_id = parent.trace_id
+        else:
+            trace_id = secrets.token_hex(16)
+            self._trace_started[trace_id] = time.time()
+        span = Span(name=name, kind=kind, trace_id=trace_id,
+                    span_id=secrets.token_hex(8), parent=parent,
+                    invocation_id=invocation_id, attributes=attributes)
+        self._open[key] = span
+        return span
+
+    def get(self, key: tuple) -> Optional[Span]:
+        return self._open.get(key)
+
+    def end(self, key: tuple, error: Optional[str] = None,
+            **attributes) -> Optional[Span]:
+        span = self._open.pop(key, None)
+        if span is None:
+            return None
+        span.end_ns = time.time_ns()
+        span.attributes.update(attributes)
+        if error:
+            span.status = STATUS_ERROR
+            span.status_message = error[:500]
+        self._traces.setdefault(span.trace_id, []).append(span)
+        if span.parent is None:
+            self._export(span.trace_id)
+            self._evict_stale()
+        return span
+
+    # Running span for the current task (parent of what starts next)
+    def activate(self, span: Optional[Span]):
+        _current_span.set(span)
+
+    # ---------------------------------------------------------
+    # Export
+    # ---------------------------------------------------------
+    def _export(self, trace_id: str):
+        spans = self._traces.pop(trace_id, [])
+        self._trace_started.pop(trace_id, None)
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({
+                "service.name": self.service_name,
+            })},
+            "scopeSpans": [{
+                "scope": {"name": "plugins.tracing"},
+                "spans": [s.to_otlp() for s in spans],
+            }],
+        }]}
+        self.sink.write(json.dumps(request, default=str) + "\n")
+        self.exported += 1
+
+    def _evict_stale(self):
+        cutoff = time.time() - TRACE_MAX_AGE_SEC
+        for trace_id, started in list(self._trace_started.items()):
+            if started >= cutoff:
+                continue
+            for key, span in list(self._open.items()):
+                if span.trace_id == trace_id:
+                    del self._open[key]
+                    span.end_ns = time.time_ns()
+                    span.status = STATUS_ERROR
+                    span.status_message = "span never ended"
+                    self._traces.setdefault(trace_id, []).append(span)
+            self._export(trace_id)
+
+    def stats(self) -> dict:
+        return {
+            "open_spans": len(self._open),
+            "open_traces": len(self._trace_started),
+            "exported_traces": self.exported,
+            "sink": self.sink.stats(),
+        }
+
+
+__all__ = [
+    "Span",
+    "Tracer",
+]
@@ -0,0 +1,20 @@
+# server/__main__.py
+# -------------------------------------------------------------
+# python -m server → uvicorn with N worker processes
+# Each worker owns its runner pool; sessions / tickets are shared
+# through the databases.
+# -------------------------------------------------------------
+
+import os
+
+import uvicorn
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "server.app:app",
+        host=os.getenv("ITSM_SERVER_HOST", "0.0.0.0"),
+        port=int(os.getenv("ITSM_SERVER_PORT", "8000")),
+        workers=int(os.getenv("ITSM_SERVER_WORKERS", "2")),
+        timeout_graceful_shutdown=30,
+    )
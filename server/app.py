@@ -0,0 +1,253 @@
+# server/app.py
+# -------------------------------------------------------------
+# Async HTTP API for the ticket pipeline (FastAPI)
+# - POST /tickets          run the pipeline, return the final stages
+# - POST /tickets/stream   same run as Server-Sent Events per stage
+# - GET  /tickets/{id}     ticket lookup (store + history + SLA)
+# - POST /jobs             enqueue a run on the priority work queue (202)
+# - GET  /jobs/{id}        queued job status / result
+# - GET  /healthz          runner pool, queue, log sink and pipeline stats
+# - GET  /metrics          Prometheus text (latency histograms, counters)
+# - GET  /usage/stages     LLM tokens / latency per stage (last N hours)
+# - Long-lived runner pool per worker process; all workers share the
+#   session DB and ticket DB (SQLite WAL or Postgres sessions)
+# - 429 + Retry-After when the pool (LLM queue) is saturated
+# - Queue workers run in every process and share the job table, so a
+#   job leased by a crashed worker is picked up by another one
+# - Background services start with the app: queue worker, status-check
+#   scheduler, SLA timers and session retention
+#
+# Run:  python -m server            (ITSM_SERVER_WORKERS processes)
+#       uvicorn server.app:app --workers 4
+# -------------------------------------------------------------
+
+import json
+import time
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from google.adk.runners import Runner
+from pydantic import BaseModel
+
+from agents.app import ticket_app, session_service
+from agents.checkpoint import checkpoint_stats
+from agents.compaction import compaction_stats
+from agents.projections import projection_report
+from agents.retention import RETENTION_BACKGROUND, start_retention_task
+from agents.storm import storm_metrics
+from agents.streaming import stream_ticket_pipeline
+from agents.user_cache import user_cache_stats
+from plugins.llm_usage import get_usage_ledger
+from plugins.metrics import metrics
+from plugins.observability_plugin import sink_stats
+from server.runner_pool import PoolSaturated, RunnerPool
+from tools.sla_engine import sla_engine
+from tools.status_scheduler import status_scheduler
+from tools.ticket_store import ticket_store
+from tools.work_queue import (
+    QUEUE_CONCURRENCY, QueueFull, WorkQueueWorker, work_queue,
+)
+
+
+class TicketRequest(BaseModel):
+    message: str
+    user_id: str
+    session_id: Optional[str] = None
+
+
+def _ticket_runner() -> Runner:
+    return Runner(app=ticket_app, session_service=session_service)
+
+
+async def _run_pipeline(runner: Runner, message: str, user_id: str,
+                        session_id: Optional[str] = None) -> dict:
+    started = time.perf_counter()
+    stages = {}
+    ticket_id = None
+    async for ev in stream_ticket_pipeline(
+        message, user_id, session_id, runner=runner,
+    ):
+        session_id = ev.session_id
+        ticket_id = ev.ticket_id or ticket_id
+        if ev.stage != "done":
+            stages[ev.stage] = ev.data
+    return {
+        "session_id": session_id,
+        "ticket_id": ticket_id,
+        "stages": stages,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+
+
+async def _run_job(payload: dict) -> dict:
+    # Queue workers have their own runners: queued work never competes
+    # with interactive requests for the request pool
+    async with app.state.queue_pool.acquire() as runner:
+        return await _run_pipeline(runner, payload["message"],
+                                   payload["user_id"], payload.get("session_id"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.pool = RunnerPool(_ticket_runner)
+    app.state.queue_pool = RunnerPool(_ticket_runner, size=QUEUE_CONCURRENCY)
+    app.state.worker = WorkQueueWorker(work_queue, _run_job)
+    app.state.worker.start()
+    # Reload persisted status-check timers (claimed per row across workers)
+    await status_scheduler.start()
+    sla_engine.start()
+    app.state.retention = (
+        start_retention_task(session_service.db_engine)
+        if RETENTION_BACKGROUND else None
+    )
+    print(f"[SERVER] Runner pool ready ({app.state.pool.size} runners,"
+          f" {QUEUE_CONCURRENCY} queue workers)")
+    yield
+    if app.state.retention is not None:
+        app.state.retention.cancel()
+        with suppress(asyncio.CancelledError):
+            await app.state.retention
+    await app.state.worker.stop()
+    await status_scheduler.stop()
+    await sla_engine.stop()
+    await work_queue.close()
+    await ticket_store.close()
+
+
+app = FastAPI(title="ITSM Multi-Agent API", lifespan=lifespan)
+
+
+def _saturated(e: PoolSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Ticket pipeline is at capacity, retry later.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+# -------------------------------------------------------------
+# Ticket submission
+# -------------------------------------------------------------
+@app.post("/tickets")
+async def submit_ticket(req: TicketRequest):
+    try:
+        async with app.state.pool.acquire() as runner:
+            return await _run_pipeline(runner, req.message, req.user_id,
+                                       req.session_id)
+    except PoolSaturated as e:
+        raise _saturated(e)
+
+
+@app.post("/tickets/stream")
+async def submit_ticket_stream(req: TicketRequest):
+    # Take the slot before responding so saturation is a plain 429
+    stack = AsyncExitStack()
+    try:
+        runner = await stack.enter_async_context(app.state.pool.acquire())
+    except PoolSaturated as e:
+        raise _saturated(e)
+
+    async def events():
+        try:
+            async for ev in stream_ticket_pipeline(
+                req.message, req.user_id, req.session_id, runner=runner,
+            ):
+                payload = json.dumps(ev.to_dict(), default=str)
+                yield f"event: {ev.stage}\ndata: {payload}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            await stack.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -------------------------------------------------------------
+# Priority work queue
+# -------------------------------------------------------------
+@app.post("/jobs", status_code=202)
+async def enqueue_job(req: TicketRequest, lane: Optional[int] = None):
+    if lane is not None and lane not in (1, 2, 3, 4):
+        raise HTTPException(status_code=422, detail="lane must be 1-4.")
+    try:
+        return await work_queue.enqueue(req.model_dump(), lane)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Work queue is full, retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await work_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    job.pop("lease_owner", None)
+    return job
+
+
+# -------------------------------------------------------------
+# Ticket lookup
+# -------------------------------------------------------------
+@app.get("/tickets/{ticket_id}")
+async def get_ticket(ticket_id: str):
+    ticket = await ticket_store.get_ticket(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404,
+                            detail=f"Ticket {ticket_id} not found.")
+    return {
+        **ticket,
+        "history": await ticket_store.get_history(ticket_id),
+        "sla": sla_engine.tickets.get(ticket_id),
+        "llm_usage": await asyncio.to_thread(
+            get_usage_ledger().ticket_usage, ticket_id
+        ),
+    }
+
+
+@app.get("/usage/stages")
+async def usage_by_stage(hours: Optional[float] = 24):
+    return {
+        "since_hours": hours,
+        "stages": await asyncio.to_thread(
+            get_usage_ledger().stage_usage, hours
+        ),
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "status": "ok",
+        "runner_pool": app.state.pool.stats(),
+        "work_queue": {
+            **await work_queue.stats(),
+            "worker": app.state.worker.stats(),
+        },
+        "observability_sinks": sink_stats(),
+        "storms": storm_metrics(),
+        "compaction": compaction_stats(),
+        "checkpoints": checkpoint_stats(),
+        "projections": projection_report(),
+        "user_cache": user_cache_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+__all__ = ["app"]
@@ -0,0 +1,104 @@
+# server/runner_pool.py
+# -------------------------------------------------------------
+# Pool of long-lived ADK runners with backpressure
+# - `size` concurrent pipeline runs per process (LLM concurrency)
+# - Up to `max_waiting` callers queue for a slot; beyond that the
+#   pool is saturated and callers get PoolSaturated(retry_after)
+# - Waiters are served first-come first-served
+# - retry_after is estimated from recent run durations
+# -------------------------------------------------------------
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from google.adk.runners import Runner
+
+
+RUNNER_POOL_SIZE = int(os.getenv("ITSM_RUNNER_POOL_SIZE", "8"))
+RUNNER_MAX_WAITING = int(os.getenv("ITSM_RUNNER_MAX_WAITING", "32"))
+RUNNER_ACQUIRE_TIMEOUT = float(os.getenv("ITSM_RUNNER_ACQUIRE_TIMEOUT", "30"))
+
+
+class PoolSaturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Runner pool saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RunnerPool:
+    def __init__(self, factory: Callable[[], Runner],
+                 size: int = RUNNER_POOL_SIZE,
+                 max_waiting: int = RUNNER_MAX_WAITING,
+                 acquire_timeout: float = RUNNER_ACQUIRE_TIMEOUT):
+        self.size = size
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(factory())
+
+        self.waiting = 0
+        self.rejected = 0
+        self.completed = 0
+        self._avg_run_sec = 10.0  # EWMA, seeded with a typical pipeline run
+
+    @property
+    def busy(self) -> int:
+        return self.size - self._idle.qsize()
+
+    def retry_after(self) -> int:
+        # Time until the current queue drains through all slots
+        backlog = self.waiting + 1
+        return max(1, round(self._avg_run_sec * backlog / self.size))
+
+    async def _take(self) -> Runner:
+        # Fast path only when nobody is queued: a released runner goes to
+        # the oldest waiter (asyncio.Queue getters are FIFO), not to a
+        # request that just arrived
+        if not self.waiting and not self._idle.empty():
+            return self._idle.get_nowait()
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PoolSaturated(self.retry_after())
+
+        self.waiting += 1
+        try:
+            return await asyncio.wait_for(self._idle.get(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolSaturated(self.retry_after())
+        finally:
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def acquire(self):
+        runner = await self._take()
+
+        started = time.perf_counter()
+        try:
+            yield runner
+        finally:
+            elapsed = time.perf_counter() - started
+            self._avg_run_sec = 0.8 * self._avg_run_sec + 0.2 * elapsed
+            self.completed += 1
+            self._idle.put_nowait(runner)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_run_sec": round(self._avg_run_sec, 3),
+        }
+
+
+__all__ = [
+    "RunnerPool",
+    "PoolSaturated",
+]
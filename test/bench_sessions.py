@@ -0,0 +1,126 @@
+# test/bench_sessions.py
+# -------------------------------------------------------------
+# Session storage concurrency benchmark
+# - N sessions, each: create_session + K append_event (with state
+#   delta) + get_session, spread over W concurrent workers
+# - Compares ADK defaults vs agents/session_config.py tuning
+# - Reports sessions/second and "database is locked" errors
+#
+# Usage:
+#   python test/bench_sessions.py
+#   python test/bench_sessions.py --workers 1,8,32 --sessions 300 --events 8
+#   python test/bench_sessions.py --url postgresql+asyncpg://u:p@host/itsm
+# -------------------------------------------------------------
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.adk.sessions import DatabaseSessionService
+from google.genai import types
+
+from agents.session_config import create_session_service
+
+
+APP_NAME = "itsm_bench"
+
+
+async def run_session(service, user_id: str, events: int):
+    session = await service.create_session(app_name=APP_NAME, user_id=user_id)
+    for i in range(events):
+        event = Event(
+            invocation_id=f"inv-{uuid.uuid4().hex[:8]}",
+            author="BenchAgent",
+            content=types.Content(
+                role="model", parts=[types.Part(text=f"stage {i} output")]
+            ),
+            actions=EventActions(state_delta={
+                f"stage_{i}": {"ok": True, "i": i},
+                "user:last_stage": i,
+            }),
+        )
+        await service.append_event(session, event)
+    await service.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session.id
+    )
+
+
+async def bench(service, sessions: int, workers: int, events: int) -> dict:
+    queue = asyncio.Queue()
+    for i in range(sessions):
+        queue.put_nowait(f"user-{i % 50}")
+    errors = {"locked": 0, "other": 0}
+
+    async def worker():
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            try:
+                await run_session(service, user_id, events)
+            except Exception as e:
+                key = "locked" if "locked" in str(e).lower() else "other"
+                errors[key] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+
+    done = sessions - errors["locked"] - errors["other"]
+    return {
+        "workers": workers,
+        "sessions_per_sec": round(done / elapsed, 1),
+        "elapsed_sec": round(elapsed, 2),
+        "locked_errors": errors["locked"],
+        "other_errors": errors["other"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Session storage concurrency benchmark")
+    parser.add_argument("--workers", default="1,4,16,64")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--url", default=None,
+                        help="Benchmark only this DB URL (tuned config)")
+    args = parser.parse_args()
+    worker_counts = [int(w) for w in args.workers.split(",")]
+
+    tmp = tempfile.mkdtemp(prefix="itsm_bench_")
+    configs = []
+    if args.url:
+        configs.append(("tuned", lambda n: create_session_service(args.url)))
+    else:
+        def sqlite_url(name, n):
+            return f"sqlite+aiosqlite:///{os.path.join(tmp, f'{name}_{n}.db')}"
+
+        configs.append(("adk-default",
+                        lambda n: DatabaseSessionService(
+                            db_url=sqlite_url("default", n))))
+        configs.append(("tuned",
+                        lambda n: create_session_service(
+                            sqlite_url("tuned", n))))
+
+    print(f"\n{'config':<12} {'workers':>7} {'sess/s':>8} {'secs':>7}"
+          f" {'locked':>7} {'other':>6}")
+    for name, factory in configs:
+        for workers in worker_counts:
+            service = factory(workers)
+            r = await bench(service, args.sessions, workers, args.events)
+            await service.db_engine.dispose()
+            print(f"{name:<12} {r['workers']:>7} {r['sessions_per_sec']:>8}"
+                  f" {r['elapsed_sec']:>7} {r['locked_errors']:>7}"
+                  f" {r['other_errors']:>6}")
+
+    print(f"\nDatabases left in {tmp}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,7 +6,7 @@
 #   1. FAISS Vector KB
 #   2. Google Search Tool
 #   3. Code Executor Tool
-#   4. Custom Tools (ticket create/update/status)
+#   4. Custom Tools (ticket create/update/status, SQLite-backed)
 #   5. MCP Toolsets (filesystem; shell skipped on Windows)
 #   6. Full Ticket Pipeline Agent
 #   7. Orchestrator Routing with DB Session
@@ -16,6 +16,7 @@ import asyncio
 import os
 import sys
 import platform
+from datetime import datetime, timezone
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -34,6 +35,12 @@ from tools.custom_tools import (
     check_ticket_status_tool,
     update_ticket_status_tool,
     exit_loop_tool,
+    schedule_status_check_tool,
+    cancel_status_check_tool,
+    list_status_checks_tool,
+    save_log_tool,
+    get_ticket_log_tool,
+    search_ticket_history_tool,
 )
 from tools.mcp_tools import (
     mcp_file_toolset,
@@ -142,26 +149,67 @@ async def test_custom_tools():
     title("TEST 4: Custom Tools (ServiceNow Simulated)")
 
     print("\n> create_ticket_tool:")
-    r1 = create_ticket_tool.func(
+    r1 = await create_ticket_tool.func(
         summary="VPN issue",
         priority="P2",
         description="Authentication failing",
+        category="Network",
     )
     print(r1)
 
     ticket_id = r1["data"]["ticket_id"]
 
     print("\n> check_ticket_status_tool:")
-    r2 = check_ticket_status_tool.func(ticket_id=ticket_id)
+    r2 = await check_ticket_status_tool.func(ticket_id=ticket_id)
     print(r2)
+    assert r2["data"]["current_status"] == "Open"
 
     print("\n> update_ticket_status_tool:")
-    r3 = update_ticket_status_tool.func(
+    r3 = await update_ticket_status_tool.func(
         ticket_id=ticket_id,
         new_status="In Progress",
     )
     print(r3)
 
+    r2b = await check_ticket_status_tool.func(ticket_id=ticket_id)
+    assert r2b["data"]["current_status"] == "In Progress"
+    assert len(r2b["data"]["history"]) == 2
+
+    print("\n> search_ticket_history_tool:")
+    await update_ticket_status_tool.func(
+        ticket_id=ticket_id,
+        new_status="Resolved",
+        resolution="Reset MFA token and re-synced password",
+    )
+    found = await search_ticket_history_tool.func(query="MFA token reset")
+    print(found)
+    assert ticket_id in [r["ticket_id"] for r in found["data"]["results"]]
+    # Category is stored; a date-only upper bound includes that day
+    today = datetime.now(timezone.utc).date().isoformat()
+    found = await search_ticket_history_tool.func(
+        query="MFA token reset", category="Network", date_to=today,
+    )
+    assert ticket_id in [r["ticket_id"] for r in found["data"]["results"]]
+
+    print("\n> save_log_tool / get_ticket_log_tool:")
+    save_log_tool.func(ticket_id=ticket_id, message="User rebooted laptop")
+    save_log_tool.func(ticket_id=ticket_id, message="VPN reset", level="WARN")
+    log = await get_ticket_log_tool.func(ticket_id=ticket_id)
+    print(log)
+    assert [e["message"] for e in log["data"]["entries"]] == [
+        "User rebooted laptop", "VPN reset",
+    ]
+
+    print("\n> schedule_status_check_tool (coalesced + cancel):")
+    s1 = await schedule_status_check_tool.func(ticket_id=ticket_id, delay_seconds=60)
+    s2 = await schedule_status_check_tool.func(ticket_id=ticket_id, delay_seconds=120)
+    print(s1, s2)
+    assert s2["data"]["coalesced"]
+    pending = (await list_status_checks_tool.func())["data"]["pending"]
+    assert [p["ticket_id"] for p in pending].count(ticket_id) == 1
+    c = await cancel_status_check_tool.func(ticket_id=ticket_id)
+    assert c["data"]["cancelled"]
+
     print("\n> exit_loop_tool:")
     r4 = exit_loop_tool.func()
     print(r4)
@@ -176,7 +224,7 @@ async def test_mcp():
     print("[TEST] Testing MCP File Toolset (filesystem)...")
     res = await run_tool_test(
         mcp_file_toolset,
-        "readFile system_logs.txt"
+        "readFile README.md"
     )
     print("[MCP FILE RESULT]:", res)
 
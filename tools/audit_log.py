@@ -0,0 +1,266 @@
+# tools/audit_log.py
+# -------------------------------------------------------------
+# Per-ticket audit log (replaces the flat system_logs.txt)
+# - Buffered JSONL writes, flushed by size or on a timer
+# - Segment files rotated by size and age (logs/audit/*.log)
+# - SQLite index: ticket_id → (segment, offset, length)
+#   so one ticket's log is a direct seek, not a grep
+# - append() only takes the buffer lock; segment writes and index
+#   commits happen on the flusher thread. Index rows whose commit
+#   failed are kept and retried with the next flush
+# -------------------------------------------------------------
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+
+AUDIT_DIR = os.getenv("ITSM_AUDIT_DIR", os.path.join("logs", "audit"))
+AUDIT_SEGMENT_MAX_BYTES = int(
+    os.getenv("ITSM_AUDIT_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024))
+)
+AUDIT_SEGMENT_MAX_AGE_SEC = float(
+    os.getenv("ITSM_AUDIT_SEGMENT_MAX_AGE_SEC", "86400")
+)
+AUDIT_FLUSH_INTERVAL_SEC = float(os.getenv("ITSM_AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_FLUSH_MAX_RECORDS = int(os.getenv("ITSM_AUDIT_FLUSH_MAX_RECORDS", "256"))
+
+AUDIT_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_index (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id   TEXT NOT NULL,
+    segment     TEXT NOT NULL,
+    offset      INTEGER NOT NULL,
+    length      INTEGER NOT NULL,
+    level       TEXT,
+    logged_at   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_ticket
+    ON audit_index(ticket_id, id);
+"""
+
+
+class AuditLog:
+    def __init__(self, directory: str = AUDIT_DIR,
+                 max_segment_bytes: int = AUDIT_SEGMENT_MAX_BYTES,
+                 max_segment_age: float = AUDIT_SEGMENT_MAX_AGE_SEC,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL_SEC,
+                 flush_max_records: int = AUDIT_FLUSH_MAX_RECORDS):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.flush_interval = flush_interval
+        self.flush_max_records = flush_max_records
+
+        os.makedirs(directory, exist_ok=True)
+        self._index = sqlite3.connect(
+            os.path.join(directory, "index.db"),
+            isolation_level=None, check_same_thread=False,
+        )
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute("PRAGMA synchronous=NORMAL")
+        self._index.executescript(AUDIT_INDEX_SCHEMA)
+
+        # _lock: buffer only (append runs on the event loop)
+        # _write_lock: segment file + index connection
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._buffer: list = []         # [(record, encoded line)]
+        self._unindexed: list = []      # rows on disk, index commit failed
+        self._segment: Optional[str] = None
+        self._segment_file = None
+        self._segment_opened = 0.0
+
+        self.records_written = 0
+        self.flushes = 0
+        self.rotations = 0
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="audit-log-flusher", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ---------------------------------------------------------
+    # Segments
+    # ---------------------------------------------------------
+    def _open_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self.rotations += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self._segment = f"audit-{stamp}.log"
+        self._segment_file = open(
+            os.path.join(self.directory, self._segment), "ab"
+        )
+        self._segment_opened = time.time()
+
+    def _needs_rotation(self, incoming: int) -> bool:
+        if self._segment_file is None:
+            return True
+        size = self._segment_file.tell()
+        if size and size + incoming > self.max_segment_bytes:
+            return True
+        return time.time() - self._segment_opened > self.max_segment_age
+
+    # ---------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------
+    def append(self, ticket_id: str, message: str, level: str = "INFO",
+               **fields) -> dict:
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "ticket_id": ticket_id,
+            "level": level,
+            "message": message,
+            **fields,
+        }
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            self._buffer.append((record, line))
+            full = len(self._buffer) >= self.flush_max_records
+        if full:
+            self._wake.set()  # flushed by the flusher thread
+        return record
+
+    def _write_segment(self, batch: list) -> list:
+        if self._needs_rotation(sum(len(line) for _, line in batch)):
+            self._open_segment()
+
+        # One write per flush; offsets are known before writing
+        offset = self._segment_file.tell()
+        rows = []
+        for record, line in batch:
+            rows.append((record["ticket_id"], self._segment, offset,
+                         len(line), record["level"], record["timestamp"]))
+            offset += len(line)
+        self._segment_file.write(b"".join(line for _, line in batch))
+        self._segment_file.flush()
+        return rows
+
+    def _write_index(self, rows: list):
+        self._index.execute("BEGIN")
+        try:
+            self._index.executemany(
+                "INSERT INTO audit_index"
+                " (ticket_id, segment, offset, length, level, logged_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._index.execute("COMMIT")
+        except Exception:
+            if self._index.in_transaction:
+                self._index.execute("ROLLBACK")
+            raise
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                try:
+                    rows = self._write_segment(batch)
+                except Exception:
+                    with self._lock:
+                        self._buffer[:0] = batch  # retried next flush
+                    raise
+                self._unindexed.extend(rows)
+                self.records_written += len(batch)
+                self.flushes += 1
+
+            # Index only points at bytes that are already on disk
+            if self._unindexed:
+                self._write_index(self._unindexed)
+                self._unindexed = []
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[AUDIT] ⚠ Flush failed: {e}")
+
+    # ---------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------
+    def get_ticket_log(self, ticket_id: str, limit: int = 200) -> list:
+        try:
+            self.flush()  # make buffered records visible
+        except Exception as e:
+            print(f"[AUDIT] ⚠ Flush failed: {e}")
+        index = sqlite3.connect(os.path.join(self.directory, "index.db"))
+        try:
+            rows = index.execute(
+                "SELECT segment, offset, length FROM audit_index"
+                " WHERE ticket_id = ? ORDER BY id DESC LIMIT ?",
+                (ticket_id, limit),
+            ).fetchall()
+        finally:
+            index.close()
+
+        entries = []
+        handles = {}
+        try:
+            for segment, offset, length in reversed(rows):
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = open(
+                        os.path.join(self.directory, segment), "rb"
+                    )
+                f.seek(offset)
+                entries.append(json.loads(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        return entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "segment": self._segment,
+                "buffered": len(self._buffer),
+                "unindexed": len(self._unindexed),
+                "records_written": self.records_written,
+                "flushes": self.flushes,
+                "rotations": self.rotations,
+            }
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            self.flush()
+        finally:
+            with self._write_lock:
+                if self._segment_file is not None:
+                    self._segment_file.close()
+                    self._segment_file = None
+
+
+_audit_log: Optional[AuditLog] = None
+_audit_init_lock = threading.Lock()
+
+
+def get_audit_log() -> AuditLog:
+    # Created on first use so importing tools does not touch the disk
+    global _audit_log
+    if _audit_log is None:
+        with _audit_init_lock:
+            if _audit_log is None:
+                _audit_log = AuditLog()
+    return _audit_log
+
+
+__all__ = [
+    "AuditLog",
+    "get_audit_log",
+]
@@ -5,36 +5,73 @@
 # Debug prints added for full visibility
 # -------------------------------------------------------------
 
-import uuid
-import time
-from datetime import datetime
+import json
+import asyncio
+from datetime import datetime, timezone
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_response import LlmResponse
 from google.adk.tools.function_tool import FunctionTool
 from google.adk.tools.tool_context import ToolContext
+from google.genai import types
 
-from agents.session_tools import save_ticket_for_user
+from agents.projections import load_stage_json
+from agents.storm import storm_coalescer
+from agents.session_tools import save_ticket_for_user, session_user_id
+from agents.user_cache import invalidate_ticket_status
+from tools.ticket_store import ticket_store
+from tools.status_scheduler import status_scheduler
+from tools.sla_engine import CLOSED_STATUSES, sla_engine, track_ticket_sla
+from tools.audit_log import get_audit_log
 
 
 # -------------------------------------------------------------
 # 1. CREATE TICKET (ServiceNow simulation)
 # -------------------------------------------------------------
-def create_ticket(summary: str, priority: str,
-                  description: str,
-                  tool_context: ToolContext | None = None):
+def _classified_category(tool_context: ToolContext | None) -> str | None:
+    # ClassifierAgent output, when the tool runs inside the pipeline
+    if tool_context is None:
+        return None
+    data = load_stage_json(tool_context.state.get("ticket_classification"))
+    return data.get("category") if isinstance(data, dict) else None
+
+
+async def create_ticket(summary: str, priority: str,
+                        description: str,
+                        category: str | None = None,
+                        tool_context: ToolContext | None = None):
+
+    category = category or _classified_category(tool_context)
 
     print("\n[TOOL:create_ticket] Called")
     print("Summary:", summary)
     print("Priority:", priority)
+    print("Category:", category)
     print("Description:", description)
 
-    ticket_id = f"INC{uuid.uuid4().hex[:7].upper()}"
+    ticket = await ticket_store.create_ticket(
+        summary=summary,
+        priority=priority,
+        description=description,
+        user_id=session_user_id(tool_context),
+        category=category,
+    )
+    ticket_id = ticket["ticket_id"]
+    sla = track_ticket_sla(
+        ticket_id, priority,
+        datetime.fromisoformat(ticket["created_at"]),
+    )
 
     response = {
         "status": "success",
         "data": {
             "ticket_id": ticket_id,
-            "category": summary,
+            "category": ticket["category"],
             "priority": priority,
             "description": description,
+            "ticket_status": ticket["status"],
+            "created_at": ticket["created_at"],
+            "response_due": sla["response_due"],
+            "resolution_due": sla["resolution_due"],
             "system": "ServiceNow (simulated)",
         },
     }
@@ -43,7 +80,7 @@ def create_ticket(summary: str, priority: str,
     if tool_context:
         print("[TOOL:create_ticket] Saving ticket to session history...")
         try:
-            save_ticket_for_user(
+            await save_ticket_for_user(
                 ticket_id=ticket_id,
                 summary=summary,
                 status="Open",
@@ -57,21 +94,87 @@ def create_ticket(summary: str, priority: str,
     return response
 
 
+# -------------------------------------------------------------
+# 1b. Pipeline hook: after_model_callback on ServiceNowCreatorAgent
+# The model drafts the ticket; the store assigns the real INC id, so
+# ticket_creation_result (and SLA / storm / usage) use a stored ticket
+# -------------------------------------------------------------
+async def persist_created_ticket(callback_context: CallbackContext,
+                                 llm_response: LlmResponse):
+    if llm_response.partial or not llm_response.content:
+        return None
+    text = "".join(p.text for p in llm_response.content.parts or []
+                   if getattr(p, "text", None))
+    if not text:
+        return None
+
+    state = callback_context.state
+    draft = load_stage_json(text)
+    if not isinstance(draft, dict):
+        draft = {"human_message": text}
+    intake = load_stage_json(state.get("ticket_intake"))
+    intake = intake if isinstance(intake, dict) else {}
+    classification = load_stage_json(state.get("ticket_classification"))
+    classification = classification if isinstance(classification, dict) else {}
+
+    priority = classification.get("priority") or draft.get("priority") or "P3"
+    category = classification.get("category") or draft.get("category")
+    ticket = await ticket_store.create_ticket(
+        summary=intake.get("issue_summary") or "ITSM incident",
+        priority=priority,
+        description=intake.get("full_description") or "",
+        user_id=session_user_id(callback_context),
+        category=category,
+    )
+    ticket_id = ticket["ticket_id"]
+
+    human_message = draft.get("human_message")
+    if isinstance(human_message, str) and draft.get("ticket_id"):
+        human_message = human_message.replace(str(draft["ticket_id"]), ticket_id)
+    result = {
+        **draft,
+        "ticket_id": ticket_id,
+        "category": category,
+        "priority": priority,
+        "ticket_status": ticket["status"],
+        "created_at": ticket["created_at"],
+        "human_message": human_message,
+    }
+    print("[SERVICENOW] Stored ticket →", ticket_id)
+
+    llm_response.content = types.Content(
+        role="model", parts=[types.Part(text=json.dumps(result))]
+    )
+    return llm_response
+
+
 # -------------------------------------------------------------
 # 2. UPDATE TICKET STATUS
 # -------------------------------------------------------------
-def update_ticket_status(ticket_id: str, new_status: str,
-                         tool_context: ToolContext | None = None):
+async def update_ticket_status(ticket_id: str, new_status: str,
+                               resolution: str | None = None,
+                               tool_context: ToolContext | None = None):
 
     print("\n[TOOL:update_ticket_status] Called")
     print("Ticket:", ticket_id, "->", new_status)
 
+    update = await ticket_store.update_status(ticket_id, new_status, resolution)
+    if update is None:
+        return {"status": "error",
+                "error_message": f"Ticket {ticket_id} not found."}
+    invalidate_ticket_status()
+    sla_engine.on_status_change(ticket_id, new_status)
+    if new_status.lower() in CLOSED_STATUSES:
+        storm_coalescer.close_incident(ticket_id)
+
     return {
         "status": "success",
         "data": {
             "ticket_id": ticket_id,
+            "previous_status": update["old_status"],
             "updated_status": new_status,
-            "timestamp": datetime.utcnow().isoformat(),
+            "resolution": resolution,
+            "timestamp": update["updated_at"],
         },
     }
 
@@ -79,20 +182,121 @@ def update_ticket_status(ticket_id: str, new_status: str,
 # -------------------------------------------------------------
 # 3. CHECK STATUS
 # -------------------------------------------------------------
-def check_ticket_status(ticket_id: str,
-                        tool_context: ToolContext | None = None):
+async def check_ticket_status(ticket_id: str,
+                              tool_context: ToolContext | None = None):
 
     print("\n[TOOL:check_ticket_status] Checking status for:", ticket_id)
 
+    ticket = await ticket_store.get_ticket(ticket_id)
+    if ticket is None:
+        return {"status": "error",
+                "error_message": f"Ticket {ticket_id} not found."}
+
     return {
         "status": "success",
         "data": {
             "ticket_id": ticket_id,
-            "current_status": "In Progress",
+            "current_status": ticket["status"],
+            "priority": ticket["priority"],
+            "summary": ticket["summary"],
+            "updated_at": ticket["updated_at"],
+            "history": await ticket_store.get_history(ticket_id),
         },
     }
 
 
+# -------------------------------------------------------------
+# 3b. BATCH STATUS CHECK (one query for many tickets)
+# -------------------------------------------------------------
+async def check_ticket_statuses(ticket_ids: list[str],
+                                tool_context: ToolContext | None = None):
+
+    print("\n[TOOL:check_ticket_statuses] Checking", len(ticket_ids), "tickets")
+
+    found = await ticket_store.get_tickets(ticket_ids)
+
+    return {
+        "status": "success",
+        "data": {
+            "tickets": [
+                {
+                    "ticket_id": t["ticket_id"],
+                    "current_status": t["status"],
+                    "priority": t["priority"],
+                    "summary": t["summary"],
+                    "updated_at": t["updated_at"],
+                }
+                for t in found.values()
+            ],
+            "missing": [t for t in ticket_ids if t not in found],
+            "count": len(found),
+        },
+    }
+
+
+# -------------------------------------------------------------
+# 3c. BULK STATUS UPDATE (one transaction)
+# -------------------------------------------------------------
+async def bulk_update_ticket_status(updates: list[dict],
+                                    tool_context: ToolContext | None = None):
+    """
+    updates: [{"ticket_id": "INC...", "new_status": "Resolved"}, ...]
+    """
+    print("\n[TOOL:bulk_update_ticket_status] Updating", len(updates), "tickets")
+
+    pairs = []
+    for item in updates:
+        if not item.get("ticket_id") or not item.get("new_status"):
+            return {"status": "error",
+                    "error_message": "Each update needs ticket_id and new_status."}
+        pairs.append((item["ticket_id"], item["new_status"]))
+
+    result = await ticket_store.bulk_update_status(pairs)
+    if result["updated"]:
+        invalidate_ticket_status()
+    for item in result["updated"]:
+        sla_engine.on_status_change(item["ticket_id"], item["new_status"])
+        if item["new_status"].lower() in CLOSED_STATUSES:
+            storm_coalescer.close_incident(item["ticket_id"])
+
+    return {
+        "status": "success",
+        "data": {
+            "updated": result["updated"],
+            "missing": result["missing"],
+            "updated_count": len(result["updated"]),
+            "timestamp": result["updated_at"],
+        },
+    }
+
+
+# -------------------------------------------------------------
+# 3d. TICKET HISTORY SEARCH (FTS5, ranked)
+# -------------------------------------------------------------
+async def search_ticket_history(query: str,
+                                user_id: str | None = None,
+                                category: str | None = None,
+                                date_from: str | None = None,
+                                date_to: str | None = None,
+                                limit: int = 10,
+                                tool_context: ToolContext | None = None):
+    """
+    Finds prior incidents matching free text. Dates are ISO-8601
+    (e.g. "2025-01-31"); user_id / category narrow the search.
+    """
+    print("\n[TOOL:search_ticket_history] Query:", query)
+
+    results = await ticket_store.search_tickets(
+        query, user_id=user_id, category=category,
+        date_from=date_from, date_to=date_to, limit=limit,
+    )
+
+    return {
+        "status": "success",
+        "data": {"query": query, "results": results, "count": len(results)},
+    }
+
+
 # -------------------------------------------------------------
 # 4. EXIT LOOP TOOL
 # -------------------------------------------------------------
@@ -102,39 +306,86 @@ def exit_loop(tool_context: ToolContext | None = None):
 
 
 # -------------------------------------------------------------
-# 5. SAVE LOG TOOL
+# 5. SAVE LOG TOOL (indexed audit log)
 # -------------------------------------------------------------
 def save_log(ticket_id: str, message: str, level: str = "INFO",
              tool_context: ToolContext | None = None):
 
     print("\n[TOOL:save_log] Log:", ticket_id, message)
 
-    line = f"{datetime.utcnow().isoformat()} | {ticket_id} | {level} | {message}\n"
-    with open("system_logs.txt", "a", encoding="utf-8") as f:
-        f.write(line)
+    record = get_audit_log().append(
+        ticket_id, message, level, user_id=session_user_id(tool_context),
+    )
 
-    return {"status": "success", "data": {"message": "Log saved"}}
+    return {"status": "success",
+            "data": {"message": "Log saved", "timestamp": record["timestamp"]}}
+
+
+async def get_ticket_log(ticket_id: str, limit: int = 200,
+                         tool_context: ToolContext | None = None):
+
+    print("\n[TOOL:get_ticket_log] Reading audit log for:", ticket_id)
+
+    entries = await asyncio.to_thread(
+        get_audit_log().get_ticket_log, ticket_id, limit
+    )
+    return {
+        "status": "success",
+        "data": {"ticket_id": ticket_id, "entries": entries,
+                 "count": len(entries)},
+    }
 
 
 # -------------------------------------------------------------
 # 6. SCHEDULE STATUS CHECK
 # -------------------------------------------------------------
-def schedule_status_check(ticket_id: str, delay_seconds: int,
-                          tool_context: ToolContext | None = None):
+async def schedule_status_check(ticket_id: str, delay_seconds: int,
+                                tool_context: ToolContext | None = None):
 
     print("\n[TOOL:schedule_status_check] Scheduled:", ticket_id, delay_seconds)
-    time.sleep(0.01)
+
+    timer = await status_scheduler.schedule(ticket_id, delay_seconds)
 
     return {
         "status": "success",
         "data": {
             "ticket_id": ticket_id,
             "delay_seconds": delay_seconds,
+            "due_at": datetime.fromtimestamp(
+                timer["due_at"], timezone.utc
+            ).isoformat(),
+            "coalesced": timer["coalesced"],
             "scheduled": True,
         },
     }
 
 
+async def cancel_status_check(ticket_id: str,
+                              tool_context: ToolContext | None = None):
+
+    print("\n[TOOL:cancel_status_check] Cancel:", ticket_id)
+
+    cancelled = await status_scheduler.cancel(ticket_id)
+    return {
+        "status": "success",
+        "data": {"ticket_id": ticket_id, "cancelled": cancelled},
+    }
+
+
+async def list_status_checks(limit: int = 20,
+                             tool_context: ToolContext | None = None):
+
+    print("\n[TOOL:list_status_checks] Listing pending checks")
+
+    return {
+        "status": "success",
+        "data": {
+            "pending": await status_scheduler.list_pending(limit),
+            "stats": status_scheduler.stats(),
+        },
+    }
+
+
 # -------------------------------------------------------------
 # 7. VECTOR SEARCH WRAPPER (placeholder)
 # -------------------------------------------------------------
@@ -170,20 +421,33 @@ def request_human_approval(action: str, reason: str,
 create_ticket_tool = FunctionTool(create_ticket)
 update_ticket_status_tool = FunctionTool(update_ticket_status)
 check_ticket_status_tool = FunctionTool(check_ticket_status)
+check_ticket_statuses_tool = FunctionTool(check_ticket_statuses)
+bulk_update_ticket_status_tool = FunctionTool(bulk_update_ticket_status)
+search_ticket_history_tool = FunctionTool(search_ticket_history)
 exit_loop_tool = FunctionTool(exit_loop)
 save_log_tool = FunctionTool(save_log)
+get_ticket_log_tool = FunctionTool(get_ticket_log)
 schedule_status_check_tool = FunctionTool(schedule_status_check)
+cancel_status_check_tool = FunctionTool(cancel_status_check)
+list_status_checks_tool = FunctionTool(list_status_checks)
 vector_search_tool = FunctionTool(vector_search)
 request_approval_tool = FunctionTool(request_human_approval)
 
 
 __all__ = [
     "create_ticket_tool",
+    "persist_created_ticket",
     "update_ticket_status_tool",
     "check_ticket_status_tool",
+    "check_ticket_statuses_tool",
+    "bulk_update_ticket_status_tool",
+    "search_ticket_history_tool",
     "exit_loop_tool",
     "save_log_tool",
+    "get_ticket_log_tool",
     "schedule_status_check_tool",
+    "cancel_status_check_tool",
+    "list_status_checks_tool",
     "vector_search_tool",
     "request_approval_tool",
 ]
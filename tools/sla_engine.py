@@ -0,0 +1,369 @@
+# tools/sla_engine.py
+# -------------------------------------------------------------
+# SLA timer engine for open incidents
+# - Response / resolution targets per priority (P1–P4)
+# - Business calendar (work days, hours, holidays, timezone)
+# - Deadline-ordered heaps: "what breaches next" is a heap peek,
+#   each tick only pops due entries (no scan over all tickets)
+# - Breach warnings / breaches go to the observability stream
+# - On start the heaps are rebuilt from open tickets in the ticket
+#   store; due tickets are re-checked there before a warning / breach,
+#   so a ticket resolved through another worker never breaches here
+# -------------------------------------------------------------
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from google.adk.agents.callback_context import CallbackContext
+
+from agents.projections import load_stage_json
+from plugins.observability_plugin import log_sla_event
+from tools.ticket_store import ticket_store
+
+
+SLA_TIMEZONE = os.getenv("ITSM_SLA_TZ", "UTC")
+SLA_WARN_FRACTION = float(os.getenv("ITSM_SLA_WARN_FRACTION", "0.8"))
+
+RESPONDED_STATUSES = {"in progress", "acknowledged", "assigned"}
+CLOSED_STATUSES = {"resolved", "closed", "cancelled"}
+
+
+# -------------------------------------------------------------
+# Policy: priority → (response, resolution, business_hours_only)
+# -------------------------------------------------------------
+SLA_POLICY = {
+    "P1": (timedelta(minutes=15), timedelta(hours=4), False),
+    "P2": (timedelta(hours=1), timedelta(hours=8), False),
+    "P3": (timedelta(hours=4), timedelta(hours=24), True),
+    "P4": (timedelta(hours=8), timedelta(hours=72), True),
+}
+
+
+# -------------------------------------------------------------
+# Business calendar
+# -------------------------------------------------------------
+class BusinessCalendar:
+    def __init__(self, tz: str = SLA_TIMEZONE,
+                 workdays=(0, 1, 2, 3, 4),
+                 start: dtime = dtime(9, 0),
+                 end: dtime = dtime(17, 0),
+                 holidays: Optional[set] = None):
+        self.tz = ZoneInfo(tz)
+        self.workdays = set(workdays)
+        self.start = start
+        self.end = end
+        self.holidays: set = holidays or set()
+
+    def _is_workday(self, d: date) -> bool:
+        return d.weekday() in self.workdays and d not in self.holidays
+
+    def _open_close(self, d: date):
+        return (datetime.combine(d, self.start, self.tz),
+                datetime.combine(d, self.end, self.tz))
+
+    def add_business_time(self, start: datetime, duration: timedelta) -> datetime:
+        current = start.astimezone(self.tz)
+        remaining = duration
+        for _ in range(3660):  # hard stop: ~10 years of days
+            d = current.date()
+            if self._is_workday(d):
+                opens, closes = self._open_close(d)
+                if current < opens:
+                    current = opens
+                if current < closes:
+                    available = closes - current
+                    if remaining <= available:
+                        return (current + remaining).astimezone(timezone.utc)
+                    remaining -= available
+            current = datetime.combine(d + timedelta(days=1), dtime(0), self.tz)
+        raise ValueError("Business calendar has no working hours")
+
+
+# -------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------
+class SLAEngine:
+    def __init__(self, calendar: Optional[BusinessCalendar] = None,
+                 policy: Optional[dict] = None,
+                 warn_fraction: float = SLA_WARN_FRACTION):
+        self.calendar = calendar or BusinessCalendar()
+        self.policy = policy or SLA_POLICY
+        self.warn_fraction = warn_fraction
+
+        # ticket_id → {"priority", "opened_at", "response_due", ...}
+        self.tickets: Dict[str, dict] = {}
+        # (ticket_id, kind) → live deadline; heap entries not matching
+        # are stale and dropped lazily
+        self._live: Dict[tuple, float] = {}
+        self._deadlines: List[tuple] = []   # (due_ts, ticket_id, kind)
+        self._warnings: List[tuple] = []    # (warn_ts, due_ts, ticket_id, kind)
+
+        self.listeners: List[Callable[[dict], None]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.warnings_emitted = 0
+        self.breaches_emitted = 0
+
+    # ---------------------------------------------------------
+    # Deadlines
+    # ---------------------------------------------------------
+    def compute_deadlines(self, priority: str, opened_at: datetime) -> dict:
+        response, resolution, business_only = self.policy.get(
+            priority, self.policy["P3"]
+        )
+        if business_only:
+            response_due = self.calendar.add_business_time(opened_at, response)
+            resolution_due = self.calendar.add_business_time(
+                opened_at, resolution
+            )
+        else:
+            response_due = opened_at + response
+            resolution_due = opened_at + resolution
+        return {"response": response_due, "resolution": resolution_due}
+
+    def _push(self, ticket_id: str, kind: str, opened_ts: float, due_ts: float):
+        self._live[(ticket_id, kind)] = due_ts
+        heapq.heappush(self._deadlines, (due_ts, ticket_id, kind))
+        warn_ts = opened_ts + (due_ts - opened_ts) * self.warn_fraction
+        heapq.heappush(self._warnings, (warn_ts, due_ts, ticket_id, kind))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def track(self, ticket_id: str, priority: str,
+              opened_at: Optional[datetime] = None,
+              skip_past: bool = False) -> dict:
+        # skip_past: reloaded tickets do not re-fire deadlines that went
+        # by before this process started
+        opened_at = opened_at or datetime.now(timezone.utc)
+        deadlines = self.compute_deadlines(priority, opened_at)
+        self.tickets[ticket_id] = {
+            "priority": priority,
+            "opened_at": opened_at.isoformat(),
+            "response_due": deadlines["response"].isoformat(),
+            "resolution_due": deadlines["resolution"].isoformat(),
+        }
+        opened_ts = opened_at.timestamp()
+        now = time.time()
+        for kind, due in deadlines.items():
+            if skip_past and due.timestamp() <= now:
+                continue
+            self._push(ticket_id, kind, opened_ts, due.timestamp())
+        return self.tickets[ticket_id]
+
+    def mark_responded(self, ticket_id: str):
+        self._live.pop((ticket_id, "response"), None)
+
+    def resolve(self, ticket_id: str):
+        self._live.pop((ticket_id, "response"), None)
+        self._live.pop((ticket_id, "resolution"), None)
+        self.tickets.pop(ticket_id, None)
+
+    def on_status_change(self, ticket_id: str, new_status: str):
+        status = (new_status or "").lower()
+        if status in CLOSED_STATUSES:
+            self.resolve(ticket_id)
+        elif status in RESPONDED_STATUSES:
+            self.mark_responded(ticket_id)
+
+    def _is_live(self, ticket_id: str, kind: str, due_ts: float) -> bool:
+        return self._live.get((ticket_id, kind)) == due_ts
+
+    def next_breach(self) -> Optional[dict]:
+        # Amortized O(log n): only stale heads are popped
+        while self._deadlines:
+            due_ts, ticket_id, kind = self._deadlines[0]
+            if self._is_live(ticket_id, kind, due_ts):
+                return {
+                    "ticket_id": ticket_id,
+                    "kind": kind,
+                    "due_at": datetime.fromtimestamp(
+                        due_ts, timezone.utc).isoformat(),
+                    "due_in_sec": round(due_ts - time.time(), 1),
+                    "priority": self.tickets.get(ticket_id, {}).get("priority"),
+                }
+            heapq.heappop(self._deadlines)
+        return None
+
+    # ---------------------------------------------------------
+    # Tick: pop only what is due
+    # ---------------------------------------------------------
+    def tick(self, now: Optional[float] = None) -> list:
+        now = time.time() if now is None else now
+        events = []
+
+        while self._warnings and self._warnings[0][0] <= now:
+            _, due_ts, ticket_id, kind = heapq.heappop(self._warnings)
+            if self._is_live(ticket_id, kind, due_ts) and due_ts > now:
+                events.append(self._emit("sla_warning", ticket_id, kind, due_ts))
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            due_ts, ticket_id, kind = heapq.heappop(self._deadlines)
+            if self._is_live(ticket_id, kind, due_ts):
+                del self._live[(ticket_id, kind)]
+                events.append(self._emit("sla_breach", ticket_id, kind, due_ts))
+
+        return events
+
+    def _emit(self, event_type: str, ticket_id: str, kind: str,
+              due_ts: float) -> dict:
+        event = {
+            "event": event_type,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "ticket_id": ticket_id,
+            "sla": kind,
+            "priority": self.tickets.get(ticket_id, {}).get("priority"),
+            "due_at": datetime.fromtimestamp(due_ts, timezone.utc).isoformat(),
+        }
+        if event_type == "sla_breach":
+            self.breaches_emitted += 1
+        else:
+            self.warnings_emitted += 1
+
+        log_sla_event(event)
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logging.warning("[SLA] listener failed: %s", e)
+        return event
+
+    # ---------------------------------------------------------
+    # Ticket store: reload on start, re-check before firing
+    # ---------------------------------------------------------
+    async def reload(self) -> int:
+        loaded = 0
+        for ticket in await ticket_store.list_open_tickets(CLOSED_STATUSES):
+            if ticket["ticket_id"] in self.tickets:
+                continue
+            self.track(ticket["ticket_id"], ticket["priority"] or "P3",
+                       datetime.fromisoformat(ticket["created_at"]),
+                       skip_past=True)
+            self.on_status_change(ticket["ticket_id"], ticket["status"])
+            loaded += 1
+        return loaded
+
+    def _due_tickets(self, now: float) -> set:
+        # Heap entries due by `now` form a subtree at the root: O(due)
+        ids = set()
+        for heap, pos in ((self._warnings, 2), (self._deadlines, 1)):
+            stack = [0]
+            while stack:
+                i = stack.pop()
+                if i < len(heap) and heap[i][0] <= now:
+                    ids.add(heap[i][pos])
+                    stack += [2 * i + 1, 2 * i + 2]
+        return {t for t in ids if t in self.tickets}
+
+    async def _sync_due(self, now: float):
+        due = self._due_tickets(now)
+        if not due:
+            return
+        try:
+            found = await ticket_store.get_tickets(list(due))
+        except Exception as e:
+            print(f"[SLA] ⚠ Could not re-check ticket status: {e}")
+            return
+        for ticket_id, ticket in found.items():
+            self.on_status_change(ticket_id, ticket["status"])
+
+    # ---------------------------------------------------------
+    # Background loop
+    # ---------------------------------------------------------
+    def _next_wakeup(self) -> Optional[float]:
+        heads = []
+        if self._warnings:
+            heads.append(self._warnings[0][0])
+        if self._deadlines:
+            heads.append(self._deadlines[0][0])
+        return min(heads) if heads else None
+
+    async def _run(self):
+        try:
+            loaded = await self.reload()
+            if loaded:
+                print(f"[SLA] Reloaded {loaded} open tickets")
+        except Exception as e:
+            print(f"[SLA] ⚠ Could not reload open tickets: {e}")
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            await self._sync_due(now)
+            self.tick(now)
+            next_ts = self._next_wakeup()
+            timeout = max(0.0, next_ts - time.time()) if next_ts else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "open_tickets": len(self.tickets),
+            "live_timers": len(self._live),
+            "warnings_emitted": self.warnings_emitted,
+            "breaches_emitted": self.breaches_emitted,
+            "next_breach": self.next_breach(),
+        }
+
+
+sla_engine = SLAEngine()
+
+
+def track_ticket_sla(ticket_id: str, priority: str,
+                     opened_at: Optional[datetime] = None) -> dict:
+    # Starts the timer loop lazily when called from async code
+    try:
+        asyncio.get_running_loop()
+        sla_engine.start()
+    except RuntimeError:
+        pass
+    return sla_engine.track(ticket_id, priority, opened_at)
+
+
+# -------------------------------------------------------------
+# Pipeline hook: after_agent_callback on ServiceNowCreatorAgent
+# -------------------------------------------------------------
+def start_sla_for_created_ticket(callback_context: CallbackContext):
+    if callback_context.state.get("storm_parent_ticket_id"):
+        return None  # coalesced child: master already carries the SLA
+    result = load_stage_json(callback_context.state.get("ticket_creation_result"))
+    if not isinstance(result, dict) or not result.get("ticket_id"):
+        return None
+
+    sla = track_ticket_sla(result["ticket_id"], result.get("priority") or "P3")
+    callback_context.state["ticket_sla"] = sla
+    print(f"[SLA] Tracking {result['ticket_id']} → "
+          f"resolution due {sla['resolution_due']}")
+    return None
+
+
+__all__ = [
+    "SLA_POLICY",
+    "BusinessCalendar",
+    "SLAEngine",
+    "sla_engine",
+    "track_ticket_sla",
+    "start_sla_for_created_ticket",
+]
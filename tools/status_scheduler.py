@@ -0,0 +1,309 @@
+# tools/status_scheduler.py
+# -------------------------------------------------------------
+# Persistent asyncio scheduler for ticket status checks
+# - Min-heap of due times in memory, mirrored in SQLite so timers
+#   survive restarts (reloaded on start)
+# - One pending check per ticket: re-scheduling coalesces to the
+#   earliest due time
+# - Fires due checks concurrently (bounded), never blocks the loop
+# - Several processes can share the table: a due row is claimed with
+#   a conditional UPDATE, so exactly one process fires it; the table
+#   is re-read every ITSM_SCHEDULER_SYNC_SEC for timers scheduled by
+#   other (or dead) processes
+# - cancel / list APIs
+# -------------------------------------------------------------
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from tools.ticket_store import SQLitePool, TICKET_DB_PATH, ticket_store
+
+
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("ITSM_SCHEDULER_CONCURRENCY", "50"))
+SCHEDULER_SYNC_SEC = float(os.getenv("ITSM_SCHEDULER_SYNC_SEC", "30"))
+# A claimed check whose process died is released after this long
+SCHEDULER_CLAIM_TIMEOUT_SEC = float(
+    os.getenv("ITSM_SCHEDULER_CLAIM_TIMEOUT_SEC", "300")
+)
+SCHEDULER_ERROR_BACKOFF_SEC = 1.0
+
+SCHEDULER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_status_checks (
+    ticket_id   TEXT PRIMARY KEY,
+    due_at      REAL NOT NULL,
+    created_at  REAL NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    claimed_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_due
+    ON scheduled_status_checks(due_at);
+"""
+
+
+async def migrate_scheduler_db(conn):
+    # Tables created before status / claimed_at existed
+    cur = await conn.execute("PRAGMA table_info(scheduled_status_checks)")
+    columns = {row["name"] for row in await cur.fetchall()}
+    if "status" not in columns:
+        await conn.execute(
+            "ALTER TABLE scheduled_status_checks"
+            " ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'"
+        )
+    if "claimed_at" not in columns:
+        await conn.execute(
+            "ALTER TABLE scheduled_status_checks ADD COLUMN claimed_at REAL"
+        )
+
+
+async def default_status_check(ticket_id: str) -> dict:
+    ticket = await ticket_store.get_ticket(ticket_id)
+    status = ticket["status"] if ticket else "NOT_FOUND"
+    print(f"[SCHEDULER] Status check fired: {ticket_id} → {status}")
+    logging.info("[SCHEDULER] status_check ticket=%s status=%s",
+                 ticket_id, status)
+    return {"ticket_id": ticket_id, "status": status}
+
+
+class StatusCheckScheduler:
+    def __init__(self, path: str = TICKET_DB_PATH,
+                 on_fire: Callable[[str], Awaitable] = default_status_check,
+                 max_concurrency: int = SCHEDULER_MAX_CONCURRENCY):
+        self.pool = SQLitePool(path, 2, SCHEDULER_SCHEMA, migrate_scheduler_db)
+        self.on_fire = on_fire
+        self.max_concurrency = max_concurrency
+
+        self._heap: List[tuple] = []          # (due_at, ticket_id)
+        self._due: Dict[str, float] = {}      # ticket_id → live due_at
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._start_lock = asyncio.Lock()
+        self._next_sync = 0.0
+
+        self.fired = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.lost_claims = 0
+        self.loop_errors = 0
+
+    # ---------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------
+    async def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        async with self._start_lock:
+            if self._task is not None and not self._task.done():
+                return
+            self._wakeup = asyncio.Event()
+            await self._sync()
+            print(f"[SCHEDULER] Started with {len(self._due)} pending checks")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    async def schedule(self, ticket_id: str, delay_seconds: float) -> dict:
+        await self.start()
+        due_at = time.time() + max(0.0, float(delay_seconds))
+
+        current = self._due.get(ticket_id)
+        if current is not None and current <= due_at:
+            # Already checking this ticket sooner → coalesce
+            self.coalesced += 1
+            return {"ticket_id": ticket_id, "due_at": current,
+                    "coalesced": True}
+
+        async with self.pool.transaction() as conn:
+            # A row being fired elsewhere is re-armed with the new time;
+            # a pending one (maybe from another process) keeps the earliest
+            cur = await conn.execute(
+                "INSERT INTO scheduled_status_checks"
+                " (ticket_id, due_at, created_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(ticket_id) DO UPDATE SET"
+                " due_at = CASE WHEN status = 'pending'"
+                "   THEN MIN(due_at, excluded.due_at)"
+                "   ELSE excluded.due_at END,"
+                " status = 'pending', claimed_at = NULL"
+                " RETURNING due_at",
+                (ticket_id, due_at, time.time()),
+            )
+            due_at = (await cur.fetchone())["due_at"]
+        if current is not None:
+            self.coalesced += 1
+
+        self._due[ticket_id] = due_at
+        heapq.heappush(self._heap, (due_at, ticket_id))
+        if self._heap[0][1] == ticket_id:
+            self._wakeup.set()  # new earliest deadline
+        return {"ticket_id": ticket_id, "due_at": due_at,
+                "coalesced": current is not None}
+
+    async def cancel(self, ticket_id: str) -> bool:
+        await self.start()
+        # Heap entry is dropped lazily when it surfaces
+        known = self._due.pop(ticket_id, None) is not None
+        # The row may belong to another process: delete it in the DB too
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "DELETE FROM scheduled_status_checks"
+                " WHERE ticket_id = ? AND status = 'pending'",
+                (ticket_id,),
+            )
+        return known or cur.rowcount > 0
+
+    async def list_pending(self, limit: int = 100) -> list:
+        await self.start()
+        now = time.time()
+        pending = heapq.nsmallest(
+            limit, ((due, t) for t, due in self._due.items())
+        )
+        return [
+            {"ticket_id": t, "due_at": due,
+             "due_in_sec": round(max(0.0, due - now), 3)}
+            for due, t in pending
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._due),
+            "fired": self.fired,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "lost_claims": self.lost_claims,
+            "loop_errors": self.loop_errors,
+        }
+
+    # ---------------------------------------------------------
+    # Timer loop
+    # ---------------------------------------------------------
+    async def _sync(self):
+        # Release claims of dead processes, then merge pending rows
+        now = time.time()
+        async with self.pool.transaction() as conn:
+            await conn.execute(
+                "UPDATE scheduled_status_checks"
+                " SET status = 'pending', claimed_at = NULL"
+                " WHERE status = 'firing' AND claimed_at < ?",
+                (now - SCHEDULER_CLAIM_TIMEOUT_SEC,),
+            )
+            cur = await conn.execute(
+                "SELECT ticket_id, due_at FROM scheduled_status_checks"
+                " WHERE status = 'pending'"
+            )
+            rows = await cur.fetchall()
+        for row in rows:
+            ticket_id, due_at = row["ticket_id"], row["due_at"]
+            if self._due.get(ticket_id) != due_at:
+                self._due[ticket_id] = due_at
+                heapq.heappush(self._heap, (due_at, ticket_id))
+        self._next_sync = now + SCHEDULER_SYNC_SEC
+
+    async def _claim(self, batch: list) -> list:
+        # Only the process whose UPDATE matches fires the check
+        claimed = []
+        async with self.pool.transaction() as conn:
+            for ticket_id, due_at in batch:
+                cur = await conn.execute(
+                    "UPDATE scheduled_status_checks"
+                    " SET status = 'firing', claimed_at = ?"
+                    " WHERE ticket_id = ? AND due_at = ? AND status = 'pending'",
+                    (time.time(), ticket_id, due_at),
+                )
+                if cur.rowcount == 1:
+                    claimed.append((ticket_id, due_at))
+        self.lost_claims += len(batch) - len(claimed)
+        return claimed
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, ticket_id = heapq.heappop(self._heap)
+            if self._due.get(ticket_id) == due_at:  # skip stale entries
+                del self._due[ticket_id]
+                due.append((ticket_id, due_at))
+        return due
+
+    async def _fire(self, ticket_id: str, due_at: float,
+                    sem: asyncio.Semaphore):
+        async with sem:
+            try:
+                await self.on_fire(ticket_id)
+                self.fired += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[SCHEDULER] ⚠ Check failed for {ticket_id}: {e}")
+            try:
+                async with self.pool.transaction() as conn:
+                    # Kept if it was re-scheduled while firing
+                    await conn.execute(
+                        "DELETE FROM scheduled_status_checks"
+                        " WHERE ticket_id = ? AND due_at = ?"
+                        " AND status = 'firing'",
+                        (ticket_id, due_at),
+                    )
+            except Exception as e:
+                # Released by the claim timeout and fired once more
+                print(f"[SCHEDULER] ⚠ Could not clear {ticket_id}: {e}")
+
+    async def _run(self):
+        sem = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            try:
+                self._wakeup.clear()
+                now = time.time()
+                if now >= self._next_sync:
+                    await self._sync()
+                batch = self._pop_due(now)
+
+                if batch:
+                    # Fire without waiting so later deadlines are not delayed
+                    for ticket_id, due_at in await self._claim(batch):
+                        task = asyncio.create_task(
+                            self._fire(ticket_id, due_at, sem)
+                        )
+                        self._inflight.add(task)
+                        task.add_done_callback(self._inflight.discard)
+                    continue
+
+                wake_at = self._next_sync
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(),
+                                           max(0.0, wake_at - now))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Popped timers are still pending in the DB: the forced
+                # re-sync puts them back on the heap
+                self.loop_errors += 1
+                self._next_sync = 0.0
+                print(f"[SCHEDULER] ⚠ Timer loop error: {e}")
+                logging.exception("[SCHEDULER] timer loop error")
+                await asyncio.sleep(SCHEDULER_ERROR_BACKOFF_SEC)
+
+
+status_scheduler = StatusCheckScheduler()
+
+
+__all__ = [
+    "StatusCheckScheduler",
+    "status_scheduler",
+    "default_status_check",
+]
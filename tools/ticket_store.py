@@ -0,0 +1,534 @@
+# tools/ticket_store.py
+# -------------------------------------------------------------
+# Local SQLite ticket store (ServiceNow simulation backend)
+# - WAL mode + busy timeout for concurrent readers / writers
+# - Small async connection pool (aiosqlite)
+# - Indexes on ticket_id (PK), user, status, created_at
+# - Status history table
+# - Collision-free, time-sortable ticket IDs
+# - FTS5 index over summary / description / resolution
+# - Append-only per-user ticket history (keyset pagination)
+# -------------------------------------------------------------
+
+import os
+import re
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+import aiosqlite
+
+
+TICKET_DB_PATH = os.getenv("ITSM_TICKET_DB", "itsm_tickets.db")
+TICKET_POOL_SIZE = int(os.getenv("ITSM_TICKET_POOL_SIZE", "4"))
+BUSY_TIMEOUT_MS = 5000
+MAX_BATCH_PARAMS = 500
+
+
+def utcnow() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# -------------------------------------------------------------
+# Ticket IDs: INC + 10 chars of ms timestamp + 6 chars monotonic
+# random (Crockford base32). Lexicographic order == creation order.
+# -------------------------------------------------------------
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_id_lock = threading.Lock()
+_last_ms = 0
+_last_rand = 0
+
+
+def _b32(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_ticket_id(prefix: str = "INC") -> str:
+    global _last_ms, _last_rand
+    with _id_lock:
+        now_ms = int(time.time() * 1000)
+        if now_ms <= _last_ms:
+            # Same millisecond (or clock went back) → bump the random part
+            now_ms = _last_ms
+            _last_rand += 1
+        else:
+            _last_ms = now_ms
+            _last_rand = random.getrandbits(29)  # headroom for increments
+        return f"{prefix}{_b32(now_ms, 10)}{_b32(_last_rand, 6)}"
+
+
+# -------------------------------------------------------------
+# Async connection pool
+# -------------------------------------------------------------
+class SQLitePool:
+    def __init__(self, path: str, size: int = TICKET_POOL_SIZE,
+                 schema: str = "",
+                 migrate: Optional[Callable[[aiosqlite.Connection],
+                                            Awaitable]] = None):
+        self.path = path
+        self.size = size
+        self.schema = schema
+        self.migrate = migrate
+        self._pool: Optional[asyncio.Queue] = None
+        self._init_lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        # Autocommit mode: transactions are opened explicitly below
+        pending = aiosqlite.connect(self.path, isolation_level=None)
+        # Idle pooled connections must not keep the interpreter alive
+        worker = getattr(pending, "_thread", None)
+        if worker is not None:
+            worker.daemon = True
+        conn = await pending
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        await conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    async def _ensure(self):
+        if self._pool is not None:
+            return
+        async with self._init_lock:
+            if self._pool is not None:
+                return
+            pool = asyncio.Queue()
+            first = await self._connect()
+            if self.schema:
+                await first.executescript(self.schema)
+            if self.migrate is not None:
+                await self.migrate(first)
+            pool.put_nowait(first)
+            for _ in range(self.size - 1):
+                pool.put_nowait(await self._connect())
+            self._pool = pool
+
+    @asynccontextmanager
+    async def connection(self):
+        await self._ensure()
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.connection() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+    async def close(self):
+        if self._pool is None:
+            return
+        while not self._pool.empty():
+            await self._pool.get_nowait().close()
+        self._pool = None
+
+
+# -------------------------------------------------------------
+# Schema
+# -------------------------------------------------------------
+TICKET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id        TEXT PRIMARY KEY,
+    user_id          TEXT,
+    summary          TEXT NOT NULL,
+    description      TEXT,
+    priority         TEXT,
+    category         TEXT,
+    status           TEXT NOT NULL,
+    resolution       TEXT,
+    parent_ticket_id TEXT,
+    created_at       TEXT NOT NULL,
+    updated_at       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_user
+    ON tickets(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_status
+    ON tickets(status);
+CREATE INDEX IF NOT EXISTS idx_tickets_created
+    ON tickets(created_at);
+
+CREATE TABLE IF NOT EXISTS ticket_status_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id   TEXT NOT NULL REFERENCES tickets(ticket_id),
+    old_status  TEXT,
+    new_status  TEXT NOT NULL,
+    changed_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_ticket
+    ON ticket_status_history(ticket_id, changed_at);
+
+CREATE TABLE IF NOT EXISTS user_ticket_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     TEXT NOT NULL,
+    ticket_id   TEXT NOT NULL,
+    summary     TEXT,
+    status      TEXT,
+    priority    TEXT,
+    session_id  TEXT,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_history_user
+    ON user_ticket_history(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_user_history_status
+    ON user_ticket_history(user_id, status, id);
+"""
+
+# External-content FTS5 table kept in sync by triggers
+TICKET_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+    summary, description, resolution,
+    content='tickets', content_rowid='rowid',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO tickets_fts(rowid, summary, description, resolution)
+    VALUES (new.rowid, new.summary, new.description, new.resolution);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets BEGIN
+    INSERT INTO tickets_fts(tickets_fts, rowid, summary, description, resolution)
+    VALUES ('delete', old.rowid, old.summary, old.description, old.resolution);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_update
+AFTER UPDATE OF summary, description, resolution ON tickets BEGIN
+    INSERT INTO tickets_fts(tickets_fts, rowid, summary, description, resolution)
+    VALUES ('delete', old.rowid, old.summary, old.description, old.resolution);
+    INSERT INTO tickets_fts(rowid, summary, description, resolution)
+    VALUES (new.rowid, new.summary, new.description, new.resolution);
+END;
+"""
+
+# bm25 column weights: summary, description, resolution
+SEARCH_WEIGHTS = (10.0, 3.0, 5.0)
+
+
+async def migrate_ticket_db(conn: aiosqlite.Connection):
+    # Databases created before the resolution column / FTS index existed
+    cur = await conn.execute("PRAGMA table_info(tickets)")
+    columns = {row["name"] for row in await cur.fetchall()}
+    if "resolution" not in columns:
+        await conn.execute("ALTER TABLE tickets ADD COLUMN resolution TEXT")
+
+    cur = await conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'tickets_fts'"
+    )
+    fresh_index = await cur.fetchone() is None
+    await conn.executescript(TICKET_SEARCH_SCHEMA)
+    if fresh_index:
+        await conn.execute(
+            "INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')"
+        )
+
+
+def fts_query(text: str) -> str:
+    # Free text → OR of quoted terms (no FTS syntax errors, bm25 ranks)
+    terms = re.findall(r"\w+", text.lower())
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+# -------------------------------------------------------------
+# Ticket store
+# -------------------------------------------------------------
+class TicketStore:
+    def __init__(self, path: str = TICKET_DB_PATH,
+                 pool_size: int = TICKET_POOL_SIZE):
+        self.pool = SQLitePool(path, pool_size, TICKET_SCHEMA,
+                               migrate=migrate_ticket_db)
+
+    async def create_ticket(self, summary: str, priority: str,
+                            description: str = "",
+                            user_id: Optional[str] = None,
+                            category: Optional[str] = None,
+                            status: str = "Open",
+                            parent_ticket_id: Optional[str] = None) -> dict:
+        now = utcnow()
+        for _ in range(5):
+            ticket_id = new_ticket_id()
+            try:
+                async with self.pool.transaction() as conn:
+                    await conn.execute(
+                        "INSERT INTO tickets (ticket_id, user_id, summary,"
+                        " description, priority, category, status,"
+                        " parent_ticket_id, created_at, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (ticket_id, user_id, summary, description, priority,
+                         category, status, parent_ticket_id, now, now),
+                    )
+                    await conn.execute(
+                        "INSERT INTO ticket_status_history"
+                        " (ticket_id, old_status, new_status, changed_at)"
+                        " VALUES (?, NULL, ?, ?)",
+                        (ticket_id, status, now),
+                    )
+                break
+            except sqlite3.IntegrityError:
+                continue  # another process took this id; draw again
+        else:
+            raise RuntimeError("Could not allocate a unique ticket id")
+
+        return {
+            "ticket_id": ticket_id,
+            "user_id": user_id,
+            "summary": summary,
+            "description": description,
+            "priority": priority,
+            "category": category,
+            "status": status,
+            "parent_ticket_id": parent_ticket_id,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def get_ticket(self, ticket_id: str) -> Optional[dict]:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT * FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            )
+            row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def update_status(self, ticket_id: str, new_status: str,
+                            resolution: Optional[str] = None) -> Optional[dict]:
+        now = utcnow()
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "SELECT status FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            )
+            row = await cur.fetchone()
+            if row is None:
+                return None
+            old_status = row["status"]
+            await conn.execute(
+                "UPDATE tickets SET status = ?, updated_at = ?,"
+                " resolution = COALESCE(?, resolution)"
+                " WHERE ticket_id = ?",
+                (new_status, now, resolution, ticket_id),
+            )
+            await conn.execute(
+                "INSERT INTO ticket_status_history"
+                " (ticket_id, old_status, new_status, changed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (ticket_id, old_status, new_status, now),
+            )
+        return {
+            "ticket_id": ticket_id,
+            "old_status": old_status,
+            "new_status": new_status,
+            "resolution": resolution,
+            "updated_at": now,
+        }
+
+    async def get_tickets(self, ticket_ids: list) -> dict:
+        # One IN (...) query per chunk (SQLite caps bound parameters)
+        found = {}
+        ids = list(dict.fromkeys(ticket_ids))
+        async with self.pool.connection() as conn:
+            for i in range(0, len(ids), MAX_BATCH_PARAMS):
+                chunk = ids[i:i + MAX_BATCH_PARAMS]
+                marks = ",".join("?" * len(chunk))
+                cur = await conn.execute(
+                    f"SELECT * FROM tickets WHERE ticket_id IN ({marks})",
+                    chunk,
+                )
+                for row in await cur.fetchall():
+                    found[row["ticket_id"]] = dict(row)
+        return found
+
+    async def list_open_tickets(self, closed_statuses) -> list:
+        # Tickets still carrying SLA timers (coalesced children excluded)
+        closed = sorted(st.lower() for st in closed_statuses)
+        marks = ",".join("?" * len(closed))
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT ticket_id, priority, status, created_at FROM tickets"
+                f" WHERE lower(status) NOT IN ({marks})"
+                " AND parent_ticket_id IS NULL",
+                closed,
+            )
+            return [dict(row) for row in await cur.fetchall()]
+
+    async def bulk_update_status(self, updates: list) -> dict:
+        # updates: [(ticket_id, new_status), ...] → single transaction
+        now = utcnow()
+        updates = list(dict(updates).items())  # last write per ticket wins
+        ids = [ticket_id for ticket_id, _ in updates]
+        async with self.pool.transaction() as conn:
+            current = {}
+            for i in range(0, len(ids), MAX_BATCH_PARAMS):
+                chunk = ids[i:i + MAX_BATCH_PARAMS]
+                marks = ",".join("?" * len(chunk))
+                cur = await conn.execute(
+                    "SELECT ticket_id, status FROM tickets"
+                    f" WHERE ticket_id IN ({marks})",
+                    chunk,
+                )
+                for row in await cur.fetchall():
+                    current[row["ticket_id"]] = row["status"]
+
+            applied = [(t, s) for t, s in updates if t in current]
+            await conn.executemany(
+                "UPDATE tickets SET status = ?, updated_at = ?"
+                " WHERE ticket_id = ?",
+                [(s, now, t) for t, s in applied],
+            )
+            await conn.executemany(
+                "INSERT INTO ticket_status_history"
+                " (ticket_id, old_status, new_status, changed_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(t, current[t], s, now) for t, s in applied],
+            )
+        return {
+            "updated": [
+                {"ticket_id": t, "old_status": current[t], "new_status": s}
+                for t, s in applied
+            ],
+            "missing": [t for t, _ in updates if t not in current],
+            "updated_at": now,
+        }
+
+    async def search_tickets(self, query: str,
+                             user_id: Optional[str] = None,
+                             category: Optional[str] = None,
+                             date_from: Optional[str] = None,
+                             date_to: Optional[str] = None,
+                             limit: int = 10) -> list:
+        match = fts_query(query)
+        if not match:
+            return []
+
+        clauses = ["tickets_fts MATCH ?"]
+        params: list = [match]
+        if user_id:
+            clauses.append("t.user_id = ?")
+            params.append(user_id)
+        if category:
+            clauses.append("t.category = ? COLLATE NOCASE")
+            params.append(category)
+        if date_from:
+            clauses.append("t.created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            # A bare date includes that whole day
+            if len(date_to) == 10:
+                clauses.append("t.created_at < date(?, '+1 day')")
+            else:
+                clauses.append("t.created_at <= ?")
+            params.append(date_to)
+        params.append(limit)
+
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT t.ticket_id, t.user_id, t.summary, t.priority,"
+                " t.category, t.status, t.resolution, t.created_at,"
+                f" bm25(tickets_fts, {weights}) AS rank,"
+                " snippet(tickets_fts, -1, '[', ']', '…', 12) AS snippet"
+                " FROM tickets_fts JOIN tickets t ON t.rowid = tickets_fts.rowid"
+                f" WHERE {' AND '.join(clauses)}"
+                " ORDER BY rank LIMIT ?",
+                params,
+            )
+            rows = await cur.fetchall()
+        results = []
+        for r in rows:
+            hit = dict(r)
+            # bm25 is "lower is better"; expose a positive score
+            hit["score"] = round(-hit.pop("rank"), 4)
+            results.append(hit)
+        return results
+
+    async def add_user_tickets(self, user_id: str, entries: list,
+                               session_id: Optional[str] = None) -> list:
+        # entries: [{"ticket_id", "summary", "status", "priority"}, ...]
+        now = utcnow()
+        rows = [
+            (user_id, e["ticket_id"], e.get("summary"), e.get("status"),
+             e.get("priority"), session_id, now)
+            for e in entries
+        ]
+        async with self.pool.transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO user_ticket_history (user_id, ticket_id,"
+                " summary, status, priority, session_id, recorded_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return [{**e, "recorded_at": now} for e in entries]
+
+    async def list_user_tickets(self, user_id: str,
+                                status: Optional[str] = None,
+                                limit: int = 20,
+                                cursor: Optional[int] = None) -> dict:
+        # Newest first; cursor is the last seen row id (keyset paging)
+        clauses = ["h.user_id = ?"]
+        params: list = [user_id]
+        if status:
+            # Filter on the live ticket status, not the one recorded
+            clauses.append("COALESCE(t.status, h.status) = ?")
+            params.append(status)
+        if cursor is not None:
+            clauses.append("h.id < ?")
+            params.append(int(cursor))
+        params.append(limit + 1)
+
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT h.id, h.ticket_id, h.summary, h.status, h.priority,"
+                " h.recorded_at, t.status AS current_status"
+                " FROM user_ticket_history h"
+                " LEFT JOIN tickets t ON t.ticket_id = h.ticket_id"
+                f" WHERE {' AND '.join(clauses)}"
+                " ORDER BY h.id DESC LIMIT ?",
+                params,
+            )
+            rows = [dict(r) for r in await cur.fetchall()]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "tickets": rows,
+            "next_cursor": rows[-1]["id"] if has_more else None,
+        }
+
+    async def get_history(self, ticket_id: str) -> list:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT old_status, new_status, changed_at"
+                " FROM ticket_status_history WHERE ticket_id = ?"
+                " ORDER BY id",
+                (ticket_id,),
+            )
+            rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+    async def close(self):
+        await self.pool.close()
+
+
+ticket_store = TicketStore()
+
+
+__all__ = [
+    "SQLitePool",
+    "TicketStore",
+    "ticket_store",
+    "new_ticket_id",
+    "utcnow",
+]
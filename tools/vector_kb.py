@@ -96,8 +96,15 @@ def add_kb_document(text: str, metadata: dict | None = None):
 # -------------------------------------------------------------
 # Search
 # -------------------------------------------------------------
-def vector_kb_search(query: str, top_k: int = 3):
-    print("\n[TOOL:vector_search] Query:", query)
+def _matches_category(metadata: dict, category: str | None) -> bool:
+    if not category:
+        return True
+    doc_category = str(metadata.get("category", "")).lower()
+    return not doc_category or doc_category == category.lower()
+
+
+def vector_kb_search(query: str, top_k: int = 3, category: str | None = None):
+    print("\n[TOOL:vector_search] Query:", query, "| category:", category)
     global faiss_index, docstore
 
     if faiss_index is None or len(docstore) == 0:
@@ -106,16 +113,22 @@ def vector_kb_search(query: str, top_k: int = 3):
     embedding = embed_text(query)
     q = np.array(embedding, dtype="float32").reshape(1, -1)
 
-    distances, indices = faiss_index.search(q, top_k)
+    # Over-fetch when filtering so top_k survive the category filter
+    fetch_k = min(len(docstore), top_k * 4 if category else top_k)
+    distances, indices = faiss_index.search(q, fetch_k)
 
     results = []
     for score, idx in zip(distances[0], indices[0]):
         if 0 <= idx < len(docstore):
+            if not _matches_category(docstore[idx]["metadata"], category):
+                continue
             results.append({
                 "text": docstore[idx]["text"],
                 "metadata": docstore[idx]["metadata"],
                 "score": float(score),
             })
+            if len(results) >= top_k:
+                break
 
     print("[TOOL:vector_search] Found:", len(results))
     return {"status": "success", "results": results}
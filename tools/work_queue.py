@@ -0,0 +1,416 @@
+# tools/work_queue.py
+# -------------------------------------------------------------
+# Persistent priority work queue for pipeline runs (SQLite)
+# - Lanes P1..P4 from a cheap keyword pre-classification
+# - Aging: every ITSM_QUEUE_AGING_SEC waited moves a job up one lane,
+#   so P4 work is never starved during a P1 storm
+# - Leases with visibility timeout: a crashed worker's job becomes
+#   visible again once its lease expires (heartbeats extend it); a
+#   worker that loses its lease cancels the run
+# - Each job gets a stable session id at enqueue, so a retry resumes
+#   the same session from its stage checkpoints (no duplicate ticket)
+# - Worker concurrency limit plus per-lane caps
+# - Dequeue looks only at the head of each lane (index seek per lane)
+# -------------------------------------------------------------
+
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from plugins.metrics import metrics
+from tools.ticket_store import SQLitePool, TICKET_DB_PATH
+
+
+QUEUE_AGING_SEC = float(os.getenv("ITSM_QUEUE_AGING_SEC", "60"))
+QUEUE_VISIBILITY_TIMEOUT = float(os.getenv("ITSM_QUEUE_VISIBILITY_TIMEOUT", "120"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("ITSM_QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_MAX_DEPTH = int(os.getenv("ITSM_QUEUE_MAX_DEPTH", "5000"))
+QUEUE_CONCURRENCY = int(os.getenv("ITSM_QUEUE_CONCURRENCY", "8"))
+QUEUE_POLL_SEC = float(os.getenv("ITSM_QUEUE_POLL_SEC", "1.0"))
+# lane → max concurrent jobs of that lane in one worker
+QUEUE_LANE_LIMITS = {
+    int(lane): int(limit)
+    for lane, limit in (
+        item.split(":") for item in
+        os.getenv("ITSM_QUEUE_LANE_LIMITS", "1:8,2:6,3:4,4:2").split(",")
+    )
+}
+LANES = (1, 2, 3, 4)
+
+WORK_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    job_id       TEXT PRIMARY KEY,
+    lane         INTEGER NOT NULL,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    enqueued_at  REAL NOT NULL,
+    visible_at   REAL NOT NULL,
+    lease_owner  TEXT,
+    result       TEXT,
+    error        TEXT,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_lane_head
+    ON pipeline_jobs(status, lane, enqueued_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease
+    ON pipeline_jobs(status, visible_at);
+"""
+
+
+# -------------------------------------------------------------
+# Cheap pre-classification (no LLM)
+# -------------------------------------------------------------
+LANE_KEYWORDS = {
+    1: r"outage|down for (everyone|all)|all users|entire (site|office|team)"
+       r"|production( is)? down|security (breach|incident)|ransomware"
+       r"|data loss|sev ?1|critical",
+    2: r"can ?not (work|log ?in|connect)|can't (work|log ?in|connect)"
+       r"|urgent|multiple users|vpn|e-?mail (is )?down|locked out|asap",
+    4: r"how (do|can) i|question|request(ing)?|new (laptop|account|software)"
+       r"|install|feature|when convenient|low priority",
+}
+_LANE_PATTERNS = {lane: re.compile(p, re.I) for lane, p in LANE_KEYWORDS.items()}
+
+
+def preclassify(message: str) -> int:
+    for lane in (1, 2, 4):
+        if _LANE_PATTERNS[lane].search(message or ""):
+            return lane
+    return 3
+
+
+class QueueFull(Exception):
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Work queue full ({depth} queued)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+# -------------------------------------------------------------
+# Queue
+# -------------------------------------------------------------
+class WorkQueue:
+    def __init__(self, path: str = TICKET_DB_PATH,
+                 aging_sec: float = QUEUE_AGING_SEC,
+                 visibility_timeout: float = QUEUE_VISIBILITY_TIMEOUT,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS,
+                 max_depth: int = QUEUE_MAX_DEPTH):
+        self.pool = SQLitePool(path, 2, WORK_QUEUE_SCHEMA)
+        self.aging_sec = aging_sec
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.max_depth = max_depth
+        self.notify = asyncio.Event()  # wakes in-process workers
+
+    async def depth(self) -> int:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT COUNT(*) FROM pipeline_jobs WHERE status = 'queued'"
+            )
+            return (await cur.fetchone())[0]
+
+    async def enqueue(self, payload: dict, lane: Optional[int] = None) -> dict:
+        lane = lane or preclassify(payload.get("message", ""))
+        depth = await self.depth()
+        if depth >= self.max_depth:
+            raise QueueFull(depth, max(1, round(self.aging_sec / 4)))
+
+        job_id = f"job-{uuid.uuid4().hex[:16]}"
+        payload = {**payload,
+                   "session_id": payload.get("session_id") or f"ticket-{job_id}"}
+        now = time.time()
+        async with self.pool.transaction() as conn:
+            await conn.execute(
+                "INSERT INTO pipeline_jobs (job_id, lane, payload, status,"
+                " enqueued_at, visible_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, lane, json.dumps(payload), now, now),
+            )
+        self.notify.set()
+        return {"job_id": job_id, "lane": lane, "status": "queued",
+                "session_id": payload["session_id"], "queued_ahead": depth}
+
+    def _effective_lane(self, lane: int, enqueued_at: float, now: float) -> float:
+        # Lower is served first; waiting aging_sec moves a job up one lane
+        return lane - (now - enqueued_at) / self.aging_sec
+
+    async def claim(self, owner: str, blocked_lanes=()) -> Optional[dict]:
+        now = time.time()
+        async with self.pool.transaction() as conn:
+            # Expired leases (crashed / stuck workers) become visible again;
+            # a job that keeps killing its worker is given up on
+            await conn.execute(
+                "UPDATE pipeline_jobs SET lease_owner = NULL,"
+                " status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = CASE WHEN attempts >= ? THEN 'lease expired' ELSE error END,"
+                " finished_at = CASE WHEN attempts >= ? THEN ? END"
+                " WHERE status = 'running' AND visible_at < ?",
+                (self.max_attempts, self.max_attempts, self.max_attempts,
+                 now, now),
+            )
+
+            best = None
+            for lane in LANES:
+                if lane in blocked_lanes:
+                    continue
+                cur = await conn.execute(
+                    "SELECT job_id, lane, enqueued_at FROM pipeline_jobs"
+                    " WHERE status = 'queued' AND lane = ? AND visible_at <= ?"
+                    " ORDER BY enqueued_at LIMIT 1",
+                    (lane, now),
+                )
+                head = await cur.fetchone()
+                if head is None:
+                    continue
+                rank = self._effective_lane(head["lane"], head["enqueued_at"], now)
+                if best is None or rank < best[0]:
+                    best = (rank, head["job_id"])
+            if best is None:
+                return None
+
+            await conn.execute(
+                "UPDATE pipeline_jobs SET status = 'running', lease_owner = ?,"
+                " visible_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (owner, now + self.visibility_timeout, best[1]),
+            )
+            cur = await conn.execute(
+                "SELECT * FROM pipeline_jobs WHERE job_id = ?", (best[1],)
+            )
+            job = dict(await cur.fetchone())
+
+        job["payload"] = json.loads(job["payload"])
+        job["waited_sec"] = round(now - job["enqueued_at"], 3)
+        return job
+
+    async def heartbeat(self, job_id: str, owner: str) -> bool:
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "UPDATE pipeline_jobs SET visible_at = ?"
+                " WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + self.visibility_timeout, job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    async def complete(self, job_id: str, owner: str, result: dict) -> bool:
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "UPDATE pipeline_jobs SET status = 'done', result = ?,"
+                " finished_at = ?, lease_owner = NULL"
+                " WHERE job_id = ? AND lease_owner = ?",
+                (json.dumps(result, default=str), time.time(), job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    async def fail(self, job_id: str, owner: str, error: str) -> str:
+        now = time.time()
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "SELECT attempts FROM pipeline_jobs"
+                " WHERE job_id = ? AND lease_owner = ?",
+                (job_id, owner),
+            )
+            row = await cur.fetchone()
+            if row is None:
+                return "lost"  # lease expired and someone else has it
+            if row["attempts"] >= self.max_attempts:
+                status, visible_at = "failed", now
+            else:
+                # Exponential backoff before the job is visible again
+                status, visible_at = "queued", now + 2 ** row["attempts"]
+            await conn.execute(
+                "UPDATE pipeline_jobs SET status = ?, visible_at = ?,"
+                " error = ?, lease_owner = NULL,"
+                " finished_at = CASE WHEN ? = 'failed' THEN ? END"
+                " WHERE job_id = ?",
+                (status, visible_at, error[:1000], status, now, job_id),
+            )
+        if status == "queued":
+            metrics.inc("itsm_retries_total", kind="job")
+        return status
+
+    async def release(self, owner: str) -> int:
+        # Shutdown: hand this owner's running jobs back right away
+        # instead of leaving them invisible until the lease expires
+        async with self.pool.transaction() as conn:
+            cur = await conn.execute(
+                "UPDATE pipeline_jobs SET status = 'queued',"
+                " lease_owner = NULL, visible_at = ?"
+                " WHERE lease_owner = ? AND status = 'running'",
+                (time.time(), owner),
+            )
+            return cur.rowcount
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT * FROM pipeline_jobs WHERE job_id = ?", (job_id,)
+            )
+            row = await cur.fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def stats(self) -> dict:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT status, lane, COUNT(*) AS n FROM pipeline_jobs"
+                " WHERE status IN ('queued', 'running')"
+                " GROUP BY status, lane"
+            )
+            rows = await cur.fetchall()
+        stats: Dict[str, Dict[str, int]] = {"queued": {}, "running": {}}
+        for r in rows:
+            stats[r["status"]][f"P{r['lane']}"] = r["n"]
+        return stats
+
+    async def close(self):
+        await self.pool.close()
+
+
+# -------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------
+class WorkQueueWorker:
+    def __init__(self, queue: WorkQueue,
+                 handler: Callable[[dict], Awaitable[dict]],
+                 concurrency: int = QUEUE_CONCURRENCY,
+                 lane_limits: Optional[dict] = None):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.lane_limits = lane_limits or QUEUE_LANE_LIMITS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self._running: Dict[int, int] = {lane: 0 for lane in LANES}
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: set = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.leases_lost = 0
+
+    def _blocked_lanes(self) -> set:
+        return {
+            lane for lane, n in self._running.items()
+            if n >= self.lane_limits.get(lane, self.concurrency)
+        }
+
+    async def _heartbeat(self, job_id: str, work: asyncio.Task) -> bool:
+        # Returns True after cancelling `work` because the lease is gone
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                if not await self.queue.heartbeat(job_id, self.owner):
+                    print(f"[QUEUE] ⚠ {job_id} lease lost → cancelling run")
+                    work.cancel()
+                    return True
+                renewed_at = time.monotonic()
+            except Exception as e:
+                print(f"[QUEUE] ⚠ Heartbeat failed for {job_id}: {e}")
+                # Past the visibility timeout another worker may claim it
+                if time.monotonic() - renewed_at >= self.queue.visibility_timeout:
+                    print(f"[QUEUE] ⚠ {job_id} lease expired → cancelling run")
+                    work.cancel()
+                    return True
+
+    async def _process(self, job: dict):
+        lane = job["lane"]
+        work = asyncio.create_task(self.handler(job["payload"]))
+        beat = asyncio.create_task(self._heartbeat(job["job_id"], work))
+        try:
+            print(f"[QUEUE] Running {job['job_id']} (P{lane},"
+                  f" waited {job['waited_sec']}s, attempt {job['attempts']})")
+            try:
+                result = await work
+            except asyncio.CancelledError:
+                if not (beat.done() and not beat.cancelled() and beat.result()):
+                    raise  # worker shutdown
+                self.leases_lost += 1
+                return  # the new lease holder owns the job now
+            await self.queue.complete(job["job_id"], self.owner, result)
+            self.completed += 1
+        except Exception as e:
+            status = await self.queue.fail(job["job_id"], self.owner, repr(e))
+            self.failed += 1
+            print(f"[QUEUE] ⚠ {job['job_id']} failed ({status}): {e}")
+        finally:
+            beat.cancel()
+            work.cancel()
+            self._running[lane] -= 1
+            self._slots.release()
+            self.queue.notify.set()  # a lane may have been unblocked
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            job = None
+            try:
+                job = await self.queue.claim(self.owner, self._blocked_lanes())
+            except Exception as e:
+                print(f"[QUEUE] ⚠ Claim failed: {e}")
+            if job is None:
+                self._slots.release()
+                self.queue.notify.clear()
+                try:
+                    await asyncio.wait_for(self.queue.notify.wait(),
+                                           QUEUE_POLL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[job["lane"]] += 1
+            task = asyncio.create_task(self._process(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def start(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # In-flight jobs go back to the queue; another worker resumes
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            released = await self.queue.release(self.owner)
+        except Exception as e:
+            print(f"[QUEUE] ⚠ Releasing jobs failed: {e}")
+            return
+        if released:
+            print(f"[QUEUE] Released {released} running job(s) on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "owner": self.owner,
+            "concurrency": self.concurrency,
+            "running": {f"P{k}": v for k, v in self._running.items()},
+            "completed": self.completed,
+            "failed": self.failed,
+            "leases_lost": self.leases_lost,
+        }
+
+
+work_queue = WorkQueue()
+
+
+__all__ = [
+    "work_queue",
+    "WorkQueue",
+    "WorkQueueWorker",
+    "QueueFull",
+    "preclassify",
+]